@@ -0,0 +1,42 @@
+""" Benchmark of the memory taken by the imported data per column, as read and compacted """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+import pandas as pd
+
+from core import compaction
+
+from datareaders_benchmark import syntheticPlaces
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--rows', type=int, default=500000)
+	args = parser.parse_args()
+
+	# text as object columns and whole numbers with gaps as floats (as 'pd.read_excel' yields them)
+	data = syntheticPlaces(args.rows).astype({'City': object, 'State': object, 'Country': object, 'Address': object, 'Notes': object})
+	data['Population'] = data['Population'].astype(float).where(data.index % 10 != 0)
+
+	original = data.copy()
+	read_bytes = compaction.columnBytes(data)
+
+	start = time.perf_counter()
+	compaction.compactData(data, keep_fields=['IATA'])
+	elapsed = time.perf_counter() - start
+
+	# the compacted values must be the values read
+	unchanged = all(original[field].astype(object).where(original[field].notna(), None).tolist() == data[field].astype(object).where(data[field].notna(), None).tolist() for field in data.columns)
+
+	print('{:>12}  {:>10}  {:>12}  {:>12}  {:>6}'.format('field', 'dtype', 'as read', 'compacted', 'ratio'))
+	for field, dtype, before, after in compaction.memoryReport(read_bytes, data):
+		print('{:>12}  {:>10}  {:>12}  {:>12}  {:>5.1f}x'.format(field, dtype, compaction.formatBytes(before), compaction.formatBytes(after), before / after))
+
+	print('{:>12}  {:>10}  {:>12}  {:>12}  {:>5.1f}x'.format('total', '', compaction.formatBytes(sum(read_bytes)), compaction.formatBytes(sum(compaction.columnBytes(data))), sum(read_bytes) / sum(compaction.columnBytes(data))))
+	print('Compacted {} rows in {:.2f}s ({})'.format(len(data), elapsed, 'values unchanged' if unchanged else 'VALUES CHANGED'))
@@ -0,0 +1,91 @@
+""" Benchmark of cell rendering throughput and of sorting and filtering of the 'DataFrameModel' """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import Qt
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from models.dataframemodel import DataFrameModel
+
+# create a synthetic frame of mixed text, numeric and missing values
+def syntheticFrame(n_rows, n_columns):
+
+	random = np.random.default_rng(0)
+	columns = {}
+
+	for column in range(n_columns):
+		if column % 3 == 0:
+			values = pd.Series(random.integers(0, 5000, n_rows)).map('City {}'.format)
+			values[random.random(n_rows) < 0.05] = None
+		elif column % 3 == 1:
+			values = pd.Series(random.random(n_rows) * 1000)
+			values[random.random(n_rows) < 0.05] = np.nan
+		else:
+			values = pd.Series(random.integers(0, 10**6, n_rows))
+
+		columns['Field {}'.format(column)] = values
+
+	return pd.DataFrame(columns)
+
+# measure cells rendered per second while scrolling viewport sized windows through the table
+def benchmarkScrolling(model, n_cells, viewport_rows=40):
+
+	rows, columns = model.rowCount(), model.columnCount()
+	random = np.random.default_rng(1)
+
+	# jump to random scroll positions, rendering a full viewport at each one (as QTableView does)
+	positions = random.integers(0, rows - viewport_rows, n_cells // (viewport_rows * columns) + 1)
+	indexes = [model.index(row, column) for position in positions for row in range(position, position + viewport_rows) for column in range(columns)]
+
+	start = time.perf_counter()
+	for index in indexes:
+		model.data(index, Qt.DisplayRole)
+	elapsed = time.perf_counter() - start
+
+	return len(indexes) / elapsed
+
+# measure the seconds taken by each column's sort and by substring and regular expression filters
+def benchmarkSortFilter(model):
+
+	timings = []
+
+	for column in range(min(model.columnCount(), 3)):
+		start = time.perf_counter()
+		model.sort(column, Qt.AscendingOrder)
+		timings.append(('sort {}'.format(model._data.columns[column]), time.perf_counter() - start))
+
+	for pattern, column, regex in [('city 12', 0, False), ('city 123', 0, False), ('city 12', None, False), (r'^city 4\d{2}$', 0, True)]:
+		start = time.perf_counter()
+		model.setFilter(pattern, column, regex)
+		timings.append(('filter {!r} in {}'.format(pattern, 'all fields' if column is None else model._data.columns[column]), time.perf_counter() - start))
+
+	model.setFilter('')
+	return timings
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--rows', type=int, default=1000000)
+	parser.add_argument('--columns', type=int, default=10)
+	parser.add_argument('--cells', type=int, default=500000)
+	args = parser.parse_args()
+
+	frame = syntheticFrame(args.rows, args.columns)
+	model = DataFrameModel(frame)
+
+	cold = benchmarkScrolling(model, args.cells)
+	warm = benchmarkScrolling(model, args.cells)
+
+	print('DataFrameModel.data() on {} x {} frame'.format(args.rows, args.columns))
+	print('  cold cache: {:12,.0f} cells/sec'.format(cold))
+	print('  warm cache: {:12,.0f} cells/sec'.format(warm))
+
+	for name, elapsed in benchmarkSortFilter(model):
+		print('  {:<36} {:8.3f} s'.format(name, elapsed))
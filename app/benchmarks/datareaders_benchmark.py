@@ -0,0 +1,108 @@
+""" Benchmark of load time and peak memory of the input file readers across formats """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from core import datareaders
+
+# create a synthetic places dataset with a few wide text fields besides the mapped ones
+def syntheticPlaces(n_rows):
+
+	random = np.random.default_rng(0)
+
+	countries = np.array(['India', 'United States', 'Germany', 'Brazil', 'Japan', 'Kenya'])
+	states = np.array(['State {}'.format(number) for number in range(60)])
+
+	return pd.DataFrame({
+		'City': pd.Series(random.integers(0, 50000, n_rows)).map('City {}'.format),
+		'State': states[random.integers(0, len(states), n_rows)],
+		'Country': countries[random.integers(0, len(countries), n_rows)],
+		'IATA': None,
+		'Address': pd.Series(random.integers(0, 10**9, n_rows)).map('{} Long Street Name, Some Locality'.format),
+		'Population': random.integers(0, 10**7, n_rows),
+		'Notes': 'imported from the regional sales export',
+	})
+
+# write the dataset in each of the benchmarked formats
+def writeFormats(data, directory, formats):
+
+	filenames = {}
+	for file_format in formats:
+
+		filename = os.path.join(directory, 'places.' + file_format)
+		if file_format == 'xlsx':
+			data.to_excel(filename, index=False)
+		elif file_format == 'csv':
+			data.to_csv(filename, index=False)
+		elif file_format == 'parquet':
+			data.to_parquet(filename, index=False)
+		elif file_format == 'feather':
+			data.to_feather(filename)
+
+		filenames[file_format] = filename
+
+	return filenames
+
+# read the mapped fields of a file into a compact dataframe
+def loadFile(filename, usecols):
+
+	reader = datareaders.openReader(filename)
+	chunks = [datareaders.compactChunk(chunk, ['State', 'Country']) for chunk, _ in reader.iterChunks(usecols=usecols)]
+	data = datareaders.concatChunks(chunks, list(chunks[0].columns), ['State', 'Country'])
+	reader.close()
+
+	return data
+
+# time and then trace the loading of a file (in a fresh process, to measure its own peak memory)
+def benchmarkFile(filename, usecols, results):
+
+	import pyarrow as pa
+
+	start = time.perf_counter()
+	data = loadFile(filename, usecols)
+	elapsed = time.perf_counter() - start
+	del data
+
+	# python and numpy allocations are traced, arrow allocations are tracked by its memory pool
+	tracemalloc.start()
+	data = loadFile(filename, usecols)
+	peak = tracemalloc.get_traced_memory()[1] + pa.default_memory_pool().max_memory()
+
+	results.put((elapsed, peak / 2**20, len(data)))
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--rows', type=int, default=500000)
+	parser.add_argument('--formats', nargs='+', default=['xlsx', 'csv', 'parquet', 'feather'])
+	parser.add_argument('--all-columns', action='store_true', help='read every column instead of the mapped fields')
+	args = parser.parse_args()
+
+	usecols = None if args.all_columns else ['City', 'State', 'Country', 'IATA']
+	context = multiprocessing.get_context('spawn')
+
+	with tempfile.TemporaryDirectory() as directory:
+
+		filenames = writeFormats(syntheticPlaces(args.rows), directory, args.formats)
+
+		print('{:>8}  {:>10}  {:>10}  {:>14}  {:>8}'.format('format', 'size (MB)', 'load (s)', 'peak mem (MB)', 'rows'))
+		for file_format, filename in filenames.items():
+
+			results = context.Queue()
+			process = context.Process(target=benchmarkFile, args=(filename, usecols, results))
+			process.start()
+			elapsed, peak_memory, rows = results.get()
+			process.join()
+
+			print('{:>8}  {:>10.1f}  {:>10.2f}  {:>14.1f}  {:>8}'.format(file_format, os.path.getsize(filename) / 2**20, elapsed, peak_memory, rows))
@@ -0,0 +1,114 @@
+""" Benchmark of pages parsed per second by the extraction paths, on saved pages or a generated corpus """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import glob
+import time
+
+from core import extraction
+
+from stubserver import page_template, stubAirport
+
+# layouts of the nearest airport paragraph (besides the stub source's)
+sample_layouts = [
+	'<p>Nearest airport: <a class="airport" href="/airport/{iata}" title="{iata}">{iata} International</a> ({iata}), {miles} miles away</p>',
+	'<p><a href="/airport/{iata}"><b>{iata}</b> Municipal</a> is {distance} kilometers away.</p>',
+]
+
+# navigation, scripts and listings padding a page to about 'page_kb' kilobytes (like real source pages)
+def pagePadding(page_kb):
+
+	block = '<div class="nav"><ul>{}</ul></div>\n<script>var data = {{"k": [1, 2, 3], "v": "x"}};</script>\n'.format(''.join('<li><a href="/city/{0}">City {0}</a></li>'.format(number) for number in range(10)))
+	return block * max(1, page_kb * 1024 // len(block))
+
+# (html, expected iata) of generated sample pages
+def samplePages(count, page_kb):
+
+	padding = pagePadding(page_kb)
+
+	pages = []
+	for number in range(count):
+
+		place = 'City {}, State {}, Country {}'.format(number, number % 30, number % 7)
+		iata, distance = stubAirport(place)
+
+		if number % 3 == 0:
+			html = page_template.format(place=place, iata=iata, distance=distance)
+		else:
+			paragraph = sample_layouts[number % 3 - 1].format(iata=iata, distance=distance, miles=round(distance / 1.609344, 1))
+			html = '<html><head><title>{0}</title></head><body><h1>{0}</h1>{1}</body></html>'.format(place, paragraph)
+
+		# the padding comes before the result (as the navigation of real pages does)
+		pages.append((html.replace('<body>', '<body>' + padding, 1), iata))
+
+	return pages
+
+# (html, None) of saved pages (the expected iata's are unknown)
+def savedPages(pages_dir):
+
+	pages = []
+	for filename in sorted(glob.glob(os.path.join(pages_dir, '*.htm*'))):
+		with open(filename, encoding='utf-8', errors='replace') as page:
+			pages.append((page.read(), None))
+
+	return pages
+
+# parse the page with lxml and walk its elements for the airport link (as element lookups in a driver do)
+def extractByDomWalk(html):
+
+	import lxml.html
+
+	for link in lxml.html.fromstring(html).iter('a'):
+		href = link.get('href', '')
+		if href.startswith('/airport/'):
+			return href[len('/airport/'):][:3], None
+
+	raise extraction.ExtractionError('No airport link found on page')
+
+# pages per second of an extraction path (and the number of pages with a wrong or no iata)
+def measure(extract, pages, repeat):
+
+	wrong = 0
+	start = time.perf_counter()
+
+	for _ in range(repeat):
+		for html, iata in pages:
+			try:
+				result = extract(html)
+			except extraction.ExtractionError:
+				result = None
+			if iata is not None and (result is None or result[0] != iata):
+				wrong += 1
+
+	elapsed = time.perf_counter() - start
+	return len(pages) * repeat / elapsed, wrong // repeat
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--pages-dir', help='directory of saved source pages (*.html); generated sample pages by default')
+	parser.add_argument('--pages', type=int, default=300, help='number of generated sample pages')
+	parser.add_argument('--page-kb', type=int, default=60, help='size of the generated sample pages')
+	parser.add_argument('--repeat', type=int, default=3)
+	args = parser.parse_args()
+
+	pages = savedPages(args.pages_dir) if args.pages_dir else samplePages(args.pages, args.page_kb)
+	template = extraction.page_templates[0]
+
+	paths = [
+		('templates (fast path first)', extraction.extractNearestAirport),
+		('template regex only', template.extractFast),
+		('compiled xpath only', template.extractTree),
+		('generic regex', extraction.extractGeneric),
+		('dom walk', extractByDomWalk),
+	]
+
+	print('{} pages of {:.0f} KB on average'.format(len(pages), sum(len(html) for html, _ in pages) / len(pages) / 1024))
+	print('{:>28}  {:>11}  {:>6}'.format('extraction', 'pages/sec', 'wrong'))
+	for name, extract in paths:
+		pages_per_second, wrong = measure(extract, pages, args.repeat)
+		print('{:>28}  {:>11.1f}  {:>6}'.format(name, pages_per_second, wrong))
@@ -0,0 +1,81 @@
+""" Benchmark of fuzzy matching misspelt city names against a synthetic gazetteer """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.gazetteer import Gazetteer, buildGazetteer, geonames_fields
+from core.fuzzymatch import FuzzyMatcher
+
+syllables = ['ba', 'ban', 'ga', 'lo', 're', 'mu', 'm', 'bai', 'pu', 'ne', 'che', 'nn', 'ai', 'ko', 'l', 'ka', 'ta', 'hy', 'der', 'a', 'bad', 'na', 'gar', 'pur', 'ki', 'sh', 'an', 'ti']
+
+# random pronounceable names (of 2 to 5 syllables)
+def randomNames(random, count):
+	lengths = random.integers(2, 6, count)
+	picks = random.integers(0, len(syllables), (count, 5))
+	return [''.join(syllables[pick] for pick in picks[position, :lengths[position]]).capitalize() for position in range(count)]
+
+# misspell a name with a random substitution, deletion, insertion or transposition
+def misspell(random, name):
+
+	position = int(random.integers(0, max(len(name) - 1, 1)))
+	edit = random.integers(0, 4)
+	letter = chr(ord('a') + int(random.integers(0, 26)))
+
+	if edit == 0:
+		return name[:position] + letter + name[position + 1:]
+	if edit == 1:
+		return name[:position] + name[position + 1:]
+	if edit == 2:
+		return name[:position] + letter + name[position:]
+	return name[:position] + name[position + 1:position + 2] + name[position:position + 1] + name[position + 2:]
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--names', type=int, default=1000000, help='number of gazetteer names')
+	parser.add_argument('--queries', type=int, default=100000, help='number of distinct misspelt names')
+	parser.add_argument('--blocks', type=int, default=400, help='number of (country, state) blocks')
+	args = parser.parse_args()
+
+	random = np.random.default_rng(0)
+
+	names = randomNames(random, args.names)
+	blocks = random.integers(0, args.blocks, args.names)
+
+	with tempfile.TemporaryDirectory() as directory:
+
+		dump = pd.DataFrame({field: '' for field in geonames_fields}, index=range(args.names))
+		dump['geonameid'] = np.arange(args.names)
+		dump['name'] = names
+		dump['asciiname'] = names
+		dump['latitude'] = random.uniform(-60, 70, args.names).round(4)
+		dump['longitude'] = random.uniform(-180, 180, args.names).round(4)
+		dump['feature_class'] = 'P'
+		dump['country_code'] = ['C{}'.format(block // 20) for block in blocks]
+		dump['admin1_code'] = [str(block % 20) for block in blocks]
+		dump['population'] = 0
+		dump.to_csv(os.path.join(directory, 'dump.txt'), sep='\t', header=False, index=False)
+
+		buildGazetteer(os.path.join(directory, 'dump.txt'), os.path.join(directory, 'index'), alternate_names=False)
+		gazetteer = Gazetteer(os.path.join(directory, 'index'))
+
+		queries = random.integers(0, args.names, args.queries)
+		places = [(misspell(random, names[query]), str(blocks[query] % 20), 'C{}'.format(blocks[query] // 20)) for query in queries]
+
+		start = time.perf_counter()
+		matches = FuzzyMatcher(gazetteer).matchPlaces(places)
+		elapsed = time.perf_counter() - start
+
+		correct = (matches['Suggested City Name'].fillna('') == pd.Series([names[query] for query in queries])).mean()
+
+		print('fuzzy matched {:,} names against {:,} gazetteer names in {:.1f}s ({:,.0f} names/sec)'.format(args.queries, args.names, elapsed, args.queries / elapsed))
+		print('  matched: {:.1%}, matched to the original name: {:.1%}'.format(matches['Suggested City Name'].notna().mean(), correct))
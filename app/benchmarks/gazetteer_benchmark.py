@@ -0,0 +1,78 @@
+""" Benchmark of building and querying the gazetteer index for a synthetic GeoNames-style dump """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.gazetteer import Gazetteer, buildGazetteer, geonames_fields
+
+# write a synthetic dump of places with GeoNames fields (in chunks, to bound memory)
+def writeSyntheticDump(filename, n_entries, chunk_rows=1000000):
+
+	random = np.random.default_rng(0)
+
+	with open(filename, 'w', encoding='utf-8') as dump:
+		for start in range(0, n_entries, chunk_rows):
+
+			count = min(chunk_rows, n_entries - start)
+			ids = np.arange(start, start + count)
+
+			chunk = pd.DataFrame({field: '' for field in geonames_fields}, index=range(count))
+			chunk['geonameid'] = ids
+			chunk['name'] = ['Place {}'.format(number) for number in ids]
+			chunk['asciiname'] = chunk['name']
+			chunk['latitude'] = np.round(random.uniform(-60, 70, count), 5)
+			chunk['longitude'] = np.round(random.uniform(-180, 180, count), 5)
+			chunk['feature_class'] = 'P'
+			chunk['country_code'] = np.array(['C{:03d}'.format(code) for code in range(250)])[ids % 250]
+			chunk['admin1_code'] = (ids // 250 % 40).astype(str)
+			chunk['population'] = random.integers(0, 10**6, count)
+
+			chunk.to_csv(dump, sep='\t', header=False, index=False)
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--entries', type=int, default=10000000)
+	parser.add_argument('--queries', type=int, default=1000000)
+	args = parser.parse_args()
+
+	random = np.random.default_rng(1)
+
+	with tempfile.TemporaryDirectory() as directory:
+
+		dump_path = os.path.join(directory, 'dump.txt')
+		writeSyntheticDump(dump_path, args.entries)
+
+		start = time.perf_counter()
+		buildGazetteer(dump_path, os.path.join(directory, 'index'), alternate_names=False)
+		build_time = time.perf_counter() - start
+
+		index_size = sum(os.path.getsize(os.path.join(directory, 'index', name)) for name in os.listdir(os.path.join(directory, 'index')))
+
+		start = time.perf_counter()
+		gazetteer = Gazetteer(os.path.join(directory, 'index'))
+		open_time = time.perf_counter() - start
+
+		# mostly known places with matching states, some with unknown states and some unknown places
+		ids = random.integers(0, args.entries, args.queries)
+		states = np.where(random.random(args.queries) < 0.8, (ids // 250 % 40).astype(str), 'Unknown')
+		names = np.where(random.random(args.queries) < 0.95, ['Place {}'.format(number) for number in ids], 'Nowhere')
+		places = list(zip(names, states, ['C{:03d}'.format(code) for code in ids % 250]))
+
+		start = time.perf_counter()
+		latitudes, _ = gazetteer.geocode(places)
+		lookup_time = time.perf_counter() - start
+
+		print('gazetteer of {:,} entries'.format(args.entries))
+		print('  build:  {:8.1f}s ({:,.0f} entries/sec, {:.0f} MB on disk)'.format(build_time, args.entries / build_time, index_size / 2**20))
+		print('  open:   {:8.3f}s'.format(open_time))
+		print('  lookup: {:8.2f}s for {:,} places ({:,.0f} places/sec, {:.1%} found)'.format(lookup_time, args.queries, args.queries / lookup_time, np.isfinite(latitudes).mean()))
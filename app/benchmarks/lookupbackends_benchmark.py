@@ -0,0 +1,78 @@
+""" Benchmark of lookups/sec and memory of the browser, threaded HTTP and async HTTP backends against a local stub source """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functools import partial
+import argparse
+import threading
+
+from core.lookupengine import LookupEngine
+from core.lookupbackends import HttpLookupBackend, ChromeLookupBackend, chromeDriver
+from core.asynchttpbackend import AsyncHttpLookupEngine
+from core.browserpool import BrowserPool, processTreeMemory
+
+from stubserver import StubSourceServer, stubAirport
+
+# run an engine over the places, sampling the peak memory of the process tree meanwhile
+def measure(engine, places):
+
+	results = {}
+	peak_memory = [processTreeMemory(os.getpid())]
+	done = threading.Event()
+
+	def sampleMemory():
+		while not done.wait(0.05):
+			peak_memory[0] = max(peak_memory[0], processTreeMemory(os.getpid()))
+
+	sampler = threading.Thread(target=sampleMemory, daemon=True)
+	sampler.start()
+
+	summary = engine.run(places, lambda key, iata, distance: results.__setitem__(key, iata))
+
+	done.set()
+	sampler.join()
+
+	# check the results against the stub's airports
+	wrong = sum(results[key] != stubAirport(', '.join(place))[0] for key, place in places if key in results)
+
+	return summary, peak_memory[0], wrong
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--places', type=int, default=2000)
+	parser.add_argument('--latency', type=float, default=0.05, help='seconds the stub source takes per page')
+	parser.add_argument('--browser-workers', type=int, default=4, help='browser sessions (and threaded HTTP workers)')
+	parser.add_argument('--async-concurrency', type=int, nargs='+', default=[50, 200], help='requests in flight of the async HTTP backend')
+	parser.add_argument('--chromedriver', help='ChromeDriver executable (the browser backend is skipped without it)')
+	args = parser.parse_args()
+
+	places = [(number, ('City {}'.format(number), 'State {}'.format(number % 30), 'Country {}'.format(number % 7))) for number in range(args.places)]
+
+	with StubSourceServer(latency=args.latency) as server:
+
+		engines = []
+
+		browser_pool = None
+		if args.chromedriver is not None:
+			browser_pool = BrowserPool(partial(chromeDriver, args.chromedriver), size=args.browser_workers)
+			engines.append(('browser', args.browser_workers, LookupEngine(partial(ChromeLookupBackend, browser_pool, server.url_template), workers=args.browser_workers, retries=2, backoff=0.05)))
+		else:
+			print('(no --chromedriver given, skipping the browser backend)')
+
+		engines.append(('threaded http', args.browser_workers, LookupEngine(partial(HttpLookupBackend, server.url_template), workers=args.browser_workers, retries=2, backoff=0.05)))
+
+		for concurrency in args.async_concurrency:
+			engines.append(('async http', concurrency, AsyncHttpLookupEngine(concurrency=concurrency, url_template=server.url_template, retries=2, backoff=0.05)))
+
+		print('{:>14}  {:>11}  {:>10}  {:>12}  {:>15}  {:>9}'.format('backend', 'concurrency', 'elapsed', 'lookups/sec', 'peak memory MB', 'failures'))
+		for name, concurrency, engine in engines:
+
+			summary, peak_memory, wrong = measure(engine, places)
+			print('{:>14}  {:>11}  {:>9.2f}s  {:>12.1f}  {:>15.1f}  {:>9}{}'.format(name, concurrency, summary['elapsed'], summary['throughput'], peak_memory / 1024 / 1024, summary['failures'], '  ({} wrong)'.format(wrong) if wrong else ''))
+
+		if browser_pool is not None:
+			browser_pool.close()
@@ -0,0 +1,38 @@
+""" Benchmark of lookup engine throughput per worker count against a local stub source """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functools import partial
+import argparse
+
+from core.lookupengine import LookupEngine
+from core.lookupbackends import HttpLookupBackend
+
+from stubserver import StubSourceServer, stubAirport
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--places', type=int, default=2000)
+	parser.add_argument('--latency', type=float, default=0.02, help='seconds the stub source takes per page')
+	parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+	args = parser.parse_args()
+
+	places = [(number, ('City {}'.format(number), 'State {}'.format(number % 30), 'Country {}'.format(number % 7))) for number in range(args.places)]
+
+	with StubSourceServer(latency=args.latency) as server:
+
+		print('{:>8}  {:>10}  {:>14}  {:>9}'.format('workers', 'elapsed', 'lookups/sec', 'failures'))
+		for workers in args.workers:
+
+			results = {}
+			engine = LookupEngine(partial(HttpLookupBackend, server.url_template), workers=workers, retries=2, backoff=0.05)
+			summary = engine.run(places, lambda key, iata, distance: results.__setitem__(key, iata))
+
+			# check the results against the stub's airports
+			wrong = sum(results[key] != stubAirport(', '.join(place))[0] for key, place in places if key in results)
+
+			print('{:>8}  {:>9.2f}s  {:>14.1f}  {:>9}{}'.format(workers, summary['elapsed'], summary['throughput'], summary['failures'], '  ({} wrong)'.format(wrong) if wrong else ''))
@@ -0,0 +1,62 @@
+""" Benchmark of the adaptive concurrency and rate limit against a local stub source throttling beyond its capacity """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import threading
+
+from core.asynchttpbackend import AsyncHttpLookupEngine
+from core.ratelimit import LookupThrottle
+
+from stubserver import StubSourceServer
+
+# run an engine over the places, printing the throttle's state every 'interval' seconds
+def runWatched(engine, places, interval):
+
+	done = threading.Event()
+
+	def watch():
+		while not done.wait(interval):
+			state = engine.throttle.state()
+			print('  concurrency {:>4}  tokens {:>8}  p50 {:>7}  p95 {:>7}  {}'.format(state['concurrency'], ', '.join('{:.1f}'.format(tokens) for tokens in state['tokens'].values()) or '-', formatLatency(state['p50']), formatLatency(state['p95']), state['counters']))
+
+	if engine.throttle is not None:
+		threading.Thread(target=watch, daemon=True).start()
+
+	summary = engine.run(places, lambda key, iata, distance: None)
+	done.set()
+
+	return summary
+
+def formatLatency(latency):
+	return '{:.0f}ms'.format(latency * 1000) if latency is not None else '-'
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--places', type=int, default=3000)
+	parser.add_argument('--latency', type=float, default=0.05, help='seconds the stub source takes per page')
+	parser.add_argument('--capacity', type=int, default=30, help='concurrent requests the stub source serves before answering HTTP 429')
+	parser.add_argument('--max-concurrency', type=int, default=200)
+	parser.add_argument('--rate', type=float, default=None, help='requests per second per host (no limit by default)')
+	parser.add_argument('--interval', type=float, default=1.0, help='seconds between printing the throttle state')
+	args = parser.parse_args()
+
+	places = [(number, ('City {}'.format(number), 'State {}'.format(number % 30), 'Country {}'.format(number % 7))) for number in range(args.places)]
+
+	print('{:>10}  {:>11}  {:>10}  {:>12}  {:>9}  {:>10}'.format('throttle', 'concurrency', 'elapsed', 'lookups/sec', 'failures', 'HTTP 429s'))
+
+	for adaptive in (False, True):
+
+		with StubSourceServer(latency=args.latency, capacity=args.capacity) as server:
+
+			throttle = LookupThrottle(args.max_concurrency, rate=args.rate) if adaptive else None
+			engine = AsyncHttpLookupEngine(concurrency=args.max_concurrency, url_template=server.url_template, retries=5, backoff=0.1, throttle=throttle)
+
+			summary = runWatched(engine, places, args.interval)
+			concurrency = throttle.controller.concurrency() if adaptive else args.max_concurrency
+
+			print('{:>10}  {:>11}  {:>9.2f}s  {:>12.1f}  {:>9}  {:>10}'.format('adaptive' if adaptive else 'none', concurrency, summary['elapsed'], summary['throughput'], summary['failures'], server.throttled))
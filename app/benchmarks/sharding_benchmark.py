@@ -0,0 +1,79 @@
+""" Benchmark of sharded lookups scaling from 1 to N processes (parsing stub pages, or fetching them from a stub source) """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functools import partial
+import argparse
+
+from core import extraction
+from core.asynchttpbackend import AsyncHttpLookupEngine
+from core.sharding import ShardedLookupEngine
+
+from stubserver import StubSourceServer, page_template, stubAirport
+
+# An engine "looking up" places by building and parsing their stub pages (padded to 'page_kb' kilobytes, like
+# real source pages), measuring the CPU bound part of the lookups without the network
+class PageParsingEngine:
+
+	def __init__(self, page_kb=100):
+		self.padding = '<div class="filler">{}</div>\n'.format('lorem ipsum dolor sit amet ' * 10) * (page_kb * 1024 // 300)
+		self._stopped = False
+
+	def stop(self):
+		self._stopped = True
+
+	def stopped(self):
+		return self._stopped
+
+	def run(self, places, on_result, on_failure=None):
+
+		for key, place in places:
+
+			if self._stopped:
+				break
+
+			name = ', '.join(place)
+			iata, distance = stubAirport(name)
+			html = page_template.format(place=name, iata=iata, distance=distance).replace('<body>', '<body>' + self.padding)
+
+			on_result(key, *extraction.extractNearestAirport(html))
+
+		return {'lookups': len(places), 'failures': 0}
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--places', type=int, default=5000)
+	parser.add_argument('--processes', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count() or 1}))
+	parser.add_argument('--mode', choices=['parse', 'http'], default='parse', help="parse padded stub pages (CPU bound) or fetch them from the stub source")
+	parser.add_argument('--page-kb', type=int, default=100, help='size of the parsed pages (for --mode parse)')
+	parser.add_argument('--latency', type=float, default=0.02, help='seconds the stub source takes per page (for --mode http)')
+	parser.add_argument('--concurrency', type=int, default=50, help='requests in flight per process (for --mode http)')
+	args = parser.parse_args()
+
+	places = [(number, ('City {}'.format(number), 'State {}'.format(number % 30), 'Country {}'.format(number % 7))) for number in range(args.places)]
+
+	print('{} cores'.format(os.cpu_count()))
+	print('{:>10}  {:>10}  {:>12}  {:>8}  {:>7}'.format('processes', 'elapsed', 'lookups/sec', 'speedup', 'wrong'))
+
+	with StubSourceServer(latency=args.latency) as server:
+
+		if args.mode == 'parse':
+			engine_factory = partial(PageParsingEngine, args.page_kb)
+		else:
+			engine_factory = partial(AsyncHttpLookupEngine, concurrency=args.concurrency, url_template=server.url_template)
+
+		base_throughput = None
+		for processes in args.processes:
+
+			results = {}
+			summary = ShardedLookupEngine(engine_factory, processes=processes).run(places, lambda key, iata, distance: results.__setitem__(key, iata))
+
+			# check the results against the stub's airports
+			wrong = sum(results.get(key) != stubAirport(', '.join(place))[0] for key, place in places)
+
+			base_throughput = base_throughput or summary['throughput']
+			print('{:>10}  {:>9.2f}s  {:>12.1f}  {:>7.2f}x  {:>7}'.format(processes, summary['elapsed'], summary['throughput'], summary['throughput'] / base_throughput, wrong))
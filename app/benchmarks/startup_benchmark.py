@@ -0,0 +1,71 @@
+""" Benchmark of the GUI start up import time (using 'python -X importtime'), failing on regressions """
+
+import os
+import sys
+
+import argparse
+import statistics
+import subprocess
+
+# directory of the application modules
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be imported before the first window is shown (they are imported on first use)
+heavy_modules = ['pandas', 'numpy', 'xlrd', 'openpyxl', 'pyarrow', 'scipy', 'selenium', 'lxml', 'httpx']
+
+# import a module in a fresh interpreter, returning {module: (self, cumulative) import time in microseconds}
+# of the module and the modules it imported
+def importTimes(module):
+
+	process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)], cwd=app_dir, capture_output=True, text=True, check=True)
+
+	# (name, self time, cumulative time, nesting depth) of each import, where a module's imports precede it
+	imports = []
+	for line in process.stderr.splitlines():
+
+		if not line.startswith('import time:') or 'self [us]' in line:
+			continue
+
+		self_time, cumulative_time, name = line[len('import time:'):].split('|')
+		imports.append((name.strip(), int(self_time), int(cumulative_time), (len(name) - len(name.lstrip()) - 1) // 2))
+
+	# the module is the last top level import (the interpreter's own start up imports come before it)
+	times = {}
+	for name, self_time, cumulative_time, depth in reversed(imports):
+		if depth == 0 and times:
+			break
+		times[name] = (self_time, cumulative_time)
+
+	return times
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('--module', default='controller', help='module imported to start the application')
+	parser.add_argument('--runs', type=int, default=5)
+	parser.add_argument('--threshold', type=float, default=150.0, help='maximum median import time (in ms)')
+	parser.add_argument('--top', type=int, default=10, help='number of slowest imports to show')
+	args = parser.parse_args()
+
+	runs = [importTimes(args.module) for _ in range(args.runs)]
+	elapsed = statistics.median(times[args.module][1] for times in runs) / 1000
+
+	print("Importing '{}': {:.1f} ms (median of {} runs, threshold {:.0f} ms)".format(args.module, elapsed, args.runs, args.threshold))
+
+	print('Slowest imports (cumulative):')
+	for name, (self_time, cumulative_time) in sorted(runs[-1].items(), key=lambda item: -item[1][1])[1:args.top + 1]:
+		print('  {:>8.1f} ms  {}'.format(cumulative_time / 1000, name))
+
+	failures = []
+
+	imported_heavy_modules = [module for module in heavy_modules if module in runs[-1]]
+	if imported_heavy_modules:
+		failures.append('heavy modules imported at start up: {}'.format(', '.join(imported_heavy_modules)))
+
+	if elapsed > args.threshold:
+		failures.append('import time {:.1f} ms exceeds {:.0f} ms'.format(elapsed, args.threshold))
+
+	for failure in failures:
+		print('FAIL: {}'.format(failure))
+
+	sys.exit(1 if failures else 0)
@@ -0,0 +1,113 @@
+""" Local stub HTTP server standing in for the nearest airport web source """
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_plus
+import threading
+import time
+import zlib
+
+page_template = """<html>
+<head><title>Nearest airport to {place}</title></head>
+<body>
+<h1>Nearest airport to {place}</h1>
+<p>The nearest airport to {place} is <a href="/airport/{iata}">{iata} Regional Airport ({iata})</a>, about {distance} km away.</p>
+</body>
+</html>
+"""
+
+# deterministic (IATA code, distance) for a place, so that results can be checked
+def stubAirport(place):
+
+	checksum = zlib.crc32(place.encode('utf-8'))
+	iata = ''.join(chr(ord('A') + (checksum >> shift) % 26) for shift in (0, 5, 10))
+
+	return iata, checksum % 300 + 1
+
+# A request handler serving a nearest airport page for '/nearest-airport/<place>'
+class StubSourceHandler(BaseHTTPRequestHandler):
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+
+		# throttle the requests beyond the capacity of the server (injected to test the adaptive concurrency)
+		with self.server.lock:
+			self.server.in_flight += 1
+			throttled = self.server.capacity is not None and self.server.in_flight > self.server.capacity
+			if throttled:
+				self.server.throttled += 1
+
+		try:
+			if throttled:
+				self.send_response(429)
+				self.send_header('Retry-After', '1')
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+			else:
+				self._servePage()
+
+		finally:
+			with self.server.lock:
+				self.server.in_flight -= 1
+
+	def _servePage(self):
+
+		time.sleep(self.server.latency)
+
+		prefix = '/nearest-airport/'
+		if not self.path.startswith(prefix):
+			self.send_error(404)
+			return
+
+		place = unquote_plus(self.path[len(prefix):])
+		iata, distance = stubAirport(place)
+
+		body = page_template.format(place=place, iata=iata, distance=distance).encode('utf-8')
+
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/html; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+# A threading HTTP server with a long listen backlog (so that hundreds of concurrent connections are not dropped)
+class StubHTTPServer(ThreadingHTTPServer):
+	request_queue_size = 1024
+
+# A stub source server running in a background thread (with a fixed latency per page), answering HTTP 429
+# to the requests beyond 'capacity' concurrent requests
+class StubSourceServer:
+
+	def __init__(self, latency=0.02, handler=StubSourceHandler, capacity=None):
+
+		self._server = StubHTTPServer(('127.0.0.1', 0), handler)
+		self._server.daemon_threads = True
+		self._server.latency = latency
+
+		self._server.capacity = capacity
+		self._server.lock = threading.Lock()
+		self._server.in_flight = 0
+		self._server.throttled = 0
+
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+	# url template of the stub pages (in the format of 'extraction.source_url_template')
+	@property
+	def url_template(self):
+		return 'http://127.0.0.1:{}/nearest-airport/{{query}}'.format(self._server.server_address[1])
+
+	# number of requests answered with HTTP 429
+	@property
+	def throttled(self):
+		return self._server.throttled
+
+	def __enter__(self):
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc_info):
+		self._server.shutdown()
+		self._server.server_close()
@@ -0,0 +1,227 @@
+""" Headless command line pipeline for VIMAAN (import, preprocess, populate IATAs and export) without the GUI """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from functools import partial
+import argparse
+import signal
+import threading
+import time
+
+from core import compaction
+from core import datareaders
+from core import datawriters
+from core import preprocessing
+from core.population import PopulationJob
+from core.lookupengine import LookupEngine
+from core.lookupbackends import ChromeLookupBackend, HttpLookupBackend, chromeDriver
+from core.browserpool import BrowserPool
+from core.resultcache import ResultCache
+from core.checkpoint import CheckpointJournal
+from core.ratelimit import LookupThrottle
+
+# sources the nearest airports can be looked up from (as for the dashboard, plus plain HTTP)
+lookup_sources = ['chrome', 'async', 'http', 'offline', 'cache']
+
+# print a progress line (overwritten in place) on the standard error
+def showProgress(label, done, total):
+	print('\r{}: {} / {}'.format(label, done, total or '?'), end='', file=sys.stderr, flush=True)
+
+# read all the fields of an input file (the state and country fields as categoricals, and the other fields
+# except 'keep_fields' compacted), numbering the rows as in the spreadsheet (like the 'Import Data' dialog)
+def readData(filename, fields, categorical_fields=(), keep_fields=()):
+
+	reader = datareaders.openReader(filename)
+
+	try:
+		missing_fields = [field for field in fields if field not in reader.header]
+		if missing_fields:
+			raise ValueError("Field(s) {} not found in '{}'".format(', '.join(map(repr, missing_fields)), filename))
+
+		chunks = []
+		read_bytes = 0
+		for chunk, rows_read in reader.iterChunks():
+			read_bytes += sum(compaction.columnBytes(chunk))
+			chunks.append(datareaders.compactChunk(chunk, categorical_fields))
+			showProgress('Reading', rows_read, reader.total_rows)
+		print(file=sys.stderr)
+
+		data = compaction.compactData(datareaders.concatChunks(chunks, reader.header, categorical_fields), keep_fields)
+		print('Compacted the data from {} to {} in memory'.format(compaction.formatBytes(read_bytes), compaction.formatBytes(sum(compaction.columnBytes(data)))), file=sys.stderr)
+
+	finally:
+		reader.close()
+
+	data.index += 2
+	return data
+
+# remove (in place) the records with missing place names and the duplicate records, as chosen
+def preprocessData(data, fields, drop_missing=False, remove_duplicates=False):
+
+	removed = {}
+
+	if drop_missing:
+		positions = preprocessing.missingRecordPositions(data, fields)
+		data.drop(index=data.index[positions], inplace=True)
+		removed['missing'] = len(positions)
+
+	if remove_duplicates:
+		positions = preprocessing.duplicateRecordPositions(data, fields)
+		data.drop(index=data.index[positions], inplace=True)
+		removed['duplicate'] = len(positions)
+
+	return removed
+
+# the engine looking up the nearest airports from the chosen source (or None to fill in only cached IATAs),
+# with the pool of browsers for lookups with Chrome; web lookups go through a rate limit and adaptive concurrency
+# (up to --workers) unless --fixed-concurrency is given, and are sharded across --processes processes
+def lookupEngine(args, browser_pool=None):
+
+	if args.source == 'cache':
+		return None
+
+	if args.source == 'offline':
+
+		from core.airportindex import AirportIndex, OfflineResolver
+		from core.gazetteer import Gazetteer
+
+		if args.airports is None or args.gazetteer is None:
+			raise ValueError('Offline lookups need --airports and --gazetteer')
+
+		return OfflineResolver(AirportIndex.fromOurAirports(args.airports), Gazetteer.open(args.gazetteer))
+
+	if args.source == 'chrome':
+
+		if browser_pool is None:
+			raise ValueError('Lookups with Chrome need --chromedriver')
+		if args.processes > 1:
+			raise ValueError('Lookups with Chrome cannot be sharded across processes (the browsers already run in their own processes)')
+
+	# (the rate limit is split between the processes)
+	rate = args.rate / args.processes if args.rate else None
+	throttle = LookupThrottle(args.workers, rate=rate, initial_concurrency=min(args.workers, 4), adaptive=not args.fixed_concurrency)
+
+	if args.source == 'async':
+
+		from core.asynchttpbackend import AsyncHttpLookupEngine
+
+		engine_factory = partial(AsyncHttpLookupEngine, concurrency=args.workers, retries=args.retries, throttle=throttle)
+
+	else:
+		backend_factory = partial(ChromeLookupBackend, browser_pool) if args.source == 'chrome' else HttpLookupBackend
+		engine_factory = partial(LookupEngine, backend_factory, workers=args.workers, retries=args.retries, throttle=throttle)
+
+	if args.processes > 1:
+
+		from core.sharding import ShardedLookupEngine
+
+		return ShardedLookupEngine(engine_factory, processes=args.processes, work_dir=args.work_dir)
+
+	return engine_factory()
+
+def main(argv=None):
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument('input', help='input spreadsheet (xlsx, xls, csv, parquet or feather)')
+	parser.add_argument('output', help='output file (csv, xlsx or parquet)')
+
+	fields = parser.add_argument_group('fields mapping')
+	fields.add_argument('--city', required=True, help='field of the city names')
+	fields.add_argument('--state', required=True, help='field of the state names')
+	fields.add_argument('--country', required=True, help='field of the country names')
+	fields.add_argument('--iata', required=True, help='field to write the IATAs to (added when not in the input)')
+
+	preprocess = parser.add_argument_group('preprocessing')
+	preprocess.add_argument('--drop-missing', action='store_true', help='remove records with missing city, state or country names')
+	preprocess.add_argument('--remove-duplicates', action='store_true', help='remove records with duplicate city, state and country names')
+
+	lookup = parser.add_argument_group('lookups')
+	lookup.add_argument('--source', choices=lookup_sources, default='http', help="where to look up the nearest airports ('cache' only fills in cached IATAs)")
+	lookup.add_argument('--workers', type=int, default=4, help='number of concurrent lookups (threads, or requests in flight for --source async)')
+	lookup.add_argument('--retries', type=int, default=3)
+	lookup.add_argument('--rate', type=float, help='maximum requests per second to the web source (no limit by default)')
+	lookup.add_argument('--fixed-concurrency', action='store_true', help='always run --workers lookups at once (instead of adapting the concurrency to throttling and latency)')
+	lookup.add_argument('--processes', type=int, default=1, help='processes to shard the lookups across (each running --workers lookups)')
+	lookup.add_argument('--work-dir', help='directory of the shards of --processes lookups, which workers on other machines can share (a temporary directory by default)')
+	lookup.add_argument('--chromedriver', help='ChromeDriver executable (for --source chrome)')
+	lookup.add_argument('--max-pages', type=int, default=500, help='pages a browser loads before it is relaunched (for --source chrome)')
+	lookup.add_argument('--airports', help="OurAirports 'airports.csv' (for --source offline)")
+	lookup.add_argument('--gazetteer', help='GeoNames dump or gazetteer index (for --source offline)')
+	lookup.add_argument('--cache', default=ResultCache.default_path, help='results cache file (default: %(default)s)')
+	lookup.add_argument('--no-cache', action='store_true', help='neither read nor write the results cache')
+	lookup.add_argument('--checkpoint-dir', default=CheckpointJournal.default_dir, help='directory of the journals to resume interrupted runs from (default: %(default)s)')
+	lookup.add_argument('--no-checkpoint', action='store_true', help='neither resume from nor journal to a checkpoint')
+
+	args = parser.parse_args(argv)
+
+	place_fields = [args.city, args.state, args.country]
+
+	try:
+		start = time.perf_counter()
+
+		# the state and country names repeat a lot (unless the iata field is one of them)
+		data = readData(args.input, place_fields, [field for field in (args.state, args.country) if field != args.iata], [args.iata])
+		print('Read {} records in {:.1f}s'.format(len(data), time.perf_counter() - start), file=sys.stderr)
+
+		removed = preprocessData(data, place_fields, args.drop_missing, args.remove_duplicates)
+		for kind, count in removed.items():
+			print('Removed {} {} records'.format(count, kind), file=sys.stderr)
+
+		if args.iata not in data:
+			data[args.iata] = None
+
+		# fail before looking up anything for unsupported output formats
+		datawriters.outputFormat(args.output)
+
+		# one browser per worker, kept open across the lookups
+		browser_pool = None
+		if args.source == 'chrome' and args.chromedriver is not None:
+			browser_pool = BrowserPool(partial(chromeDriver, args.chromedriver), size=args.workers, max_pages=args.max_pages)
+
+		engine = lookupEngine(args, browser_pool)
+		cache = None if args.no_cache else ResultCache(args.cache)
+		checkpoint = None if args.no_checkpoint else CheckpointJournal.open(args.input, [args.city, args.state, args.country, args.iata], args.checkpoint_dir)
+
+		# stop looking up on interrupt, still writing the IATAs found so far
+		if engine is not None:
+			signal.signal(signal.SIGINT, lambda signum, frame: engine.stop())
+			signal.signal(signal.SIGTERM, lambda signum, frame: engine.stop())
+
+		job = PopulationJob(data, args.city, args.state, args.country, args.iata, cache=cache, source=args.source, checkpoint=checkpoint)
+		iata_column = data.columns.get_loc(args.iata)
+		lock = threading.Lock()
+
+		# write the iata's into the data as they arrive (from the lookup threads)
+		def resultsReady(positions, iatas):
+			with lock:
+				data.iloc[positions, iata_column] = iatas
+
+		try:
+			summary = job.run(engine, resultsReady, partial(showProgress, 'Looking up'))
+		finally:
+			if cache is not None:
+				cache.close()
+			if browser_pool is not None:
+				browser_pool.close()
+
+		if summary['lookups'] or summary['failures']:
+			print(file=sys.stderr)
+		print('Looked up {} of {} unique places for {} rows ({} from cache, {} failed) in {:.1f}s, {:.2f} lookups/sec with {} workers'.format(summary['lookups'], summary['keys'], summary['rows'], summary['cached'], summary['failures'], summary['elapsed'], summary['throughput'], summary['workers']), file=sys.stderr)
+		if summary['resumed']:
+			print('Resumed {} places from an interrupted run'.format(summary['resumed']), file=sys.stderr)
+
+		datawriters.writeData(data, args.output, on_progress=partial(showProgress, 'Writing'))
+		print(file=sys.stderr)
+		print('Wrote {} records to {}'.format(len(data), args.output), file=sys.stderr)
+
+	except Exception as error:
+		print('ERROR: {}'.format(error), file=sys.stderr)
+		return 1
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -1,16 +1,13 @@
-# import necessary widgets and windows
+# import necessary widgets and windows (the other dialogs, the models, the workers and the core modules
+# importing pandas are imported on first use, to show the first window quickly)
 from dialogs.firststepsdialog import FirstStepsDialog
 from mainwindows.dashboardwindow import DashboardWindow
-from dialogs.importdatadialog import ImportDataDialog
-from dialogs.preprocessdatadialog import PreprocessDataDialog
 
-from PyQt5.QtWidgets import QApplication, QFileDialog
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
 from PyQt5.QtCore import Qt, QAbstractTableModel, QDir
+from functools import partial
 import sys
 
-# import necessary models
-from models.dataframemodel import DataFrameModel
-
 # Create a Application Controller class
 class ControlledApplication(QApplication):
 	
@@ -21,6 +18,12 @@ class ControlledApplication(QApplication):
 		# chrome driver location
 		self.chromedriver_path = None
 
+		# index of the airports dataset and the gazetteer geocoding places (for offline lookups)
+		self.airports_dataset_path = None
+		self.airport_index = None
+		self.geocoder = None
+		self._gazetteer_worker = None
+
 		# imported data and mapping details
 		self.filename = None
 
@@ -30,25 +33,40 @@ class ControlledApplication(QApplication):
 
 		self.iata_field = None
 
-		# create the data models for use by controller
-		self.data_model = DataFrameModel()
+		# the data model for use by controller (created when data is first imported)
+		self.data_model = None
+
+		# running population of iata's, the persistent cache of looked up iata's and the pool of browsers
+		# (kept open across population runs)
+		self._populate_worker = None
+		self._result_cache = None
+		self._browser_pool = None
+
+		# running export of the data
+		self._export_worker = None
 
 	# initialise main window and start main event loop
 	def startApplication(self):
 
 		# create the dashboard window
 		self.dashboard_window = DashboardWindow()
-		self.dashboard_window.setDataModel(self.data_model)
 
 		self.dashboard_window.select_chromedriver_menu_pressed.connect(self.selectChromeDriver)
 		self.dashboard_window.import_data_menu_pressed.connect(self.showImportDataDialog)
 		self.dashboard_window.preprocess_data_menu_pressed.connect(self.showPreprocessDataDialog)
+		self.dashboard_window.populate_iata_menu_pressed.connect(self.populateIATAs)
+		self.dashboard_window.export_data_menu_pressed.connect(self.exportData)
+		self.dashboard_window.stop_population_pressed.connect(self.stopPopulation)
+		self.dashboard_window.select_airports_dataset_pressed.connect(self.selectAirportsDataset)
+		self.dashboard_window.select_gazetteer_pressed.connect(self.selectGazetteer)
 
 		# create and display the first steps widget
 		first_steps_widget = FirstStepsDialog(parent = self.dashboard_window)
 		first_steps_widget.dialog_closed_signal.connect(self.dashboard_window.show)
 		first_steps_widget.show()
 
+		self.aboutToQuit.connect(self.closeResultCache)
+		self.aboutToQuit.connect(self.closeBrowserPool)
 		self.exec()
 
 	# select the chrome driver executable file
@@ -65,17 +83,91 @@ class ControlledApplication(QApplication):
 
 			self.dashboard_window.enableImportData()
 
+	# select and index the (OurAirports) airports dataset for offline lookups
+	def selectAirportsDataset(self):
+
+		options = QFileDialog.Options()
+		options |= QFileDialog.DontUseNativeDialog
+
+		filename, _ = QFileDialog.getOpenFileName(self.dashboard_window, "Choose Airports Dataset", "airports.csv", "CSV File (*.csv);;All Files (*)", options=options)
+
+		if filename:
+
+			from core.airportindex import AirportIndex
+
+			try:
+				airport_index = AirportIndex.fromOurAirports(filename)
+
+			except Exception as error:
+				error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>Encountered an error in reading the airports dataset.</b> {}".format(error), buttons = QMessageBox.Ok, parent = self.dashboard_window)
+				error_message_dialog.show()
+
+			else:
+				self.airports_dataset_path = filename
+				self.airport_index = airport_index
+
+				self.dashboard_window.setAirportsDatasetPath(filename)
+				self.dashboard_window.setLookupSource('offline')
+
+				self.dashboard_window.enableImportData()
+
+	# select a gazetteer index (or a GeoNames dump to build the index of) for geocoding places offline
+	def selectGazetteer(self):
+
+		options = QFileDialog.Options()
+		options |= QFileDialog.DontUseNativeDialog
+
+		filename, _ = QFileDialog.getOpenFileName(self.dashboard_window, "Choose Gazetteer (index or GeoNames dump)", "", "Gazetteer Index (gazetteer.json);;GeoNames Dump (*.txt);;All Files (*)", options=options)
+
+		if filename:
+
+			from workers.taskworker import TaskWorker
+			from core.gazetteer import Gazetteer
+
+			# building the index of a dump takes a while (so open it in a background thread)
+			self._gazetteer_worker = TaskWorker(Gazetteer.open, filename, parent=self.dashboard_window)
+			self._gazetteer_worker.task_finished.connect(self.gazetteerOpened)
+			self._gazetteer_worker.task_failed.connect(self.gazetteerFailed)
+
+			self.dashboard_window.select_gazetteer_btn.setEnabled(False)
+			self.dashboard_window.setGazetteerPath('Indexing {}. Please wait ...'.format(filename))
+			self._gazetteer_worker.start()
+
+	# slot to use the opened gazetteer for geocoding
+	def gazetteerOpened(self, gazetteer):
+
+		self._gazetteer_worker.wait()
+		self._gazetteer_worker = None
+
+		self.geocoder = gazetteer
+
+		self.dashboard_window.select_gazetteer_btn.setEnabled(True)
+		self.dashboard_window.setGazetteerPath(gazetteer.index_dir)
+
+	def gazetteerFailed(self, error):
+
+		self._gazetteer_worker.wait()
+		self._gazetteer_worker = None
+
+		self.dashboard_window.select_gazetteer_btn.setEnabled(True)
+		self.dashboard_window.setGazetteerPath('' if self.geocoder is None else self.geocoder.index_dir)
+
+		error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>Encountered an error in opening the gazetteer.</b> {}".format(error), buttons = QMessageBox.Ok, parent = self.dashboard_window)
+		error_message_dialog.show()
+
 	# show the import data dialog
 	def showImportDataDialog(self):
 
+		from dialogs.importdatadialog import ImportDataDialog
+
 		import_data_dialog = ImportDataDialog(parent=self.dashboard_window)
 		import_data_dialog.data_import_finish_signal.connect(self.dataImported)
 
 		self._active_dialog = import_data_dialog
 		import_data_dialog.show()
 
-	# slot to handle imported data details (imported using import data dialog)
-	def dataImported(self, filename, cityname_field, statename_field, countryname_field, iata_field, data):
+	# slot to handle imported data details (imported using import data dialog) and the report of its memory
+	def dataImported(self, filename, cityname_field, statename_field, countryname_field, iata_field, data, memory_report):
 
 		self._active_dialog = None
 
@@ -88,18 +180,275 @@ class ControlledApplication(QApplication):
 		self.iata_field = iata_field
 		
 		self.dashboard_window.setImportedDataDetails(filename, cityname_field, statename_field, countryname_field, iata_field)
-		self.data_model.resetData(data)
+		self.dashboard_window.showMemoryReport(memory_report)
+
+		if self.data_model is None:
+
+			from models.dataframemodel import DataFrameModel
+
+			self.data_model = DataFrameModel(data)
+			self.dashboard_window.setDataModel(self.data_model)
+
+		else:
+			self.data_model.resetData(data)
 
 		self.dashboard_window.enablePreprocessData()
 		self.dashboard_window.enablePopulateIATAs()
+		self.dashboard_window.enableExportData()
+
+		# fill in the iata's of places already in the cache
+		self.startPopulation(None, 'Filling IATAs from cache. Please wait ...')
 
 	def showPreprocessDataDialog(self):
+
+		# preprocessing may remove rows, moving the rows the running population writes its results to
+		if self._populate_worker is not None:
+			error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>IATAs are being populated.</b> Stop the population before preprocessing the data.", buttons = QMessageBox.Ok, parent = self.dashboard_window)
+			error_message_dialog.show()
+			return
+
+		from dialogs.preprocessdatadialog import PreprocessDataDialog
 		
-		preprocess_data_dialog = PreprocessDataDialog(parent=self.dashboard_window, data=self.data_model._data, fields=[self.cityname_field, self.statename_field, self.countryname_field])
+		preprocess_data_dialog = PreprocessDataDialog(parent=self.dashboard_window, data_model=self.data_model, fields=[self.cityname_field, self.statename_field, self.countryname_field], gazetteer=self.geocoder)
+
+		preprocess_data_dialog.preprocess_finish_signal.connect(self.dataPreprocessed)
 
 		self._active_dialog = preprocess_data_dialog
 		preprocess_data_dialog.show()
 
+	# slot to report the records removed by preprocessing (through the data model)
+	def dataPreprocessed(self, removed_records):
+
+		self._active_dialog = None
+
+		if removed_records:
+			self.dashboard_window.showPopulationFinished('Removed <b>{}</b> duplicate records'.format(removed_records))
+
+	# the persistent cache of looked up iata's (opened on first use)
+	def resultCache(self):
+
+		if self._result_cache is None:
+			from core.resultcache import ResultCache
+			self._result_cache = ResultCache()
+		return self._result_cache
+
+	def closeResultCache(self):
+
+		if self._result_cache is not None:
+			self._result_cache.close()
+			self._result_cache = None
+
+	# the pool of headless browsers for the lookup workers (relaunched when the driver or worker count changes)
+	def browserPool(self, workers):
+
+		if self._browser_pool is not None and (self._browser_pool.driver_factory.args != (self.chromedriver_path,) or self._browser_pool.size != workers):
+			self.closeBrowserPool()
+
+		if self._browser_pool is None:
+			from core.browserpool import BrowserPool
+			from core.lookupbackends import chromeDriver
+			self._browser_pool = BrowserPool(partial(chromeDriver, self.chromedriver_path), size=workers)
+
+		return self._browser_pool
+
+	def closeBrowserPool(self):
+
+		if self._browser_pool is not None:
+			self._browser_pool.close()
+			self._browser_pool = None
+
+	# rate limit (per host, as chosen on the dashboard, split between 'processes') and adaptive concurrency
+	# (up to 'workers') of web lookups
+	def lookupThrottle(self, workers, processes=1):
+
+		from core.ratelimit import LookupThrottle
+
+		rate = self.dashboard_window.requestRate()
+		return LookupThrottle(workers, rate=rate / processes if rate else None, initial_concurrency=min(workers, 4))
+
+	# journal of the population runs over the imported file (with its fields mapping), to resume interrupted runs
+	def populationCheckpoint(self):
+
+		from core.checkpoint import CheckpointJournal
+
+		try:
+			return CheckpointJournal.open(self.filename, [self.cityname_field, self.statename_field, self.countryname_field, self.iata_field])
+		except OSError:
+			return None
+
+	# look up the nearest airports of the imported places (in a background thread)
+	def populateIATAs(self):
+
+		if self._populate_worker is not None:
+			return
+
+		source = self.dashboard_window.lookupSource()
+
+		if source == 'offline':
+
+			if self.airport_index is None or self.geocoder is None:
+				error_message_dialog = QMessageBox(QMessageBox.Warning, " ", "<b>Offline lookups need an airports dataset and a gazetteer to geocode the places.</b>", buttons = QMessageBox.Ok, parent = self.dashboard_window)
+				error_message_dialog.show()
+				return
+
+			from core.airportindex import OfflineResolver
+
+			engine = OfflineResolver(self.airport_index, self.geocoder)
+
+		elif source == 'async':
+
+			from core.asynchttpbackend import AsyncHttpLookupEngine
+
+			workers = self.dashboard_window.lookupWorkers()
+			processes = self.dashboard_window.lookupProcesses()
+
+			engine_factory = partial(AsyncHttpLookupEngine, concurrency=workers, throttle=self.lookupThrottle(workers, processes))
+
+			if processes > 1:
+				from core.sharding import ShardedLookupEngine
+				engine = ShardedLookupEngine(engine_factory, processes=processes)
+			else:
+				engine = engine_factory()
+
+		else:
+
+			if self.chromedriver_path is None:
+				error_message_dialog = QMessageBox(QMessageBox.Warning, " ", "<b>Select the ChromeDriver to look up IATAs from the web.</b>", buttons = QMessageBox.Ok, parent = self.dashboard_window)
+				error_message_dialog.show()
+				return
+
+			from core.lookupengine import LookupEngine
+			from core.lookupbackends import ChromeLookupBackend
+
+			workers = self.dashboard_window.lookupWorkers()
+			engine = LookupEngine(partial(ChromeLookupBackend, self.browserPool(workers)), workers=workers, throttle=self.lookupThrottle(workers))
+
+		self.startPopulation(engine, 'Populating IATAs. Please wait ...', source)
+
+	# run a population job with the engine (or fill in only the cached iata's when no engine is given)
+	def startPopulation(self, engine, status_text, source=None):
+
+		if self._populate_worker is not None:
+			return
+
+		from workers.populateworker import PopulateWorker
+		from core.population import PopulationJob
+
+		job = PopulationJob(self.data_model._data, self.cityname_field, self.statename_field, self.countryname_field, self.iata_field, cache=self.resultCache(), source=source, checkpoint=self.populationCheckpoint())
+		job.prepareOutputField()
+
+		self._populate_worker = PopulateWorker(job, engine, parent=self.dashboard_window)
+
+		self._populate_worker.results_ready.connect(self.iataResultsReady)
+		self._populate_worker.progress.connect(self.dashboard_window.showPopulationProgress)
+		self._populate_worker.throttle_state.connect(self.dashboard_window.showThrottleState)
+		self._populate_worker.population_finished.connect(self.populationFinished)
+		self._populate_worker.population_failed.connect(self.populationFailed)
+
+		self.dashboard_window.showPopulationStarted(status_text)
+		self._populate_worker.start()
+
+	# stop the running population of iata's
+	def stopPopulation(self):
+
+		if self._populate_worker is not None:
+			self._populate_worker.stop()
+
+		if self._export_worker is not None:
+			self._export_worker.requestInterruption()
+
+	# export the data (with the populated iata's and the fields of the input file that were not imported) to an
+	# xlsx, csv or parquet file (in a background thread)
+	def exportData(self):
+
+		options = QFileDialog.Options()
+		options |= QFileDialog.DontUseNativeDialog
+
+		filename, selected_filter = QFileDialog.getSaveFileName(self.dashboard_window, "Export Data", "", "Excel Workbook (*.xlsx);;CSV File (*.csv);;Parquet File (*.parquet)", options=options)
+
+		if not filename or self._export_worker is not None:
+			return
+
+		# add the extension of the chosen format when none is given
+		extension = selected_filter[selected_filter.index('*') + 1:-1]
+		if not filename.lower().endswith(('.xlsx', '.csv', '.parquet')):
+			filename += extension
+
+		from workers.taskworker import TaskWorker
+		from core import datawriters
+
+		self._export_worker = TaskWorker(datawriters.exportData, self.data_model._data, self.filename, filename, parent=self.dashboard_window, track_progress=True)
+		self._export_worker.progress.connect(self.dashboard_window.showPopulationProgress)
+		self._export_worker.task_finished.connect(lambda result: self.dataExported(filename, *result))
+		self._export_worker.task_cancelled.connect(lambda: self.exportFinished('Export to {} stopped'.format(filename)))
+		self._export_worker.task_failed.connect(self.exportFailed)
+
+		self.dashboard_window.showPopulationStarted('Exporting data. Please wait ...', '%v / %m rows')
+		self._export_worker.start()
+
+	# show the summary of the export, warning when the fields that were not imported could not be read back
+	def dataExported(self, filename, rows, source_error):
+
+		if source_error is None:
+			self.exportFinished('Exported <b>{}</b> records to {}'.format(rows, filename))
+			return
+
+		self.exportFinished('Exported <b>{}</b> records to {} (only the imported fields)'.format(rows, filename))
+
+		warning_message_dialog = QMessageBox(QMessageBox.Warning, " ", "<b>Exported only the imported fields:</b> the other fields of the input file could not be read back. {}".format(source_error), buttons = QMessageBox.Ok, parent = self.dashboard_window)
+		warning_message_dialog.show()
+
+	def exportFinished(self, summary_text):
+
+		self._export_worker.wait()
+		self._export_worker = None
+
+		self.dashboard_window.showPopulationFinished(summary_text)
+
+	def exportFailed(self, error):
+
+		self.exportFinished('Exporting data failed')
+
+		error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>Encountered an error in exporting the data.</b> {}".format(error), buttons = QMessageBox.Ok, parent = self.dashboard_window)
+		error_message_dialog.show()
+
+	# slot to write the looked up iata's into the data (as they arrive)
+	def iataResultsReady(self, positions, iatas):
+		self.data_model.setColumnValues(self.iata_field, positions, iatas)
+
+	# slot to show the summary of the finished population
+	def populationFinished(self, summary):
+
+		cache_only = self._populate_worker.engine is None
+
+		self._populate_worker.wait()
+		self._populate_worker = None
+
+		if cache_only:
+			summary_text = 'Filled <b>{}</b> of {} unique places for {} rows from cache'.format(summary['cached'], summary['keys'], summary['rows'])
+		else:
+			summary_text = 'Looked up <b>{}</b> of {} unique places for {} rows ({} from cache, {} failed) in {:.1f}s, {:.2f} lookups/sec with {} workers'.format(summary['lookups'], summary['keys'], summary['rows'], summary['cached'], summary['failures'], summary['elapsed'], summary['throughput'], summary['workers'])
+
+		if summary['resumed']:
+			summary_text += ', resumed {} places from an interrupted run'.format(summary['resumed'])
+
+		self.dashboard_window.showPopulationFinished(summary_text)
+
+		if summary['errors'] and not summary['lookups']:
+			error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>Could not start the lookup workers.</b> {}".format(summary['errors'][0]), buttons = QMessageBox.Ok, parent = self.dashboard_window)
+			error_message_dialog.show()
+
+	# slot to show the error that stopped the population
+	def populationFailed(self, error):
+
+		self._populate_worker.wait()
+		self._populate_worker = None
+
+		self.dashboard_window.showPopulationFinished('Populating IATAs failed')
+
+		error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>Encountered an error in populating IATAs.</b> {}".format(error), buttons = QMessageBox.Ok, parent = self.dashboard_window)
+		error_message_dialog.show()
+
 # Test the application
 if __name__ == '__main__':
 	
@@ -0,0 +1,129 @@
+""" Offline nearest airport resolution over a spatial index of airport coordinates """
+
+import time
+
+import numpy as np
+import pandas as pd
+
+# mean radius of the earth (in km)
+earth_radius = 6371.0088
+
+# convert latitudes and longitudes (in degrees) to points on the unit sphere
+def unitVectors(latitudes, longitudes):
+
+	latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+	longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+	cos_latitudes = np.cos(latitudes)
+	return np.column_stack((cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)))
+
+# A KD-tree of airports on the unit sphere (the nearest point by chord length is the nearest by great circle)
+class AirportIndex:
+
+	# airport types of an OurAirports dataset having scheduled passenger flights (by default)
+	default_airport_types = ('large_airport', 'medium_airport')
+
+	def __init__(self, iatas, latitudes, longitudes):
+
+		from scipy.spatial import cKDTree
+
+		self.iatas = np.asarray(iatas, dtype=object)
+		self._tree = cKDTree(unitVectors(latitudes, longitudes))
+
+	def __len__(self):
+		return len(self.iatas)
+
+	# load the airports having IATA codes from an OurAirports 'airports.csv' (or any CSV file
+	# with 'iata_code', 'latitude_deg' and 'longitude_deg' fields)
+	@classmethod
+	def fromOurAirports(cls, filename, airport_types=default_airport_types):
+
+		header = pd.read_csv(filename, nrows=0).columns
+		usecols = ['iata_code', 'latitude_deg', 'longitude_deg'] + (['type'] if 'type' in header else [])
+
+		airports = pd.read_csv(filename, usecols=usecols, keep_default_na=False, na_values=[''])
+		airports = airports[airports['iata_code'].notna() & airports['latitude_deg'].notna() & airports['longitude_deg'].notna()]
+
+		if 'type' in airports and airport_types:
+			airports = airports[airports['type'].isin(airport_types)]
+
+		if airports.empty:
+			raise ValueError('No airports with IATA codes and coordinates found in {}'.format(filename))
+
+		return cls(airports['iata_code'].to_numpy(), airports['latitude_deg'].to_numpy(), airports['longitude_deg'].to_numpy())
+
+	# (IATA codes, distances in km) of the airports nearest to each coordinate in one batch
+	# (missing coordinates get None and NaN)
+	def nearest(self, latitudes, longitudes, workers=1):
+
+		points = unitVectors(latitudes, longitudes)
+		valid = np.isfinite(points).all(axis=1)
+
+		iatas = np.full(len(points), None, dtype=object)
+		distances = np.full(len(points), np.nan)
+
+		chords, airports = self._tree.query(points[valid], k=1, workers=workers)
+
+		iatas[valid] = self.iatas[airports]
+		distances[valid] = 2 * earth_radius * np.arcsin(np.minimum(chords / 2, 1.0))
+
+		return iatas, distances
+
+# A resolver with the interface of the 'LookupEngine', geocoding all the places and finding
+# their nearest airports in vectorised batches instead of looking them up one by one on the web
+class OfflineResolver:
+
+	def __init__(self, airport_index, geocoder, batch_size=100000):
+
+		self.airport_index = airport_index
+
+		# geocoder with a 'geocode(places)' method returning arrays of latitudes and longitudes
+		self.geocoder = geocoder
+		self.batch_size = batch_size
+
+		self.workers = 1
+		self._stopped = False
+
+	def stop(self):
+		self._stopped = True
+
+	def stopped(self):
+		return self._stopped
+
+	# resolve (key, (cityname, statename, countryname)) places, calling 'on_result(key, iata, distance)'
+	# and 'on_failure(key, error)' for the places not found in the gazetteer
+	def run(self, places, on_result, on_failure=None):
+
+		places = list(places)
+		lookups = failures = 0
+
+		start = time.perf_counter()
+		for batch_start in range(0, len(places), self.batch_size):
+
+			if self.stopped():
+				break
+
+			batch = places[batch_start:batch_start + self.batch_size]
+			latitudes, longitudes = self.geocoder.geocode([place for _, place in batch])
+			iatas, distances = self.airport_index.nearest(latitudes, longitudes)
+
+			for (key, place), iata, distance in zip(batch, iatas.tolist(), distances.tolist()):
+				if iata is None:
+					failures += 1
+					if on_failure is not None:
+						on_failure(key, LookupError('Place {} not found in gazetteer'.format(', '.join(map(str, place)))))
+				else:
+					lookups += 1
+					on_result(key, iata, distance)
+
+		elapsed = time.perf_counter() - start
+
+		return {
+			'workers': self.workers,
+			'lookups': lookups,
+			'failures': failures,
+			'elapsed': elapsed,
+			'throughput': lookups / elapsed if elapsed else 0.0,
+			'worker_lookups': [lookups],
+			'errors': [],
+		}
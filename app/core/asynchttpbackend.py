@@ -0,0 +1,216 @@
+""" Lookup engine fetching the source pages with asyncio and httpx (hundreds of requests in flight on one thread) """
+
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from core import extraction
+from core.lookupbackends import HttpLookupBackend, LookupFailed
+
+# whether HTTP/2 can be negotiated (httpx needs the optional 'h2' package for it)
+def http2Available():
+
+	try:
+		import h2
+	except ImportError:
+		return False
+
+	return True
+
+# An engine resolving places with 'concurrency' lookup tasks sharing pooled (keep-alive) httpx clients, run on
+# an event loop in the calling thread; it has the interface of 'core.lookupengine.LookupEngine'
+class AsyncHttpLookupEngine:
+
+	# connections of each client (httpx scans all the connections of its pool for every request, so that one
+	# client for hundreds of connections spends more time in the pool than on the requests)
+	connections_per_client = 10
+
+	# seconds between checks of a task held back by the throttle
+	throttle_poll = 0.1
+
+	def __init__(self, concurrency=100, url_template=extraction.source_url_template, timeout=30, retries=3, backoff=1.0, max_backoff=30.0, http2=None, throttle=None):
+
+		self.concurrency = concurrency
+		self.url_template = url_template
+		self.timeout = timeout
+
+		# rate limiter and adaptive concurrency ('core.ratelimit.LookupThrottle') of the requests, with
+		# 'concurrency' as the maximum concurrency
+		self.throttle = throttle
+
+		# retry failed lookups after exponentially growing (jittered) delays
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+
+		self.http2 = http2Available() if http2 is None else http2
+
+		self._stop_event = threading.Event()
+
+		# event loop of the running lookups and its stop event (set from other threads on stopping)
+		self._loop = None
+		self._async_stop_event = None
+
+	# stop the running lookups (the requests in flight are finished)
+	def stop(self):
+
+		self._stop_event.set()
+
+		loop = self._loop
+		if loop is not None:
+			try:
+				loop.call_soon_threadsafe(self._async_stop_event.set)
+			except RuntimeError:
+				pass
+
+	def stopped(self):
+		return self._stop_event.is_set()
+
+	# resolve (key, (cityname, statename, countryname)) places, calling 'on_result(key, iata, distance)'
+	# and 'on_failure(key, error)' as lookups complete
+	def run(self, places, on_result, on_failure=None):
+
+		start = time.perf_counter()
+		task_lookups, task_failures, errors = asyncio.run(self._run(places, on_result, on_failure))
+		elapsed = time.perf_counter() - start
+
+		lookups = sum(task_lookups)
+
+		return {
+			'workers': self.concurrency,
+			'lookups': lookups,
+			'failures': sum(task_failures),
+			'elapsed': elapsed,
+			'throughput': lookups / elapsed if elapsed else 0.0,
+			'worker_lookups': task_lookups,
+			'errors': [str(error) for error in errors],
+		}
+
+	async def _run(self, places, on_result, on_failure):
+
+		import httpx
+
+		self._loop = asyncio.get_running_loop()
+		self._async_stop_event = asyncio.Event()
+		if self.stopped():
+			self._async_stop_event.set()
+
+		tasks = asyncio.Queue()
+		for place in places:
+			tasks.put_nowait(place)
+
+		task_lookups = [0] * self.concurrency
+		task_failures = [0] * self.concurrency
+		errors = []
+
+		limits = httpx.Limits(max_connections=self.connections_per_client, max_keepalive_connections=self.connections_per_client)
+		headers = {'User-Agent': HttpLookupBackend.user_agent}
+
+		clients = [httpx.AsyncClient(http2=self.http2, limits=limits, timeout=self.timeout, headers=headers, follow_redirects=True) for _ in range(-(-self.concurrency // self.connections_per_client))]
+
+		try:
+			await asyncio.gather(*(self._work(number, clients[number // self.connections_per_client], tasks, on_result, on_failure, task_lookups, task_failures) for number in range(self.concurrency)))
+
+		except Exception as error:
+			errors.append(error)
+
+		finally:
+			for client in clients:
+				await client.aclose()
+			self._loop = None
+
+		# places left over when the client failed
+		if errors and not self.stopped():
+			while not tasks.empty():
+				key, _ = tasks.get_nowait()
+				task_failures[0] += 1
+				if on_failure is not None:
+					on_failure(key, errors[0])
+
+		return task_lookups, task_failures, errors
+
+	# look up places from the queue until it is empty (or the engine is stopped)
+	async def _work(self, number, client, tasks, on_result, on_failure, task_lookups, task_failures):
+
+		host = urlsplit(self.url_template).netloc
+
+		while not self.stopped():
+
+			# wait while the throttle holds this task back (unless there is nothing left to look up)
+			if self.throttle is not None and not self.throttle.active(number):
+				if tasks.empty():
+					break
+				await self._wait(self.throttle_poll)
+				continue
+
+			try:
+				key, place = tasks.get_nowait()
+			except asyncio.QueueEmpty:
+				break
+
+			for attempt in range(self.retries + 1):
+
+				if self.throttle is not None:
+					await self._wait(self.throttle.reserve(host))
+
+				started = time.perf_counter()
+				try:
+					iata, distance = await self.lookup(client, *place)
+
+				except LookupFailed as error:
+					self._record(started)
+					task_failures[number] += 1
+					if on_failure is not None:
+						on_failure(key, error)
+					break
+
+				except Exception as error:
+					self._record(started, error)
+					if attempt == self.retries or self.stopped():
+						task_failures[number] += 1
+						if on_failure is not None:
+							on_failure(key, error)
+						break
+
+					delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+					await self._wait(delay * random.uniform(0.5, 1.0))
+
+				else:
+					self._record(started)
+					task_lookups[number] += 1
+					on_result(key, iata, distance)
+					break
+
+	# wait for some seconds (or until the engine is stopped)
+	async def _wait(self, seconds):
+
+		if seconds <= 0:
+			return
+
+		try:
+			await asyncio.wait_for(self._async_stop_event.wait(), seconds)
+		except asyncio.TimeoutError:
+			pass
+
+	# report the latency and error of a request to the throttle
+	def _record(self, started, error=None):
+		if self.throttle is not None:
+			self.throttle.record(time.perf_counter() - started, error)
+
+	# look up the (IATA code, distance in km) of the airport nearest to a place
+	async def lookup(self, client, cityname, statename, countryname):
+
+		url = extraction.sourceUrl(cityname, statename, countryname, self.url_template)
+		response = await client.get(url)
+
+		# pages that do not exist will not appear on retrying (unlike throttling and server errors)
+		if response.status_code in (400, 404, 410):
+			raise LookupFailed('HTTP {} for {}'.format(response.status_code, url))
+		response.raise_for_status()
+
+		try:
+			return extraction.extractNearestAirport(response.text)
+		except extraction.ExtractionError as error:
+			raise LookupFailed('{} ({})'.format(error, url))
@@ -0,0 +1,270 @@
+""" Pool of long-lived headless browser sessions reused across lookups (and population runs) """
+
+import os
+import sys
+import threading
+import time
+
+# A browser session (a driver with the counters deciding when to recycle it)
+class BrowserSession:
+
+	def __init__(self, number, driver):
+
+		self.number = number
+		self.driver = driver
+
+		self.pages = 0
+		self.started = time.monotonic()
+		self.last_used = self.started
+
+		# memory used by the browser after the first navigation (the baseline memory growth is measured against)
+		self.baseline_memory = None
+		self.memory = None
+
+# whether it was reported that the browser memory cannot be measured (which is reported once)
+_memory_unavailable_reported = False
+
+# report (once) that the browser memory cannot be measured, so that sessions are recycled by their pages only
+def _memoryUnavailable(reason):
+
+	global _memory_unavailable_reported
+	if not _memory_unavailable_reported:
+		_memory_unavailable_reported = True
+		print('Cannot measure the browser memory ({}), browser sessions are recycled by their pages only'.format(reason), file=sys.stderr)
+
+	return None
+
+# resident memory (in bytes) of a process from '/proc/<pid>/status' (0 when the process is gone)
+def _residentMemory(pid):
+
+	try:
+		with open('/proc/{}/status'.format(pid)) as status:
+			for line in status:
+				if line.startswith('VmRSS:'):
+					return int(line.split()[1]) * 1024
+	except (OSError, ValueError):
+		pass
+
+	return 0
+
+# resident memory (in bytes) of a process and all its descendants from '/proc' (on Linux, without psutil)
+def _procTreeMemory(pid):
+
+	if not os.path.exists('/proc/self/status'):
+		return _memoryUnavailable('psutil is not installed and /proc is not available')
+
+	# the child processes of each process, from the parent process ids in '/proc/<pid>/stat'
+	children = {}
+	for entry in os.listdir('/proc'):
+		if entry.isdigit():
+			try:
+				with open('/proc/{}/stat'.format(entry)) as stat:
+					parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+			except (OSError, ValueError, IndexError):
+				continue
+			children.setdefault(parent, []).append(int(entry))
+
+	memory = 0
+	pending = [pid]
+	while pending:
+		pid = pending.pop()
+		memory += _residentMemory(pid)
+		pending.extend(children.get(pid, ()))
+
+	return memory
+
+# resident memory (in bytes) of a process and all its descendants, with psutil or else from '/proc' (None when the
+# process is gone or the memory cannot be measured)
+def processTreeMemory(pid):
+
+	try:
+		import psutil
+	except ImportError:
+		return _procTreeMemory(pid)
+
+	try:
+		root = psutil.Process(pid)
+		processes = [root] + root.children(recursive=True)
+	except psutil.Error:
+		return None
+
+	memory = 0
+	for process in processes:
+		try:
+			memory += process.memory_info().rss
+		except psutil.Error:
+			pass
+
+	return memory
+
+# resident memory (in bytes) of the processes of a driver's browser: the driver process and all its descendants
+# (None when the memory cannot be measured, e.g. for a remote driver without a local process)
+def driverMemory(driver):
+
+	process = getattr(getattr(driver, 'service', None), 'process', None)
+	if process is None:
+		return _memoryUnavailable('the driver has no local process')
+
+	return processTreeMemory(process.pid)
+
+# A pool of up to 'size' browser sessions made by 'driver_factory()' (launched on first use), handing out each
+# session to one lookup at a time; idle sessions are health checked before reuse, and sessions are recycled
+# (quit and relaunched) after 'max_pages' pages, once the memory of their browser ('memory_usage(driver)')
+# grows by 'max_memory_growth' bytes or when a lookup fails with a browser error
+class BrowserPool:
+
+	def __init__(self, driver_factory, size=4, max_pages=500, max_memory_growth=512 * 1024 * 1024, memory_check_interval=25, health_check_idle=30.0, memory_usage=driverMemory):
+
+		self.driver_factory = driver_factory
+		self.size = size
+
+		self.max_pages = max_pages
+		self.max_memory_growth = max_memory_growth
+		self.memory_check_interval = memory_check_interval
+		self.memory_usage = memory_usage
+
+		# sessions idle for longer are checked to respond before being handed out
+		self.health_check_idle = health_check_idle
+
+		self._condition = threading.Condition()
+		self._idle = []
+		self._sessions = 0
+		self._closed = False
+
+		self.counters = {'launched': 0, 'recycled': 0, 'unhealthy': 0, 'failed': 0, 'pages': 0}
+		self._session_numbers = 0
+
+	# a session for a lookup (waiting for one to be released when all 'size' sessions are in use)
+	def acquire(self, timeout=None):
+
+		with self._condition:
+
+			while True:
+
+				if self._closed:
+					raise RuntimeError('The browser pool is closed')
+
+				if self._idle:
+					session = self._idle.pop()
+					break
+
+				if self._sessions < self.size:
+					self._sessions += 1
+					self._session_numbers += 1
+					session = None
+					number = self._session_numbers
+					break
+
+				if not self._condition.wait(timeout):
+					raise TimeoutError('No browser session became free in {}s'.format(timeout))
+
+		# launch and health check the browsers outside the lock (so the other sessions stay available)
+		if session is None:
+			return self._launch(number)
+
+		if time.monotonic() - session.last_used > self.health_check_idle and not self.healthy(session):
+			self._count('unhealthy')
+			self._quit(session)
+			return self._launch(session.number)
+
+		return session
+
+	# return a session to the pool after a lookup ('failed' when the browser raised an error, recycling it)
+	def release(self, session, failed=False):
+
+		session.pages += 1
+		session.last_used = time.monotonic()
+		self._count('pages')
+
+		if failed:
+			self._count('failed')
+
+		if failed or self.exhausted(session):
+			self._count('recycled')
+			self._quit(session)
+			with self._condition:
+				self._sessions -= 1
+				self._condition.notify()
+			return
+
+		with self._condition:
+			if self._closed:
+				closed = True
+				self._sessions -= 1
+			else:
+				closed = False
+				self._idle.append(session)
+				self._condition.notify()
+
+		if closed:
+			self._quit(session)
+
+	# whether a session has served its pages or grown beyond the memory bound
+	def exhausted(self, session):
+
+		if session.pages >= self.max_pages:
+			return True
+
+		# the memory is measured after the first page and then every 'memory_check_interval' pages
+		if self.max_memory_growth is None or (session.pages - 1) % self.memory_check_interval:
+			return False
+
+		session.memory = self.memory_usage(session.driver)
+		if session.memory is None:
+			return False
+
+		if session.baseline_memory is None:
+			session.baseline_memory = session.memory
+			return False
+
+		return session.memory - session.baseline_memory > self.max_memory_growth
+
+	# whether the browser of a session still responds
+	def healthy(self, session):
+
+		try:
+			return session.driver.execute_script('return 1') == 1
+		except Exception:
+			return False
+
+	def _launch(self, number):
+
+		try:
+			driver = self.driver_factory()
+		except BaseException:
+			with self._condition:
+				self._sessions -= 1
+				self._condition.notify()
+			raise
+
+		self._count('launched')
+		return BrowserSession(number, driver)
+
+	def _count(self, counter):
+		with self._condition:
+			self.counters[counter] += 1
+
+	def _quit(self, session):
+
+		try:
+			session.driver.quit()
+		except Exception:
+			pass
+
+	# counters of the pool (launched and recycled sessions, pages loaded) and the sessions open
+	def stats(self):
+
+		with self._condition:
+			return dict(self.counters, sessions=self._sessions, idle=len(self._idle), idle_pages=[session.pages for session in self._idle])
+
+	# quit the idle browsers (and the sessions in use as they are released)
+	def close(self):
+
+		with self._condition:
+			self._closed = True
+			idle, self._idle = self._idle, []
+			self._sessions -= len(idle)
+			self._condition.notify_all()
+
+		for session in idle:
+			self._quit(session)
@@ -0,0 +1,124 @@
+""" Append-only journal of the places resolved by a population run (to resume the run after a crash) """
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+# A journal (a JSON lines file) of the (IATA code, distance, source) resolved for normalised places in a run over
+# an input file with a fields mapping; results are buffered and appended at most once per flush interval
+class CheckpointJournal:
+
+	default_dir = os.path.join(os.path.expanduser('~'), '.vimaan', 'checkpoints')
+
+	def __init__(self, path, header=None, flush_interval=1.0):
+
+		self.path = path
+		self.flush_interval = flush_interval
+
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+		# results already in the journal (from an earlier run)
+		self.results = self._readResults(path)
+
+		# the results are recorded by the lookup threads (so guard the buffer and the file with a lock)
+		self._lock = threading.Lock()
+		self._pending = []
+		self._last_flush = time.monotonic()
+
+		self._file = open(path, 'a', encoding='utf-8')
+		if self._file.tell() == 0 and header is not None:
+			self._file.write(json.dumps(header) + '\n')
+			self._file.flush()
+
+		# end a line cut short by a crash (so it is not joined with the next result)
+		elif self._file.tell() > 0 and not self._endsWithNewline(path):
+			self._file.write('\n')
+			self._file.flush()
+
+	# the journal of the runs over an input file (identified by its path, size and modification time) with
+	# a fields mapping (cityname, statename, countryname and iata fields)
+	@classmethod
+	def open(cls, input_filename, fields, directory=default_dir, **options):
+
+		fingerprint = cls.fingerprint(input_filename, fields)
+		header = {'input': os.path.abspath(input_filename), 'fields': list(fields), 'created': time.time()}
+
+		return cls(os.path.join(directory, fingerprint + '.jsonl'), header, **options)
+
+	@staticmethod
+	def fingerprint(input_filename, fields):
+
+		status = os.stat(input_filename)
+		identity = [os.path.abspath(input_filename), status.st_size, status.st_mtime_ns, list(fields)]
+
+		return hashlib.sha1(json.dumps(identity).encode('utf-8')).hexdigest()
+
+	# {normalised place: (iata, distance, source)} of the results in a journal file (ignoring a line cut short
+	# by a crash)
+	@staticmethod
+	def _readResults(path):
+
+		results = {}
+		if not os.path.exists(path):
+			return results
+
+		with open(path, encoding='utf-8') as journal:
+			for line in journal:
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					continue
+				if 'place' in entry:
+					results[tuple(entry['place'])] = (entry['iata'], entry['distance'], entry.get('source'))
+
+		return results
+
+	@staticmethod
+	def _endsWithNewline(path):
+
+		with open(path, 'rb') as journal:
+			journal.seek(-1, os.SEEK_END)
+			return journal.read(1) == b'\n'
+
+	# {position in 'normalized_places': (iata, distance, source)} of the places resolved in earlier runs
+	def getMany(self, normalized_places):
+		return {position: self.results[place] for position, place in enumerate(normalized_places) if place in self.results}
+
+	# record the result of a place (appended with the other results of the flush interval)
+	def record(self, normalized_place, iata, distance, source=None):
+
+		line = json.dumps({'place': list(normalized_place), 'iata': iata, 'distance': distance, 'source': source})
+
+		with self._lock:
+			self._pending.append(line)
+			if time.monotonic() - self._last_flush >= self.flush_interval:
+				self._flush()
+
+	def flush(self):
+		with self._lock:
+			self._flush()
+
+	def _flush(self):
+
+		if self._pending:
+			self._file.write('\n'.join(self._pending) + '\n')
+			self._file.flush()
+			self._pending = []
+
+		self._last_flush = time.monotonic()
+
+	def close(self):
+
+		with self._lock:
+			if not self._file.closed:
+				self._flush()
+				self._file.close()
+
+	# close and delete the journal (once the run has completed)
+	def remove(self):
+
+		self.close()
+		if os.path.exists(self.path):
+			os.remove(self.path)
@@ -0,0 +1,132 @@
+""" Compact (downcast) representation of the imported data and a report of the memory it saves """
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+# text fields with at most this many distinct values per value are converted to categoricals
+max_category_ratio = 0.5
+
+# bytes held by each column of a dataframe, in column order (counting the strings of object columns)
+def columnBytes(data):
+	return data.memory_usage(index=False, deep=True).tolist()
+
+# the pyarrow backed string dtype keeping missing values as NaN (like object columns), or None when pyarrow
+# (or a pandas supporting it) is not available
+def stringDtype():
+
+	try:
+		import pyarrow
+	except ImportError:
+		return None
+
+	major, minor = (int(part) for part in pd.__version__.split('.')[:2])
+
+	if major >= 3:
+		return pd.StringDtype('pyarrow', na_value=np.nan)
+	if (major, minor) >= (2, 1):
+		return pd.StringDtype('pyarrow_numpy')
+	return None
+
+# the smallest (nullable, when 'nullable') integer dtype holding the values from 'minimum' to 'maximum'
+def _smallestInt(minimum, maximum, nullable):
+
+	for bits in (8, 16, 32, 64):
+		limits = np.iinfo('int{}'.format(bits))
+		if limits.min <= minimum and maximum <= limits.max:
+			return 'Int{}'.format(bits) if nullable else 'int{}'.format(bits)
+
+	return None
+
+# the compact version of a column's values: low-cardinality text as categoricals, other text as pyarrow
+# strings (or interned strings without pyarrow) and whole numbers as the smallest (nullable) integers;
+# the values are returned as they are when they cannot be compacted (e.g. text mixed with numbers)
+def compactValues(values):
+
+	dtype = values.dtype
+
+	if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+		return values
+
+	if pd.api.types.is_integer_dtype(dtype):
+
+		if not len(values) or values.isna().all():
+			return values
+
+		target = _smallestInt(int(values.min()), int(values.max()), pd.api.types.is_extension_array_dtype(dtype))
+		return values.astype(target) if target is not None and target != str(dtype) else values
+
+	if pd.api.types.is_float_dtype(dtype):
+
+		present = values.dropna()
+		if not len(present) or not np.isfinite(present).all() or (present != np.floor(present)).any():
+			return values
+
+		target = _smallestInt(present.min(), present.max(), len(present) < len(values))
+		return values.astype(target) if target is not None else values
+
+	if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+
+		if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+			return values
+
+		count = values.count()
+		if values.nunique() <= max_category_ratio * count:
+			return values.astype('category')
+
+		if not pd.api.types.is_object_dtype(dtype):
+			return values
+
+		string_dtype = stringDtype()
+		if string_dtype is not None:
+			return values.astype(string_dtype)
+
+		# share the repeated strings (each distinct name is then held once)
+		return pd.Series([sys.intern(value) if isinstance(value, str) else value for value in values], index=values.index, dtype=object, name=values.name)
+
+	return values
+
+# compact (in place) the columns of a dataframe other than 'keep_fields' (e.g. the output field, which is
+# written to later); returns the dataframe
+def compactData(data, keep_fields=()):
+
+	for position, field in enumerate(data.columns):
+
+		if field in keep_fields:
+			continue
+
+		values = data.iloc[:, position]
+		compacted = compactValues(values)
+		if compacted is not values:
+			data.isetitem(position, compacted)
+
+	return data
+
+# make room (in place) in a compacted column for values about to be written to it: new categories are added to
+# categoricals, and other columns (e.g. small integers) fall back to objects
+def widenColumn(data, field, values):
+
+	position = data.columns.get_loc(field)
+	column = data.iloc[:, position]
+
+	if isinstance(column.dtype, pd.CategoricalDtype):
+		new_categories = pd.Index(pd.Series(list(values), dtype=object).dropna().unique()).difference(column.cat.categories)
+		data.isetitem(position, column.cat.add_categories(new_categories))
+	else:
+		data.isetitem(position, column.astype(object))
+
+# (field, dtype, bytes as read, bytes compacted) of each column of a compacted dataframe, from the bytes of its
+# columns as read ('columnBytes' of the chunks read, summed)
+def memoryReport(read_bytes, data):
+	return [(field, str(dtype), int(before), int(after)) for field, dtype, before, after in zip(data.columns, data.dtypes, read_bytes, columnBytes(data))]
+
+# a number of bytes in readable units
+def formatBytes(size):
+
+	for unit in ('B', 'KB', 'MB'):
+		if size < 1024:
+			return '{:.0f} {}'.format(size, unit) if unit == 'B' else '{:.1f} {}'.format(size, unit)
+		size /= 1024
+
+	return '{:.1f} GB'.format(size)
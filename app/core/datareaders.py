@@ -0,0 +1,345 @@
+""" Chunked readers for the input data files """
+
+import os
+import csv
+from operator import itemgetter
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# default number of rows converted to a dataframe at a time
+default_chunk_rows = 5000
+
+# approximate size of the text parsed at a time from delimited text files
+default_chunk_bytes = 16 * 1024 * 1024
+
+# size of the sample used to sniff the format and delimiter of a file
+sniff_bytes = 64 * 1024
+
+# A file whose format cannot be read (e.g. a file taken for a '.xls' workbook, the fallback format, that is not one)
+class UnsupportedFormatError(ValueError):
+	pass
+
+# name the unnamed or non-text header cells (similar to pandas)
+def _headerNames(cells):
+	return [str(cell) if cell is not None and cell != '' else 'Unnamed: {}'.format(position) for position, cell in enumerate(cells)]
+
+# resolve the projected field names (in file order) and their positions in the header
+def _projection(header, usecols):
+
+	if usecols is None:
+		return list(header), list(range(len(header)))
+
+	missing_fields = [field for field in usecols if field not in header]
+	if missing_fields:
+		raise ValueError("Field(s) {} not found in file".format(', '.join(repr(field) for field in missing_fields)))
+
+	positions = sorted({header.index(field) for field in usecols})
+	return [header[position] for position in positions], positions
+
+# A reader for '.xlsx' workbooks that streams rows of the first sheet (using openpyxl)
+class XlsxReader:
+
+	def __init__(self, filename):
+
+		import openpyxl
+
+		self.filename = filename
+		self._workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+		self._sheet = self._workbook.worksheets[0]
+
+		self._rows = self._sheet.iter_rows(values_only=True)
+		self.header = _headerNames(next(self._rows, ()))
+
+		# the sheet dimensions may be missing in workbooks written by some tools
+		max_row = self._sheet.max_row
+		self.total_rows = max_row - 1 if max_row else None
+
+	# yield lists of row values (of 'chunk_rows' rows each)
+	def _iterRowChunks(self, chunk_rows):
+
+		chunk = []
+		for row in self._rows:
+			chunk.append(row)
+			if len(chunk) == chunk_rows:
+				yield chunk
+				chunk = []
+
+		if chunk:
+			yield chunk
+
+	# yield (chunk dataframe, number of rows read so far) pairs, projected to the 'usecols' fields
+	def iterChunks(self, chunk_rows=default_chunk_rows, usecols=None):
+
+		rows_read = 0
+		width = len(self.header)
+
+		columns, positions = _projection(self.header, usecols)
+		project = itemgetter(*positions) if len(positions) > 1 else (lambda row: (row[positions[0]],))
+
+		for rows in self._iterRowChunks(chunk_rows):
+
+			# pad or truncate ragged rows to the header's width
+			rows = [project(tuple(row[:width]) + (None,) * (width - len(row))) for row in rows]
+			rows_read += len(rows)
+
+			yield pd.DataFrame.from_records(rows, columns=columns), rows_read
+
+	def close(self):
+		self._workbook.close()
+
+# A reader for '.xls' (and other xlrd supported) workbooks converting rows of the first sheet
+class XlsReader:
+
+	def __init__(self, filename):
+
+		import xlrd
+
+		self.filename = filename
+		try:
+			self._book = xlrd.open_workbook(filename, on_demand=True)
+			self._sheet = self._book.sheet_by_index(0)
+		except xlrd.XLRDError as error:
+			raise UnsupportedFormatError(str(error)) from error
+
+		self.header = _headerNames(self._sheet.row_values(0)) if self._sheet.nrows else []
+		self.total_rows = max(self._sheet.nrows - 1, 0)
+
+	# convert a xlrd cell to a python value (as pandas does)
+	def _cellValue(self, cell):
+
+		import xlrd
+
+		if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+			return None
+
+		if cell.ctype == xlrd.XL_CELL_DATE:
+			try:
+				return xlrd.xldate.xldate_as_datetime(cell.value, self._book.datemode)
+			except (ValueError, OverflowError):
+				return cell.value
+
+		if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+			return bool(cell.value)
+
+		if cell.ctype == xlrd.XL_CELL_NUMBER and cell.value == int(cell.value):
+			return int(cell.value)
+
+		return cell.value
+
+	# yield (chunk dataframe, number of rows read so far) pairs, projected to the 'usecols' fields
+	def iterChunks(self, chunk_rows=default_chunk_rows, usecols=None):
+
+		columns, positions = _projection(self.header, usecols)
+
+		for start in range(1, self._sheet.nrows, chunk_rows):
+
+			stop = min(start + chunk_rows, self._sheet.nrows)
+
+			rows = []
+			for row_number in range(start, stop):
+				row_length = self._sheet.row_len(row_number)
+				rows.append([self._cellValue(self._sheet.cell(row_number, position)) if position < row_length else None for position in positions])
+
+			yield pd.DataFrame.from_records(rows, columns=columns), stop - 1
+
+	def close(self):
+		self._book.release_resources()
+
+# A reader for delimited text files, parsing chunks of a bounded size (using pandas)
+class CsvReader:
+
+	def __init__(self, filename, chunk_bytes=default_chunk_bytes):
+
+		self.filename = filename
+
+		with open(filename, 'rb') as input_file:
+			sample = input_file.read(sniff_bytes)
+
+		text_sample = sample.decode('utf-8', errors='replace')
+
+		try:
+			self.delimiter = csv.Sniffer().sniff(text_sample, delimiters=',;\t|').delimiter
+		except csv.Error:
+			self.delimiter = ','
+
+		self.header = _headerNames(pd.read_csv(filename, sep=self.delimiter, nrows=0).columns)
+
+		# estimate the number of rows (and rows per chunk) from the sampled line lengths
+		sampled_lines = max(text_sample.count('\n'), 1)
+		bytes_per_row = max(len(sample) / sampled_lines, 1)
+
+		self.total_rows = max(int(os.path.getsize(filename) / bytes_per_row) - 1, 0)
+		self.chunk_rows = max(int(chunk_bytes / bytes_per_row), 1000)
+
+	# yield (chunk dataframe, number of rows read so far) pairs, projected to the 'usecols' fields
+	def iterChunks(self, chunk_rows=None, usecols=None):
+
+		columns, _ = _projection(self.header, usecols)
+		rows_read = 0
+
+		chunks = pd.read_csv(self.filename, sep=self.delimiter, usecols=columns if usecols is not None else None, chunksize=chunk_rows or self.chunk_rows)
+
+		with chunks:
+			for chunk in chunks:
+				chunk.columns = columns
+				rows_read += len(chunk)
+				yield chunk, rows_read
+
+	def close(self):
+		pass
+
+# A reader for parquet files, decoding only the projected columns of each row group (using pyarrow)
+class ParquetReader:
+
+	def __init__(self, filename):
+
+		import pyarrow.parquet as pq
+
+		self.filename = filename
+		self._file = pq.ParquetFile(filename)
+
+		self.header = list(self._file.schema_arrow.names)
+		self.total_rows = self._file.metadata.num_rows
+
+	# yield (chunk dataframe, number of rows read so far) pairs, projected to the 'usecols' fields
+	def iterChunks(self, chunk_rows=default_chunk_rows * 10, usecols=None):
+
+		columns, _ = _projection(self.header, usecols)
+		rows_read = 0
+
+		for batch in self._file.iter_batches(batch_size=chunk_rows, columns=columns):
+			rows_read += batch.num_rows
+			yield batch.to_pandas(), rows_read
+
+	def close(self):
+		self._file.close()
+
+# A reader for feather (arrow IPC) files, memory mapping the file and converting the projected columns
+class FeatherReader:
+
+	def __init__(self, filename):
+
+		import pyarrow as pa
+		import pyarrow.feather as feather
+
+		self.filename = filename
+		self._source = pa.memory_map(filename)
+
+		try:
+			self._table = None
+			self._file = pa.ipc.open_file(self._source)
+			self.header = list(self._file.schema.names)
+
+		# feather version 1 files are not arrow IPC files (so read them as a table)
+		except pa.ArrowInvalid:
+			self._file = None
+			self._table = feather.read_table(filename, memory_map=True)
+			self.header = list(self._table.schema.names)
+
+		self.total_rows = self._table.num_rows if self._file is None else sum(self._file.get_batch(position).num_rows for position in range(self._file.num_record_batches))
+
+	# yield the (memory mapped) record batches of the file
+	def _iterBatches(self, chunk_rows):
+
+		if self._file is None:
+			yield from self._table.to_batches(chunk_rows)
+			return
+
+		for position in range(self._file.num_record_batches):
+			batch = self._file.get_batch(position)
+			for offset in range(0, batch.num_rows, chunk_rows):
+				yield batch.slice(offset, chunk_rows)
+
+	# yield (chunk dataframe, number of rows read so far) pairs, projected to the 'usecols' fields
+	def iterChunks(self, chunk_rows=default_chunk_rows * 10, usecols=None):
+
+		columns, _ = _projection(self.header, usecols)
+		rows_read = 0
+
+		for batch in self._iterBatches(chunk_rows):
+			rows_read += batch.num_rows
+			yield batch.select(columns).to_pandas(), rows_read
+
+	def close(self):
+		self._source.close()
+
+# readers of each of the supported input file formats
+readers = {
+	'xlsx': XlsxReader,
+	'xls': XlsReader,
+	'csv': CsvReader,
+	'parquet': ParquetReader,
+	'feather': FeatherReader,
+}
+
+# file formats recognised by their leading (magic) bytes and by their extensions
+format_magics = [
+	(b'PAR1', 'parquet'),
+	(b'ARROW1', 'feather'),
+	(b'PK\x03\x04', 'xlsx'),
+	(b'\xd0\xcf\x11\xe0', 'xls'),
+]
+
+format_extensions = {
+	'.xlsx': 'xlsx', '.xlsm': 'xlsx', '.xls': 'xls',
+	'.csv': 'csv', '.tsv': 'csv', '.txt': 'csv',
+	'.parquet': 'parquet', '.pq': 'parquet',
+	'.feather': 'feather', '.arrow': 'feather',
+}
+
+# detect the format of the input file from its content (falling back to its extension)
+def detectFormat(filename):
+
+	with open(filename, 'rb') as input_file:
+		sample = input_file.read(sniff_bytes)
+
+	for magic, file_format in format_magics:
+		if sample.startswith(magic):
+			return file_format
+
+	extension = os.path.splitext(filename)[1].lower()
+	if extension in format_extensions:
+		return format_extensions[extension]
+
+	# text files without a known extension are read as delimited text
+	if sample and b'\0' not in sample:
+		try:
+			sample.decode('utf-8')
+			return 'csv'
+		except UnicodeDecodeError:
+			pass
+
+	# (the '.xls' reader raises 'UnsupportedFormatError' for files of other formats)
+	return 'xls'
+
+# open a reader for the input file (dispatched on the detected file format)
+def openReader(filename):
+	return readers[detectFormat(filename)](filename)
+
+# convert the low-cardinality text fields of a chunk to categoricals (as soon as it is read)
+def compactChunk(chunk, categorical_fields=()):
+
+	for field in categorical_fields:
+		if field in chunk:
+			chunk[field] = chunk[field].astype('category')
+
+	return chunk
+
+# combine the chunks read from a file into a single dataframe
+def concatChunks(chunks, header, categorical_fields=()):
+
+	if not chunks:
+		return pd.DataFrame(columns=header)
+
+	categorical_fields = [field for field in header if field in categorical_fields]
+	other_fields = [field for field in header if field not in categorical_fields]
+
+	data = pd.concat([chunk[other_fields] for chunk in chunks], ignore_index=True).infer_objects()
+
+	# the categories differ across chunks (so take their union instead of falling back to objects, sorted rather
+	# than in the order the chunks were read)
+	for field in categorical_fields:
+		data[field] = union_categoricals([chunk[field] for chunk in chunks], sort_categories=True)
+
+	return data[header]
@@ -0,0 +1,184 @@
+""" Chunked writers exporting the data to xlsx, csv and parquet files (without materialising a converted copy) """
+
+import os
+
+import pandas as pd
+
+from core import datareaders
+from core.tasks import checkCancelled
+
+# number of rows converted and written at a time
+default_chunk_rows = 50000
+
+# rows of a sheet (including the header row) in an xlsx workbook
+max_xlsx_rows = 1048576
+
+# convert a chunk of rows to lists of python values (missing values as None)
+def _rowValues(chunk):
+	return chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+
+# A writer streaming rows to an '.xlsx' workbook (with xlsxwriter, keeping only the current row in memory)
+class XlsxWriter:
+
+	def __init__(self, filename, header):
+
+		import xlsxwriter
+
+		self._workbook = xlsxwriter.Workbook(filename, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+		self._sheet = self._workbook.add_worksheet()
+
+		self._sheet.write_row(0, 0, [str(field) for field in header], self._workbook.add_format({'bold': True}))
+		self._row = 1
+
+	def writeChunk(self, chunk):
+
+		for values in _rowValues(chunk):
+			self._sheet.write_row(self._row, 0, values)
+			self._row += 1
+
+	def close(self):
+		self._workbook.close()
+
+# A writer appending rows to a '.csv' file
+class CsvWriter:
+
+	def __init__(self, filename, header):
+
+		self._file = open(filename, 'w', encoding='utf-8', newline='')
+		pd.DataFrame(columns=header).to_csv(self._file, index=False)
+
+	def writeChunk(self, chunk):
+		chunk.to_csv(self._file, header=False, index=False)
+
+	def close(self):
+		self._file.close()
+
+# A writer appending row groups to a '.parquet' file (with pyarrow)
+class ParquetWriter:
+
+	def __init__(self, filename, header, schema):
+
+		import pyarrow.parquet
+
+		self._schema = schema
+		self._writer = pyarrow.parquet.ParquetWriter(filename, schema)
+
+	def writeChunk(self, chunk):
+
+		import pyarrow
+
+		self._writer.write_table(pyarrow.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+
+	def close(self):
+		self._writer.close()
+
+# writers by file format
+writers = {
+	'xlsx': XlsxWriter,
+	'csv': CsvWriter,
+	'parquet': ParquetWriter,
+}
+
+# format of an output file (from its extension)
+def outputFormat(filename):
+
+	extension = os.path.splitext(filename)[1].lower().lstrip('.')
+	if extension == 'xlsm':
+		extension = 'xlsx'
+
+	if extension not in writers:
+		raise ValueError("Unsupported output format '{}' (use .xlsx, .csv or .parquet)".format(extension))
+
+	return extension
+
+# write the data to a file (in the format of its extension) a chunk of rows at a time, calling
+# 'on_progress(rows written, total rows)' after each chunk; the file is written under a temporary
+# name and only replaces 'filename' when complete
+def writeData(data, filename, chunk_rows=default_chunk_rows, on_progress=None, cancelled=None):
+
+	output_format = outputFormat(filename)
+
+	if output_format == 'xlsx' and len(data) >= max_xlsx_rows:
+		raise ValueError('{} rows do not fit in an xlsx sheet (of at most {} rows); export to csv or parquet'.format(len(data), max_xlsx_rows - 1))
+
+	partial_filename = filename + '.part'
+
+	if output_format == 'parquet':
+		import pyarrow
+		writer = ParquetWriter(partial_filename, data.columns, pyarrow.Schema.from_pandas(data, preserve_index=False))
+	else:
+		writer = writers[output_format](partial_filename, data.columns)
+
+	try:
+		for start in range(0, len(data), chunk_rows):
+
+			checkCancelled(cancelled)
+			writer.writeChunk(data.iloc[start:start + chunk_rows])
+
+			if on_progress is not None:
+				on_progress(min(start + chunk_rows, len(data)), len(data))
+
+		writer.close()
+
+	except BaseException:
+		writer.close()
+		os.remove(partial_filename)
+		raise
+
+	os.replace(partial_filename, filename)
+	return len(data)
+
+# the data with all the fields of its source file, of which only some fields were imported: the other fields are
+# read back from the source for the rows left in the data (the rows are labelled by their row in the source, from
+# row 2, as when imported) and placed in the order of the source; raises 'ValueError' when the source no longer has
+# the data's fields or rows (e.g. when it changed since it was imported)
+def withSourceFields(data, source_filename, on_progress=None, cancelled=None):
+
+	reader = datareaders.openReader(source_filename)
+	try:
+		header = reader.header
+
+		missing_fields = [field for field in data.columns if field not in header]
+		if missing_fields:
+			raise ValueError("Field(s) {} not found in {}".format(', '.join(repr(field) for field in missing_fields), source_filename))
+
+		other_fields = [field for field in header if field not in data.columns]
+		if not other_fields:
+			return data
+
+		total_rows = reader.total_rows or 0
+		chunks = []
+		for chunk, rows_read in reader.iterChunks(usecols=other_fields):
+
+			checkCancelled(cancelled)
+			chunks.append(chunk)
+
+			if on_progress is not None:
+				on_progress(rows_read, max(total_rows, rows_read))
+
+		other_data = datareaders.concatChunks(chunks, other_fields)
+
+	finally:
+		reader.close()
+
+	other_data.index += 2
+	if not data.index.isin(other_data.index).all():
+		raise ValueError('{} has fewer rows than the imported data'.format(source_filename))
+
+	return pd.concat([data, other_data.loc[data.index]], axis=1)[header]
+
+# write the data with the other fields of its source file (see 'withSourceFields') to a file; when the source cannot
+# be read, only the data's fields are written, and the error is returned with the number of rows written (as
+# (rows, error or None))
+def exportData(data, source_filename, filename, chunk_rows=default_chunk_rows, on_progress=None, cancelled=None):
+
+	# fail before reading the source for unsupported output formats
+	outputFormat(filename)
+
+	source_error = None
+	try:
+		data = withSourceFields(data, source_filename, on_progress, cancelled)
+	except (OSError, ValueError) as error:
+		source_error = str(error)
+
+	return writeData(data, filename, chunk_rows, on_progress, cancelled), source_error
@@ -0,0 +1,132 @@
+""" Extraction of the nearest airport from the pages of the web source """
+
+import re
+import threading
+from urllib.parse import quote_plus
+
+# url of the page listing the airports nearest to a place
+source_url_template = 'https://www.travelmath.com/nearest-airport/{query}'
+
+# the first IATA code (in parentheses) on the page and the distance that follows it
+iata_pattern = re.compile(r'\(([A-Z]{3})\)')
+distance_pattern = re.compile(r'([0-9][0-9,]*(?:\.[0-9]+)?)\s*(km|kilometers|kilometres|mi|miles)\b', re.IGNORECASE)
+
+# kilometres per unit of the distances found on the pages
+distance_units = {'km': 1.0, 'kilometers': 1.0, 'kilometres': 1.0, 'mi': 1.609344, 'miles': 1.609344}
+
+# A page from which no nearest airport could be extracted
+class ExtractionError(ValueError):
+	pass
+
+# build the url of the source page for a place (skipping missing place names)
+def sourceUrl(cityname, statename, countryname, url_template=source_url_template):
+
+	place = ', '.join(str(name) for name in (cityname, statename, countryname) if name)
+	return url_template.format(query=quote_plus(place))
+
+# distance in km of a (number, unit) match
+def _distanceKm(number, unit):
+	return float(number.replace(',', '')) * distance_units[unit.lower()]
+
+# A known template of source pages, recognised by a 'signature' string; its nearest airport is extracted with
+# a precompiled regex 'fast_pattern' (with 'iata', 'distance' and 'unit' groups; starting with a case sensitive
+# literal, which the regex engine scans for quickly) or, when the page does not match it, with an XPath
+# expression selecting the nearest airport link (compiled once per lookup thread, on first use, as lxml XPath
+# evaluators cannot be shared between threads)
+class PageTemplate:
+
+	def __init__(self, name, signature, fast_pattern, airport_xpath, iata_pattern=iata_pattern):
+
+		self.name = name
+		self.signature = signature
+		self.fast_pattern = re.compile(fast_pattern)
+
+		# (the iata of the link selected by the XPath is taken from its href or text with 'iata_pattern')
+		self.airport_xpath = airport_xpath
+		self.iata_pattern = re.compile(iata_pattern) if isinstance(iata_pattern, str) else iata_pattern
+		self._local = threading.local()
+
+	def matches(self, html):
+		return self.signature in html
+
+	# (IATA code, distance in km) from the fast path regex (None when it does not match)
+	def extractFast(self, html):
+
+		match = self.fast_pattern.search(html)
+		if match is None:
+			return None
+
+		distance = _distanceKm(match.group('distance'), match.group('unit')) if match.group('distance') else None
+		return match.group('iata'), distance
+
+	# (IATA code, distance in km) from the parsed page (None when the link is not found)
+	def extractTree(self, html):
+
+		import lxml.html
+		from lxml import etree
+
+		compiled_xpath = getattr(self._local, 'compiled_xpath', None)
+		if compiled_xpath is None:
+			compiled_xpath = self._local.compiled_xpath = etree.XPath(self.airport_xpath)
+
+		links = compiled_xpath(lxml.html.fromstring(html))
+		if not links:
+			return None
+
+		link = links[0]
+		iata_match = self.iata_pattern.search(link.get('href', '')) or self.iata_pattern.search(link.text_content())
+		if iata_match is None:
+			return None
+
+		# the distance is in the text following the link (within its paragraph)
+		distance = None
+		distance_match = distance_pattern.search(link.tail or '')
+		if distance_match is not None:
+			distance = _distanceKm(distance_match.group(1), distance_match.group(2))
+
+		return iata_match.group(1), distance
+
+# the known page templates (tried in order of registration)
+page_templates = []
+
+def registerTemplate(template):
+	page_templates.append(template)
+
+# pages linking the nearest airport as '<a href="/airport/XXX">...</a>' followed by its distance
+registerTemplate(PageTemplate(
+	'airport-link',
+	'href="/airport/',
+	r'href="/airport/(?P<iata>[A-Z]{3})"[^>]*>(?:[^<]|<(?!/a>)){0,500}?</a>(?:[^<0-9]{0,200}?(?P<distance>[0-9][0-9,]*(?:\.[0-9]+)?)\s*(?P<unit>(?i:km|kilometers|kilometres|mi|miles))\b)?',
+	'//a[starts-with(@href, "/airport/")]',
+	r'/airport/([A-Z]{3})\b',
+))
+
+# extract the (IATA code, distance in km) of the nearest airport from a page's html (with the template the page
+# matches, otherwise the first IATA code in parentheses on the page and the distance that follows it)
+def extractNearestAirport(html):
+
+	for template in page_templates:
+
+		# (the fast path is tried first, as it also finds pages of the template quickest)
+		result = template.extractFast(html)
+		if result is None and template.matches(html):
+			result = template.extractTree(html)
+
+		if result is not None:
+			return result
+
+	return extractGeneric(html)
+
+# extract the nearest airport from a page of no known template
+def extractGeneric(html):
+
+	iata_match = iata_pattern.search(html)
+	if iata_match is None:
+		raise ExtractionError('No airport IATA code found on page')
+
+	distance = None
+	distance_match = distance_pattern.search(html, iata_match.end())
+	if distance_match is not None:
+		distance = _distanceKm(distance_match.group(1), distance_match.group(2))
+
+	return iata_match.group(1), distance
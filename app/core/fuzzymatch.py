@@ -0,0 +1,150 @@
+""" Fuzzy matching of misspelt place names against the gazetteer (within each country and state) """
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from core.lookupkeys import normalizeName
+from core.tasks import checkCancelled
+
+# character trigrams of a (normalised) name, padded to weigh its start and end
+def trigrams(name):
+
+	padded = '  ' + name + ' '
+	return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+# edit (Levenshtein) distance between two strings
+def editDistance(first, second):
+
+	if len(first) < len(second):
+		first, second = second, first
+
+	previous = list(range(len(second) + 1))
+	for first_position, first_character in enumerate(first, 1):
+		current = [first_position]
+		for second_position, second_character in enumerate(second, 1):
+			current.append(min(previous[second_position] + 1, current[second_position - 1] + 1, previous[second_position - 1] + (first_character != second_character)))
+		previous = current
+
+	return previous[-1]
+
+# similarity of two names (1 for identical names, 0 for entirely different names)
+def nameSimilarity(first, second):
+	return 1.0 - editDistance(first, second) / max(len(first), len(second), 1)
+
+# An inverted index of the trigrams of names, ranking the candidates sharing most trigrams with a name
+class TrigramIndex:
+
+	def __init__(self, names):
+
+		self.names = names
+
+		postings = {}
+		gram_counts = np.empty(len(names), dtype=np.int32)
+		for name_id, name in enumerate(names):
+			grams = trigrams(name)
+			gram_counts[name_id] = len(grams)
+			for gram in grams:
+				postings.setdefault(gram, []).append(name_id)
+
+		self._postings = {gram: np.array(name_ids, dtype=np.int32) for gram, name_ids in postings.items()}
+		self._gram_counts = gram_counts
+
+	# (name ids, dice coefficients of trigrams) of the best 'limit' candidates for a name
+	def candidates(self, name, limit):
+
+		grams = trigrams(name)
+		postings = [self._postings[gram] for gram in grams if gram in self._postings]
+		if not postings:
+			return np.empty(0, dtype=np.int32), np.empty(0)
+
+		name_ids, shared = np.unique(np.concatenate(postings), return_counts=True)
+		scores = 2.0 * shared / (len(grams) + self._gram_counts[name_ids])
+
+		if len(scores) > limit:
+			best = np.argpartition(-scores, limit)[:limit]
+			name_ids, scores = name_ids[best], scores[best]
+
+		return name_ids, scores
+
+# A matcher suggesting gazetteer names for misspelt city names, comparing each name only with the names
+# of its country and state (blocks) and verifying the trigram candidates by edit distance
+class FuzzyMatcher:
+
+	def __init__(self, gazetteer, min_score=0.6, candidates=8, max_cached_blocks=64):
+
+		self.gazetteer = gazetteer
+		self.min_score = min_score
+		self.candidates = candidates
+
+		# trigram indexes of recently used blocks (in LRU order)
+		self.max_cached_blocks = max_cached_blocks
+		self._block_indexes = OrderedDict()
+
+	# trigram index and place ids of a block (built on first use)
+	def _blockIndex(self, block_id):
+
+		block_index = self._block_indexes.get(block_id)
+		if block_index is not None:
+			self._block_indexes.move_to_end(block_id)
+			return block_index
+
+		names, place_ids = self.gazetteer.blockNames(block_id)
+		block_index = (TrigramIndex([normalizeName(name) for name in names]), names, place_ids)
+
+		self._block_indexes[block_id] = block_index
+		if len(self._block_indexes) > self.max_cached_blocks:
+			self._block_indexes.popitem(last=False)
+
+		return block_index
+
+	# (matched name, place id, score) of the best match of a normalised city name within blocks (or None)
+	def bestMatch(self, cityname, block_ids):
+
+		best = None
+		for block_id in block_ids:
+
+			trigram_index, names, place_ids = self._blockIndex(block_id)
+			name_ids, _ = trigram_index.candidates(cityname, self.candidates)
+
+			for name_id in name_ids.tolist():
+				score = nameSimilarity(cityname, trigram_index.names[name_id])
+				if score >= self.min_score and (best is None or score > best[2]):
+					best = (names[name_id], int(place_ids[name_id]), score)
+
+		return best
+
+	# suggested names (with scores and coordinates) for (cityname, statename, countryname) places,
+	# as a dataframe with a row per place (with empty suggestions for places without a good match)
+	def matchPlaces(self, places, on_progress=None, cancelled=None):
+
+		suggestions = [None] * len(places)
+
+		# match the places block by block (so that each block's index is built once)
+		blocks = []
+		for cityname, statename, countryname in places:
+			country_code = self.gazetteer.countryCode(countryname)
+			blocks.append(tuple(self.gazetteer.blockIds(country_code, self.gazetteer.admin1Code(country_code, statename))))
+
+		order = sorted(range(len(places)), key=lambda position: blocks[position])
+		for count, position in enumerate(order, 1):
+			checkCancelled(cancelled)
+			suggestions[position] = self.bestMatch(normalizeName(places[position][0]), blocks[position])
+			if on_progress is not None:
+				on_progress(count, len(places))
+
+		matched = [suggestion is not None for suggestion in suggestions]
+		place_ids = np.array([suggestion[1] for suggestion in suggestions if suggestion is not None], dtype=np.int64)
+		latitudes, longitudes = np.full(len(places), np.nan), np.full(len(places), np.nan)
+		latitudes[matched], longitudes[matched] = self.gazetteer.placeCoordinates(place_ids)
+
+		return pd.DataFrame({
+			'City Name': [place[0] for place in places],
+			'State Name': [place[1] for place in places],
+			'Country Name': [place[2] for place in places],
+			'Suggested City Name': [suggestion[0] if suggestion else None for suggestion in suggestions],
+			'Score': [round(suggestion[2], 3) if suggestion else np.nan for suggestion in suggestions],
+			'Latitude': latitudes,
+			'Longitude': longitudes,
+		})
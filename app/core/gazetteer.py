@@ -0,0 +1,333 @@
+""" Local gazetteer index geocoding place names without the web (built from a GeoNames dump) """
+
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.lookupkeys import normalizeName
+
+# fields of a GeoNames dump ('allCountries.txt' or a '<country code>.txt' file)
+geonames_fields = ['geonameid', 'name', 'asciiname', 'alternatenames', 'latitude', 'longitude', 'feature_class', 'feature_code',
+	'country_code', 'cc2', 'admin1_code', 'admin2_code', 'admin3_code', 'admin4_code', 'population', 'elevation', 'dem', 'timezone', 'modification_date']
+
+# version of the on-disk index format
+index_version = 2
+
+# separator of the parts of hashed keys
+key_separator = '\x1f'
+
+# 64 bit hashes of key strings (stable across runs, so they can be stored on disk)
+def hashKeys(keys):
+	return pd.util.hash_array(np.asarray(keys, dtype=object), categorize=False)
+
+# read the country names of a GeoNames 'countryInfo.txt' file, returning {normalised name or code: country code}
+def readCountryNames(filename):
+
+	countries = {}
+	with open(filename, encoding='utf-8') as country_info:
+		for line in country_info:
+			if line.startswith('#') or not line.strip():
+				continue
+			fields = line.rstrip('\n').split('\t')
+			for alias in (fields[0], fields[1], fields[4]):
+				countries[normalizeName(alias)] = fields[0]
+
+	return countries
+
+# read the state names of a GeoNames 'admin1CodesASCII.txt' file, returning {country code + normalised name or code: admin1 code}
+def readAdmin1Names(filename):
+
+	admin1 = {}
+	with open(filename, encoding='utf-8') as admin1_codes:
+		for line in admin1_codes:
+			fields = line.rstrip('\n').split('\t')
+			if len(fields) < 3:
+				continue
+			country_code, admin1_code = fields[0].split('.', 1)
+			for alias in (admin1_code, fields[1], fields[2]):
+				admin1[country_code + key_separator + normalizeName(alias)] = admin1_code
+
+	return admin1
+
+# normalise each distinct name of a series only once
+def _normalizeSeries(values):
+
+	codes, uniques = pd.factorize(values)
+	normalized = np.array([normalizeName(name) for name in uniques] + [''], dtype=object)
+	return normalized[codes]
+
+# build the gazetteer index of the populated places of a GeoNames dump into 'output_dir',
+# with the optional country info and admin1 codes files mapping country and state names to codes
+def buildGazetteer(dump_path, output_dir, country_info_path=None, admin1_codes_path=None, alternate_names=True, feature_classes=('P',), chunk_rows=1000000):
+
+	countries = readCountryNames(country_info_path) if country_info_path else {}
+	admin1 = readAdmin1Names(admin1_codes_path) if admin1_codes_path else {}
+
+	state_keys, country_keys, key_places = [], [], []
+	key_blocks, key_names = [], []
+	latitudes, longitudes, populations = [], [], []
+	entries = places = 0
+
+	usecols = ['name', 'asciiname', 'latitude', 'longitude', 'feature_class', 'country_code', 'admin1_code', 'population'] + (['alternatenames'] if alternate_names else [])
+	dtypes = {'name': object, 'asciiname': object, 'alternatenames': object, 'feature_class': object, 'country_code': object, 'admin1_code': object, 'latitude': np.float32, 'longitude': np.float32}
+
+	chunks = pd.read_csv(dump_path, sep='\t', header=None, names=geonames_fields, usecols=usecols, dtype=dtypes, quoting=csv.QUOTE_NONE, keep_default_na=False, chunksize=chunk_rows, encoding='utf-8')
+
+	for chunk in chunks:
+
+		entries += len(chunk)
+
+		if feature_classes:
+			chunk = chunk[chunk['feature_class'].isin(feature_classes)]
+		chunk = chunk.reset_index(drop=True)
+
+		# one key per distinct (normalised) name of each place
+		name_lists = chunk['name'] + ',' + chunk['asciiname']
+		if alternate_names:
+			name_lists = name_lists + ',' + chunk['alternatenames']
+		exploded = name_lists.str.split(',').explode()
+
+		place_names = pd.DataFrame({'place': exploded.index.to_numpy(), 'name': _normalizeSeries(exploded.to_numpy()), 'original': exploded.to_numpy()})
+		place_names = place_names[place_names['name'] != ''].drop_duplicates(['place', 'name'])
+
+		place_rows = place_names['place'].to_numpy()
+		city_names = place_names['name'].to_numpy()
+		country_prefixes = chunk['country_code'].to_numpy(dtype=object)[place_rows] + key_separator
+
+		state_keys.append(hashKeys(country_prefixes + chunk['admin1_code'].to_numpy(dtype=object)[place_rows] + key_separator + city_names))
+		country_keys.append(hashKeys(country_prefixes + city_names))
+		key_places.append(place_rows + places)
+
+		# (country, state) block and (original) name of each key (for fuzzy matching names within a block)
+		key_blocks.append(country_prefixes + chunk['admin1_code'].to_numpy(dtype=object)[place_rows])
+		key_names.append(place_names['original'].str.strip().to_numpy(dtype=object))
+
+		latitudes.append(chunk['latitude'].to_numpy(np.float32))
+		longitudes.append(chunk['longitude'].to_numpy(np.float32))
+		populations.append(pd.to_numeric(chunk['population'], errors='coerce').fillna(0).to_numpy(np.int64))
+
+		places += len(chunk)
+
+	def concatenate(arrays, dtype):
+		return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype)
+
+	state_keys = concatenate(state_keys, np.uint64)
+	country_keys = concatenate(country_keys, np.uint64)
+	key_places = concatenate(key_places, np.int64)
+	key_blocks = concatenate(key_blocks, object)
+	key_names = concatenate(key_names, object)
+	latitudes = concatenate(latitudes, np.float32)
+	longitudes = concatenate(longitudes, np.float32)
+	populations = concatenate(populations, np.int64)
+
+	os.makedirs(output_dir, exist_ok=True)
+
+	np.save(os.path.join(output_dir, 'latitudes.npy'), latitudes)
+	np.save(os.path.join(output_dir, 'longitudes.npy'), longitudes)
+
+	# sorted unique keys of each level (the most populous place wins for ambiguous names)
+	for level, keys in (('state', state_keys), ('country', country_keys)):
+
+		order = np.lexsort((-populations[key_places], keys))
+		sorted_keys = keys[order]
+
+		first = np.ones(len(order), dtype=bool)
+		first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+
+		np.save(os.path.join(output_dir, level + '_keys.npy'), sorted_keys[first])
+		np.save(os.path.join(output_dir, level + '_places.npy'), key_places[order][first].astype(np.uint32))
+
+	# names of the places grouped by (country, state) block, as a utf-8 blob with offsets
+	block_codes, blocks = pd.factorize(key_blocks, sort=True)
+	order = np.argsort(block_codes, kind='stable')
+
+	encoded_names = [name.encode('utf-8') for name in key_names[order]]
+	name_offsets = np.zeros(len(encoded_names) + 1, dtype=np.uint64)
+	np.cumsum([len(name) for name in encoded_names], out=name_offsets[1:])
+
+	with open(os.path.join(output_dir, 'names.bin'), 'wb') as names_file:
+		names_file.write(b''.join(encoded_names))
+
+	np.save(os.path.join(output_dir, 'name_offsets.npy'), name_offsets)
+	np.save(os.path.join(output_dir, 'name_places.npy'), key_places[order].astype(np.uint32))
+	np.save(os.path.join(output_dir, 'block_offsets.npy'), np.searchsorted(block_codes[order], np.arange(len(blocks) + 1)).astype(np.int64))
+
+	meta = {
+		'version': index_version,
+		'entries': entries,
+		'places': places,
+		'countries': countries,
+		'admin1': admin1,
+		'blocks': list(blocks),
+	}
+	with open(os.path.join(output_dir, 'gazetteer.json'), 'w', encoding='utf-8') as meta_file:
+		json.dump(meta, meta_file)
+
+	return meta
+
+# A memory-mapped gazetteer index, geocoding places with a hierarchical (country -> state -> city)
+# lookup of hashed normalised names (falling back to country -> city when the state is not matched)
+class Gazetteer:
+
+	def __init__(self, index_dir):
+
+		with open(os.path.join(index_dir, 'gazetteer.json'), encoding='utf-8') as meta_file:
+			meta = json.load(meta_file)
+
+		if meta.get('version') != index_version:
+			raise ValueError('Unsupported gazetteer index version {} in {}'.format(meta.get('version'), index_dir))
+
+		self.index_dir = index_dir
+		self.places = meta['places']
+
+		self._countries = meta['countries']
+		self._admin1 = meta['admin1']
+
+		def load(name):
+			return np.load(os.path.join(index_dir, name + '.npy'), mmap_mode='r')
+
+		self._latitudes = load('latitudes')
+		self._longitudes = load('longitudes')
+
+		self._levels = [(load('state_keys'), load('state_places')), (load('country_keys'), load('country_places'))]
+
+		# names of places by (country, state) block
+		self._names = np.memmap(os.path.join(index_dir, 'names.bin'), dtype=np.uint8, mode='r') if os.path.getsize(os.path.join(index_dir, 'names.bin')) else np.empty(0, np.uint8)
+		self._name_offsets = load('name_offsets')
+		self._name_places = load('name_places')
+		self._block_offsets = load('block_offsets')
+
+		self._blocks = {block: block_id for block_id, block in enumerate(meta['blocks'])}
+		self._country_blocks = {}
+		for block, block_id in self._blocks.items():
+			self._country_blocks.setdefault(block.split(key_separator, 1)[0], []).append(block_id)
+
+	# open the index when 'path' is an index directory (or its 'gazetteer.json'), or build the index next to
+	# a GeoNames dump (using the 'countryInfo.txt' and 'admin1CodesASCII.txt' files beside the dump if present)
+	@classmethod
+	def open(cls, path, **build_options):
+
+		if os.path.basename(path) == 'gazetteer.json':
+			path = os.path.dirname(path)
+
+		if os.path.isdir(path):
+			return cls(path)
+
+		index_dir = path + '.gazetteer'
+		if not os.path.exists(os.path.join(index_dir, 'gazetteer.json')):
+
+			dump_dir = os.path.dirname(os.path.abspath(path))
+			for option, filename in (('country_info_path', 'countryInfo.txt'), ('admin1_codes_path', 'admin1CodesASCII.txt')):
+				if option not in build_options and os.path.exists(os.path.join(dump_dir, filename)):
+					build_options[option] = os.path.join(dump_dir, filename)
+
+			buildGazetteer(path, index_dir, **build_options)
+
+		return cls(index_dir)
+
+	# country code of a country name (or code)
+	def countryCode(self, countryname):
+		normalized = normalizeName(countryname)
+		return self._countries.get(normalized, normalized.upper())
+
+	# admin1 code of a state name (or code) within a country
+	def admin1Code(self, country_code, statename):
+		normalized = normalizeName(statename)
+		return self._admin1.get(country_code + key_separator + normalized, normalized.upper())
+
+	# ids of the (country, state) blocks of a country and state code (all the country's blocks when the state is unknown)
+	def blockIds(self, country_code, admin1_code=None):
+
+		block_id = self._blocks.get(country_code + key_separator + admin1_code) if admin1_code is not None else None
+		if block_id is not None:
+			return [block_id]
+
+		return self._country_blocks.get(country_code, [])
+
+	# (names, place ids) of the places of a block
+	def blockNames(self, block_id):
+
+		start, stop = self._block_offsets[block_id], self._block_offsets[block_id + 1]
+		offsets = self._name_offsets[start:stop + 1].astype(np.int64)
+
+		blob = bytes(self._names[offsets[0]:offsets[-1]])
+		relative = offsets - offsets[0]
+		names = [blob[relative[position]:relative[position + 1]].decode('utf-8') for position in range(len(relative) - 1)]
+
+		return names, np.asarray(self._name_places[start:stop])
+
+	# (latitude, longitude) of places by their ids
+	def placeCoordinates(self, place_ids):
+		return np.asarray(self._latitudes[place_ids]), np.asarray(self._longitudes[place_ids])
+
+	# positions of the places of hashed keys in a level of the index (-1 when not found)
+	@staticmethod
+	def _findKeys(level_keys, level_places, keys):
+
+		positions = np.searchsorted(level_keys, keys)
+		positions = np.minimum(positions, max(len(level_keys) - 1, 0))
+
+		found = (level_keys[positions] == keys) if len(level_keys) else np.zeros(len(keys), dtype=bool)
+		return np.where(found, level_places[positions].astype(np.int64) if len(level_places) else -1, -1)
+
+	# (latitudes, longitudes) of (cityname, statename, countryname) places in one batch (NaN when not found)
+	def geocode(self, places):
+
+		country_codes, state_prefixes, citynames = {}, {}, {}
+
+		state_keys, country_keys = [], []
+		for cityname, statename, countryname in places:
+
+			# normalise each distinct name only once
+			country_code = country_codes.get(countryname)
+			if country_code is None:
+				country_code = country_codes[countryname] = self.countryCode(countryname)
+
+			state_prefix = state_prefixes.get((country_code, statename))
+			if state_prefix is None:
+				state_prefix = state_prefixes[(country_code, statename)] = country_code + key_separator + self.admin1Code(country_code, statename) + key_separator
+
+			city = citynames.get(cityname)
+			if city is None:
+				city = citynames[cityname] = normalizeName(cityname)
+
+			state_keys.append(state_prefix + city)
+			country_keys.append(country_code + key_separator + city)
+
+		place_positions = np.full(len(places), -1, dtype=np.int64)
+		for (level_keys, level_places), keys in zip(self._levels, (state_keys, country_keys)):
+			unresolved = place_positions < 0
+			if not unresolved.any():
+				break
+			place_positions[unresolved] = self._findKeys(level_keys, level_places, hashKeys(np.asarray(keys, dtype=object)[unresolved]))
+
+		found = place_positions >= 0
+
+		latitudes = np.full(len(places), np.nan)
+		longitudes = np.full(len(places), np.nan)
+		latitudes[found] = self._latitudes[place_positions[found]]
+		longitudes[found] = self._longitudes[place_positions[found]]
+
+		return latitudes, longitudes
+
+# build a gazetteer index from the command line
+if __name__ == '__main__':
+
+	import argparse
+
+	parser = argparse.ArgumentParser(description='Build a gazetteer index from a GeoNames dump')
+	parser.add_argument('dump', help="GeoNames dump (e.g. 'allCountries.txt' or 'cities500.txt')")
+	parser.add_argument('output_dir')
+	parser.add_argument('--country-info', help="GeoNames 'countryInfo.txt' (to geocode country names)")
+	parser.add_argument('--admin1-codes', help="GeoNames 'admin1CodesASCII.txt' (to geocode state names)")
+	parser.add_argument('--no-alternate-names', action='store_true')
+	args = parser.parse_args()
+
+	start = time.perf_counter()
+	meta = buildGazetteer(args.dump, args.output_dir, args.country_info, args.admin1_codes, alternate_names=not args.no_alternate_names)
+	print('Indexed {} places ({} entries) in {:.1f}s'.format(meta['places'], meta['entries'], time.perf_counter() - start), file=sys.stderr)
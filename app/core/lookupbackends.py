@@ -0,0 +1,92 @@
+""" Backends that look up the nearest airport of a place from the web source """
+
+import urllib.request
+import urllib.error
+
+from core import extraction
+
+# A lookup that failed for good (and should not be retried)
+class LookupFailed(Exception):
+	pass
+
+# A backend fetching the source pages over plain HTTP (using urllib)
+class HttpLookupBackend:
+
+	user_agent = 'Mozilla/5.0 (X11; Linux x86_64) VIMAAN'
+
+	def __init__(self, url_template=extraction.source_url_template, timeout=30):
+		self.url_template = url_template
+		self.timeout = timeout
+
+	# look up the (IATA code, distance in km) of the airport nearest to a place
+	def lookup(self, cityname, statename, countryname):
+
+		url = extraction.sourceUrl(cityname, statename, countryname, self.url_template)
+		request = urllib.request.Request(url, headers={'User-Agent': self.user_agent})
+
+		try:
+			with urllib.request.urlopen(request, timeout=self.timeout) as response:
+				html = response.read().decode(response.headers.get_content_charset() or 'utf-8', errors='replace')
+
+		# pages that do not exist will not appear on retrying (unlike throttling and server errors)
+		except urllib.error.HTTPError as error:
+			if error.code in (400, 404, 410):
+				raise LookupFailed('HTTP {} for {}'.format(error.code, url))
+			raise
+
+		try:
+			return extraction.extractNearestAirport(html)
+		except extraction.ExtractionError as error:
+			raise LookupFailed('{} ({})'.format(error, url))
+
+	def close(self):
+		pass
+
+# a headless Chrome browser (driven with selenium and ChromeDriver)
+def chromeDriver(chromedriver_path, page_load_timeout=60):
+
+	from selenium import webdriver
+	from selenium.webdriver.chrome.service import Service
+
+	options = webdriver.ChromeOptions()
+	options.add_argument('--headless=new')
+	options.add_argument('--disable-gpu')
+
+	driver = webdriver.Chrome(service=Service(chromedriver_path), options=options)
+	driver.set_page_load_timeout(page_load_timeout)
+
+	return driver
+
+# A backend loading the source pages in the headless browsers of a pool ('core.browserpool.BrowserPool'),
+# so that a lookup costs a page navigation rather than a browser launch
+class ChromeLookupBackend:
+
+	def __init__(self, browser_pool, url_template=extraction.source_url_template):
+		self.browser_pool = browser_pool
+		self.url_template = url_template
+
+	# look up the (IATA code, distance in km) of the airport nearest to a place
+	def lookup(self, cityname, statename, countryname):
+
+		url = extraction.sourceUrl(cityname, statename, countryname, self.url_template)
+
+		session = self.browser_pool.acquire()
+		try:
+			session.driver.get(url)
+			html = session.driver.page_source
+
+		# recycle browsers that failed to load a page (they may have crashed or hung)
+		except BaseException:
+			self.browser_pool.release(session, failed=True)
+			raise
+
+		self.browser_pool.release(session)
+
+		try:
+			return extraction.extractNearestAirport(html)
+		except extraction.ExtractionError as error:
+			raise LookupFailed('{} ({})'.format(error, url))
+
+	# the browsers stay open in the pool (for the next lookups and population runs)
+	def close(self):
+		pass
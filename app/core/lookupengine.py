@@ -0,0 +1,147 @@
+""" Concurrent engine resolving the nearest airports of places with a pool of lookup workers """
+
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from core.lookupbackends import LookupFailed
+
+# A pool of worker threads, each with its own lookup backend, draining a shared queue of places
+class LookupEngine:
+
+	# seconds between checks of a worker held back by the throttle
+	throttle_poll = 0.1
+
+	def __init__(self, backend_factory, workers=4, retries=3, backoff=1.0, max_backoff=30.0, throttle=None):
+
+		self.backend_factory = backend_factory
+		self.workers = workers
+
+		# rate limiter and adaptive concurrency ('core.ratelimit.LookupThrottle') of the requests, with 'workers'
+		# as the maximum concurrency
+		self.throttle = throttle
+
+		# retry failed lookups after exponentially growing (jittered) delays
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+
+		self._stop_event = threading.Event()
+
+	# stop the running lookups (the lookups in progress are finished)
+	def stop(self):
+		self._stop_event.set()
+
+	def stopped(self):
+		return self._stop_event.is_set()
+
+	# resolve (key, (cityname, statename, countryname)) places, calling 'on_result(key, iata, distance)'
+	# and 'on_failure(key, error)' from the worker threads as lookups complete
+	def run(self, places, on_result, on_failure=None):
+
+		tasks = queue.Queue()
+		for place in places:
+			tasks.put(place)
+
+		worker_lookups = [0] * self.workers
+		worker_failures = [0] * self.workers
+		worker_errors = []
+
+		threads = [threading.Thread(target=self._work, args=(number, tasks, on_result, on_failure, worker_lookups, worker_failures, worker_errors), daemon=True) for number in range(self.workers)]
+
+		start = time.perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - start
+
+		# places left over when no backend could be started
+		unresolved = tasks.qsize() if not self.stopped() else 0
+		if unresolved and worker_errors:
+			while not tasks.empty():
+				key, _ = tasks.get_nowait()
+				if on_failure is not None:
+					on_failure(key, worker_errors[0])
+
+		lookups = sum(worker_lookups)
+
+		return {
+			'workers': self.workers,
+			'lookups': lookups,
+			'failures': sum(worker_failures) + unresolved,
+			'elapsed': elapsed,
+			'throughput': lookups / elapsed if elapsed else 0.0,
+			'worker_lookups': worker_lookups,
+			'errors': [str(error) for error in worker_errors],
+		}
+
+	# look up places from the queue until it is empty (or the engine is stopped)
+	def _work(self, number, tasks, on_result, on_failure, worker_lookups, worker_failures, worker_errors):
+
+		try:
+			backend = self.backend_factory()
+		except Exception as error:
+			worker_errors.append(error)
+			return
+
+		# host the backend sends its requests to (for the per-host rate limit)
+		host = urlsplit(getattr(backend, 'url_template', '')).netloc
+
+		try:
+			while not self.stopped():
+
+				# wait while the throttle holds this worker back (unless there is nothing left to look up)
+				if self.throttle is not None and not self.throttle.active(number):
+					if tasks.empty():
+						break
+					self._stop_event.wait(self.throttle_poll)
+					continue
+
+				try:
+					key, place = tasks.get_nowait()
+				except queue.Empty:
+					break
+
+				for attempt in range(self.retries + 1):
+
+					if self.throttle is not None:
+						self._stop_event.wait(self.throttle.reserve(host))
+
+					started = time.perf_counter()
+					try:
+						iata, distance = backend.lookup(*place)
+
+					except LookupFailed as error:
+						self._record(started)
+						worker_failures[number] += 1
+						if on_failure is not None:
+							on_failure(key, error)
+						break
+
+					except Exception as error:
+						self._record(started, error)
+						if attempt == self.retries or self.stopped():
+							worker_failures[number] += 1
+							if on_failure is not None:
+								on_failure(key, error)
+							break
+
+						delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+						self._stop_event.wait(delay * random.uniform(0.5, 1.0))
+
+					else:
+						self._record(started)
+						worker_lookups[number] += 1
+						on_result(key, iata, distance)
+						break
+
+		finally:
+			backend.close()
+
+	# report the latency and error of a request to the throttle
+	def _record(self, started, error=None):
+		if self.throttle is not None:
+			self.throttle.record(time.perf_counter() - started, error)
@@ -0,0 +1,83 @@
+""" Unique (normalised) place keys of the imported data, resolved once and fanned out to rows """
+
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# normalise a place name for comparing (case, surrounding and repeated whitespace, diacritics)
+def normalizeName(name):
+
+	decomposed = unicodedata.normalize('NFKD', str(name))
+	stripped = ''.join(character for character in decomposed if not unicodedata.combining(character))
+
+	return ' '.join(stripped.casefold().split())
+
+# normalise a series of names (each distinct name only once), returning (codes, normalised names)
+# where missing and blank names have code -1
+def factorizeNames(values):
+
+	codes, uniques = pd.factorize(values, use_na_sentinel=True)
+	normalized = [normalizeName(name) for name in uniques]
+
+	# names differing only in case, whitespace or diacritics share a code (and blank names get -1)
+	normalized_codes, normalized_uniques = pd.factorize(np.array(normalized, dtype=object))
+	normalized_codes = np.append(normalized_codes, -1)
+	normalized_codes[np.array(normalized + [''], dtype=object) == ''] = -1
+
+	return normalized_codes[codes], list(normalized_uniques)
+
+# The unique (cityname, statename, countryname) keys of the rows of a dataframe
+class LookupKeys:
+
+	def __init__(self, data, fields, positions=None):
+
+		# build keys of only the rows at 'positions' (when given)
+		if positions is None:
+			positions = np.arange(len(data))
+		self.positions = np.asarray(positions)
+
+		field_codes = []
+		field_names = []
+		for field in fields:
+			codes, names = factorizeNames(data[field].iloc[self.positions])
+			field_codes.append(codes)
+			field_names.append(names)
+
+		# combine the field codes into a single integer per row (rows missing any name have no key)
+		complete = np.logical_and.reduce([codes >= 0 for codes in field_codes]) if field_codes else np.zeros(len(self.positions), bool)
+		combined = np.zeros(len(self.positions), dtype=np.int64)
+		for codes, names in zip(field_codes, field_names):
+			combined = combined * (len(names) + 1) + codes
+
+		self.codes = np.full(len(self.positions), -1, dtype=np.int64)
+		self.codes[complete], _ = pd.factorize(combined[complete])
+
+		# first row of each key (giving the original names to look up) and the key's normalised names
+		keys, first_rows = np.unique(self.codes[complete], return_index=True)
+		first_rows = np.flatnonzero(complete)[first_rows]
+
+		original = data[list(fields)].iloc[self.positions[first_rows]]
+		self.places = list(original.itertuples(index=False, name=None))
+		self.normalized = [tuple(names[codes[row]] for codes, names in zip(field_codes, field_names)) for row in first_rows]
+
+		# rows of each key (as slices of the rows sorted by key)
+		self._order = np.argsort(self.codes, kind='stable')
+		self._bounds = np.searchsorted(self.codes[self._order], np.arange(len(self.places) + 1))
+
+	def __len__(self):
+		return len(self.places)
+
+	# number of rows with a key
+	def rowCount(self):
+		return int((self.codes >= 0).sum())
+
+	# row positions (in the dataframe) of the rows of a key
+	def rowPositions(self, key):
+		return self.positions[self._order[self._bounds[key]:self._bounds[key + 1]]]
+
+	# fan out per-key values to the rows (rows without a key or a value get None)
+	def fanOut(self, key_values):
+
+		key_values = np.append(np.asarray(key_values, dtype=object), None)
+		return key_values[self.codes]
@@ -0,0 +1,148 @@
+""" Population of the nearest airport IATA field of the imported data """
+
+import threading
+
+import numpy as np
+
+from core.lookupkeys import LookupKeys
+
+# A job looking up the nearest airports of the rows of the imported data (missing an IATA code)
+class PopulationJob:
+
+	def __init__(self, data, cityname_field, statename_field, countryname_field, iata_field, cache=None, source='web', checkpoint=None):
+
+		self.data = data
+
+		self.cityname_field = cityname_field
+		self.statename_field = statename_field
+		self.countryname_field = countryname_field
+
+		self.iata_field = iata_field
+
+		# persistent cache of resolved places (consulted before any lookup) and the name of the lookup source
+		self.cache = cache
+		self.source = source
+
+		# journal of the places resolved by this run (and by an interrupted run over the same data, to resume)
+		self.checkpoint = checkpoint
+
+	# allow writing IATA codes into the output field (whatever dtype it was imported with)
+	def prepareOutputField(self):
+
+		if self.data[self.iata_field].dtype != object:
+			self.data[self.iata_field] = self.data[self.iata_field].astype(object)
+
+	# unique place keys of the rows with place names but no IATA code
+	def pendingKeys(self):
+
+		fields = [self.cityname_field, self.statename_field, self.countryname_field]
+
+		pending = self.data[fields].notna().all(axis=1) & self.data[self.iata_field].isna()
+		return LookupKeys(self.data, fields, pending.to_numpy().nonzero()[0])
+
+	# fill in the rows of the keys with an iata in 'key_iatas' (None for the others) in one go
+	def fillIn(self, keys, key_iatas, on_results):
+
+		row_iatas = keys.fanOut(key_iatas)
+		found_rows = np.flatnonzero(row_iatas != None)
+		if len(found_rows):
+			on_results(keys.positions[found_rows], row_iatas[found_rows])
+
+	# fill in the rows of places found in the cache, returning the keys still to be looked up
+	def applyCached(self, keys, on_results):
+
+		if self.cache is None:
+			return list(range(len(keys)))
+
+		found = self.cache.getMany(keys.normalized)
+
+		key_iatas = np.full(len(keys), None, dtype=object)
+		for key, (iata, distance) in found.items():
+			key_iatas[key] = iata
+		self.fillIn(keys, key_iatas, on_results)
+
+		return [key for key in range(len(keys)) if key not in found]
+
+	# fill in the rows of the pending keys resolved by an interrupted run (from the checkpoint journal, also
+	# caching them), returning the keys still to be looked up
+	def applyCheckpoint(self, keys, pending_keys, on_results):
+
+		if self.checkpoint is None:
+			return pending_keys
+
+		found = self.checkpoint.getMany(keys.normalized)
+
+		key_iatas = np.full(len(keys), None, dtype=object)
+		for key in pending_keys:
+			if key in found:
+				iata, distance, source = found[key]
+				key_iatas[key] = iata
+				if self.cache is not None:
+					self.cache.put(keys.normalized[key], iata, distance, source)
+		self.fillIn(keys, key_iatas, on_results)
+
+		return [key for key in pending_keys if key not in found]
+
+	# look up the nearest airport of each unique place once with the engine (after consulting the cache),
+	# calling 'on_results(row positions, iatas)' for the rows of places as results arrive
+	# (only the cached and checkpointed results are filled in when no engine is given); each result is
+	# journalled to the checkpoint, which is removed once all the places have been looked up
+	def run(self, engine, on_results, on_progress=None):
+
+		self.prepareOutputField()
+		keys = self.pendingKeys()
+
+		cached_keys = self.applyCached(keys, on_results)
+		pending_keys = self.applyCheckpoint(keys, cached_keys, on_results)
+
+		total = len(pending_keys) if engine is not None else 0
+		completed = [0]
+		lock = threading.Lock()
+
+		# count the completed lookups (called from the lookup threads)
+		def lookupCompleted():
+			with lock:
+				completed[0] += 1
+				count = completed[0]
+			if on_progress is not None:
+				on_progress(count, total)
+
+		def resultFound(key, iata, distance):
+			positions = keys.rowPositions(key)
+			on_results(positions, [iata] * len(positions))
+
+			if self.cache is not None:
+				self.cache.put(keys.normalized[key], iata, distance, self.source)
+			if self.checkpoint is not None:
+				self.checkpoint.record(keys.normalized[key], iata, distance, self.source)
+
+			lookupCompleted()
+
+		def lookupFailed(key, error):
+			lookupCompleted()
+
+		try:
+			if engine is not None:
+				summary = engine.run(((key, keys.places[key]) for key in pending_keys), resultFound, lookupFailed)
+			else:
+				summary = {'workers': 0, 'lookups': 0, 'failures': 0, 'elapsed': 0.0, 'throughput': 0.0, 'worker_lookups': [], 'errors': []}
+
+		finally:
+			if self.cache is not None:
+				self.cache.flush()
+			if self.checkpoint is not None:
+				self.checkpoint.close()
+
+		# the checkpoint is kept for runs that were stopped (or had failed lookups) to resume them later
+		if self.checkpoint is not None:
+			if engine is None and not self.checkpoint.results:
+				self.checkpoint.remove()
+			elif engine is not None and not engine.stopped() and not summary['failures']:
+				self.checkpoint.remove()
+
+		summary['keys'] = len(keys)
+		summary['rows'] = keys.rowCount()
+		summary['cached'] = len(keys) - len(cached_keys)
+		summary['resumed'] = len(cached_keys) - len(pending_keys)
+
+		return summary
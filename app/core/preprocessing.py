@@ -0,0 +1,100 @@
+""" Preprocessing computations over the mapped place name fields of the imported data """
+
+import numpy as np
+import pandas as pd
+
+from core.lookupkeys import LookupKeys
+from core.fuzzymatch import FuzzyMatcher
+from core.tasks import checkCancelled
+
+# number of rows (or unique places) processed between progress reports and cancellation checks
+chunk_rows = 100000
+
+# (start, end) bounds of the chunks of a number of items, reporting progress and checking for cancellation
+def _chunkBounds(total, on_progress=None, cancelled=None):
+
+	for start in range(0, total, chunk_rows):
+		checkCancelled(cancelled)
+		yield start, min(start + chunk_rows, total)
+
+		if on_progress is not None:
+			on_progress(min(start + chunk_rows, total), total)
+
+# 64 bit hash of the values of the fields of each row (in a single vectorised pass); the rows of each chunk
+# are sliced before the fields are selected (so that only the chunk is copied) and their values are hashed
+# directly (factorizing them first would repeat the work for the values recurring in every chunk)
+def rowHashes(data, fields, on_progress=None, cancelled=None):
+
+	hashes = np.empty(len(data), dtype=np.uint64)
+	for start, end in _chunkBounds(len(data), on_progress, cancelled):
+		hashes[start:end] = pd.util.hash_pandas_object(data.iloc[start:end][fields], index=False, categorize=False).to_numpy()
+
+	return hashes
+
+# positions of the rows with missing values in any of the fields
+def missingRecordPositions(data, fields, on_progress=None, cancelled=None):
+
+	missing = np.empty(len(data), dtype=bool)
+	for start, end in _chunkBounds(len(data), on_progress, cancelled):
+		missing[start:end] = data.iloc[start:end][fields].isna().any(axis=1).to_numpy()
+
+	return np.flatnonzero(missing)
+
+# code of each row by the values of its fields (equal codes for equal values); the rows are grouped by the hashes
+# of their values, and the values of the rows sharing a hash are then compared (so that different values whose
+# hashes collide are told apart)
+def _valueCodes(data, fields, on_progress=None, cancelled=None):
+
+	codes, _ = pd.factorize(rowHashes(data, fields, on_progress, cancelled))
+	candidates = np.flatnonzero(np.bincount(codes)[codes] > 1)
+
+	if len(candidates):
+		checkCancelled(cancelled)
+		value_codes = data.iloc[candidates][fields].groupby(list(fields), sort=False, dropna=False, observed=True).ngroup().to_numpy()
+		codes[candidates] = len(codes) + value_codes
+
+	return codes
+
+# positions of the rows sharing their field values with other rows (rows of a cluster placed together, in order
+# of their first row), and the size of the cluster of each of those rows
+def duplicateClusters(data, fields, on_progress=None, cancelled=None):
+
+	codes = _valueCodes(data, fields, on_progress, cancelled)
+	counts = np.bincount(codes)
+
+	positions = np.flatnonzero(counts[codes] > 1)
+	positions = positions[np.argsort(codes[positions], kind='stable')]
+
+	return positions, counts[codes[positions]]
+
+# positions of the rows duplicating the field values of an earlier row (the rows to remove)
+def duplicateRecordPositions(data, fields, on_progress=None, cancelled=None):
+	return np.flatnonzero(pd.Series(_valueCodes(data, fields, on_progress, cancelled)).duplicated(keep='first').to_numpy())
+
+# lookup keys of the rows with complete place names that are not found in the gazetteer
+def _unmatchedKeys(data, fields, gazetteer, on_progress=None, cancelled=None):
+
+	keys = LookupKeys(data, fields)
+
+	# geocode each unique place once
+	unmatched_places = np.empty(len(keys), dtype=bool)
+	for start, end in _chunkBounds(len(keys), on_progress, cancelled):
+		latitudes, _ = gazetteer.geocode(keys.places[start:end])
+		unmatched_places[start:end] = np.isnan(latitudes)
+
+	# rows without place names are not considered (they are shown under missing data)
+	return LookupKeys(data, fields, np.flatnonzero((keys.codes >= 0) & np.append(unmatched_places, False)[keys.codes]))
+
+# positions of the rows with complete place names that are not found in the gazetteer
+def unmatchedRecordPositions(data, fields, gazetteer, on_progress=None, cancelled=None):
+	return _unmatchedKeys(data, fields, gazetteer, on_progress, cancelled).positions
+
+# gazetteer names suggested (with scores) for the misspelt names of each unique unmatched place, best first
+def suggestedCorrections(data, fields, gazetteer, on_progress=None, cancelled=None):
+
+	keys = _unmatchedKeys(data, fields, gazetteer, on_progress, cancelled)
+
+	suggestions = FuzzyMatcher(gazetteer).matchPlaces(keys.places, on_progress, cancelled)
+	suggestions['Records'] = np.bincount(keys.codes[keys.codes >= 0], minlength=len(keys))
+
+	return suggestions.sort_values('Score', ascending=False, na_position='last', ignore_index=True)
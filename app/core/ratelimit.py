@@ -0,0 +1,222 @@
+""" Per-host rate limiting and adaptive (AIMD) concurrency of the lookups against the web sources """
+
+import collections
+import math
+import threading
+import time
+
+# A token bucket refilled at 'rate' tokens per second up to 'burst' tokens
+class TokenBucket:
+
+	def __init__(self, rate, burst=None):
+
+		self.rate = rate
+		self.burst = burst if burst is not None else max(1.0, rate)
+
+		self._tokens = self.burst
+		self._updated = time.monotonic()
+
+	def _refill(self, now):
+		self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+		self._updated = now
+
+	# take a token, returning the seconds to wait before using it (the tokens of waiting callers are taken in
+	# advance, so that they go out spaced by the rate)
+	def reserve(self):
+
+		now = time.monotonic()
+		self._refill(now)
+
+		self._tokens -= 1
+		return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+	def tokens(self):
+
+		self._refill(time.monotonic())
+		return self._tokens
+
+# Token buckets of the hosts requests are sent to ('rate' requests per second for each host; no limit for None)
+class HostRateLimiter:
+
+	def __init__(self, rate=None, burst=None):
+
+		self.rate = rate
+		self.burst = burst
+
+		self._lock = threading.Lock()
+		self._buckets = {}
+
+	# seconds to wait before sending a request to a host
+	def reserve(self, host):
+
+		if not self.rate:
+			return 0.0
+
+		with self._lock:
+			bucket = self._buckets.get(host)
+			if bucket is None:
+				bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+			return bucket.reserve()
+
+	# {host: tokens available}
+	def tokens(self):
+		with self._lock:
+			return {host: bucket.tokens() for host, bucket in self._buckets.items()}
+
+# kind of outcome of a lookup ('ok', 'throttled' for HTTP 429 and 5xx, 'timeout' or 'error') from its error
+def outcome(error):
+
+	if error is None:
+		return 'ok'
+
+	# (urllib's HTTPError has a 'code', httpx's HTTPStatusError a response)
+	status = getattr(error, 'code', None)
+	if status is None and getattr(error, 'response', None) is not None:
+		status = getattr(error.response, 'status_code', None)
+
+	if isinstance(status, int) and (status == 429 or status >= 500):
+		return 'throttled'
+
+	# (urllib wraps socket timeouts in a URLError's reason, httpx has its own timeout exceptions)
+	reason = getattr(error, 'reason', None)
+	if isinstance(error, TimeoutError) or isinstance(reason, TimeoutError) or type(error).__name__.endswith('Timeout'):
+		return 'timeout'
+
+	return 'error'
+
+# An AIMD controller of the concurrency of the lookups: after each window (of as many lookups as the current
+# concurrency) with a healthy error rate and latency the concurrency grows (doubling until the first back off,
+# then by one), and it is halved on throttling responses or timeouts (at most once per window); when not
+# 'adaptive' the concurrency stays at the maximum (and only the latencies and outcomes are tracked)
+class ConcurrencyController:
+
+	def __init__(self, max_concurrency, initial_concurrency=4, min_concurrency=1, max_error_rate=0.05, max_latency_growth=2.0, latency_samples=1000, adaptive=True):
+
+		self.max_concurrency = max_concurrency
+		self.min_concurrency = min_concurrency
+		self.adaptive = adaptive
+
+		# windows with more errors, or a median latency grown beyond 'max_latency_growth' times the lowest
+		# window median, hold the concurrency
+		self.max_error_rate = max_error_rate
+		self.max_latency_growth = max_latency_growth
+
+		self._lock = threading.Lock()
+		self._concurrency = max(min_concurrency, min(initial_concurrency, max_concurrency)) if adaptive else max_concurrency
+		self._slow_start = True
+
+		self._window = []
+		self._window_errors = 0
+		self._backed_off = False
+		self._base_latency = None
+
+		self._latencies = collections.deque(maxlen=latency_samples)
+		self.counters = collections.Counter()
+
+	def concurrency(self):
+		return self._concurrency
+
+	# whether the worker 'number' (counting from 0) may send requests at the current concurrency
+	def active(self, number):
+		return number < self._concurrency
+
+	# record the latency (in seconds) and error (None on success) of a lookup
+	def record(self, latency, error=None):
+
+		kind = outcome(error)
+
+		with self._lock:
+
+			self.counters[kind] += 1
+			self._latencies.append(latency)
+
+			if not self.adaptive:
+				return
+
+			if kind in ('throttled', 'timeout'):
+				if not self._backed_off:
+					self._concurrency = max(self.min_concurrency, self._concurrency // 2)
+					self._slow_start = False
+					self._backed_off = True
+				self._window_errors += 1
+
+			elif kind == 'error':
+				self._window_errors += 1
+
+			self._window.append(latency)
+			if len(self._window) >= self._concurrency:
+				self._endWindow()
+
+	def _endWindow(self):
+
+		window_latency = percentile(sorted(self._window), 50)
+		if self._base_latency is None or window_latency < self._base_latency:
+			self._base_latency = window_latency
+
+		healthy = self._window_errors <= self.max_error_rate * len(self._window) and window_latency <= self.max_latency_growth * self._base_latency
+
+		if healthy and not self._backed_off:
+			self._concurrency = min(self.max_concurrency, self._concurrency * 2 if self._slow_start else self._concurrency + 1)
+
+		self._window = []
+		self._window_errors = 0
+		self._backed_off = False
+
+	# p50 and p95 of the recent latencies (in seconds; None before any lookup)
+	def latencyPercentiles(self):
+
+		with self._lock:
+			latencies = sorted(self._latencies)
+
+		return percentile(latencies, 50), percentile(latencies, 95)
+
+	# {outcome: number of lookups}
+	def outcomes(self):
+		with self._lock:
+			return dict(self.counters)
+
+# the q-th percentile of sorted values (None when there are none)
+def percentile(sorted_values, q):
+
+	if not sorted_values:
+		return None
+
+	return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))]
+
+# The rate limiter and concurrency controller a lookup engine sends its requests through
+class LookupThrottle:
+
+	def __init__(self, max_concurrency, rate=None, burst=None, initial_concurrency=4, adaptive=True):
+
+		self.rate_limiter = HostRateLimiter(rate, burst)
+		self.controller = ConcurrencyController(max_concurrency, initial_concurrency, adaptive=adaptive)
+
+		self._arguments = (max_concurrency, rate, burst, initial_concurrency, adaptive)
+
+	# pickle as a fresh throttle with the same settings (for the engines of sharded lookups in other processes)
+	def __reduce__(self):
+		return (LookupThrottle, self._arguments)
+
+	def active(self, number):
+		return self.controller.active(number)
+
+	def reserve(self, host):
+		return self.rate_limiter.reserve(host)
+
+	def record(self, latency, error=None):
+		self.controller.record(latency, error)
+
+	# live state (concurrency, tokens per host, latency percentiles and outcome counters)
+	def state(self):
+
+		p50, p95 = self.controller.latencyPercentiles()
+
+		return {
+			'concurrency': self.controller.concurrency(),
+			'max_concurrency': self.controller.max_concurrency,
+			'rate': self.rate_limiter.rate,
+			'tokens': self.rate_limiter.tokens(),
+			'p50': p50,
+			'p95': p95,
+			'counters': self.controller.outcomes(),
+		}
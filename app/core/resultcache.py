@@ -0,0 +1,133 @@
+""" Persistent on-disk cache of the nearest airports resolved for places """
+
+import os
+import sqlite3
+import threading
+import time
+
+# A SQLite backed cache of (IATA code, distance, source) keyed by normalised (cityname, statename, countryname),
+# with expiry of old entries, least recently used eviction beyond a size bound and hit/miss counters
+class ResultCache:
+
+	default_path = os.path.join(os.path.expanduser('~'), '.vimaan', 'results.sqlite3')
+
+	# number of keys queried per statement and results buffered before being written
+	query_batch_size = 500
+	write_batch_size = 200
+
+	def __init__(self, path=default_path, ttl=180 * 24 * 3600, max_entries=2000000):
+
+		self.path = path
+		self.ttl = ttl
+		self.max_entries = max_entries
+
+		self.hits = 0
+		self.misses = 0
+
+		if path != ':memory:':
+			os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+		# the cache is shared by the lookup threads (so guard the connection with a lock)
+		self._lock = threading.RLock()
+		self._connection = sqlite3.connect(path, check_same_thread=False)
+
+		self._connection.execute('PRAGMA journal_mode=WAL')
+		self._connection.execute('PRAGMA synchronous=NORMAL')
+		self._connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, iata TEXT, distance REAL, source TEXT, created REAL, accessed REAL)')
+		self._connection.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+		self._connection.commit()
+
+		self._entries = self._connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+		self._pending = []
+
+	# key of the cache entry for normalised place names
+	@staticmethod
+	def cacheKey(normalized_place):
+		return '\x1f'.join(normalized_place)
+
+	# look up normalised places, returning {position in 'normalized_places': (iata, distance)} of the hits
+	def getMany(self, normalized_places):
+
+		keys = [self.cacheKey(place) for place in normalized_places]
+		positions = {key: position for position, key in enumerate(keys)}
+
+		now = time.time()
+		found = {}
+		expired = []
+
+		with self._lock:
+
+			self._flush()
+
+			for start in range(0, len(keys), self.query_batch_size):
+
+				batch = keys[start:start + self.query_batch_size]
+				rows = self._connection.execute('SELECT key, iata, distance, created FROM results WHERE key IN ({})'.format(','.join('?' * len(batch))), batch)
+
+				for key, iata, distance, created in rows:
+					if now - created > self.ttl:
+						expired.append(key)
+					else:
+						found[positions[key]] = (iata, distance)
+
+			# drop the expired entries and mark the hits as recently used
+			hit_keys = [keys[position] for position in found]
+			for start in range(0, len(expired), self.query_batch_size):
+				batch = expired[start:start + self.query_batch_size]
+				self._connection.execute('DELETE FROM results WHERE key IN ({})'.format(','.join('?' * len(batch))), batch)
+			for start in range(0, len(hit_keys), self.query_batch_size):
+				batch = hit_keys[start:start + self.query_batch_size]
+				self._connection.execute('UPDATE results SET accessed = ? WHERE key IN ({})'.format(','.join('?' * len(batch))), [now] + batch)
+
+			self._connection.commit()
+			self._entries -= len(expired)
+
+			self.hits += len(found)
+			self.misses += len(set(keys)) - len(found)
+
+		return found
+
+	# store the result of looking up normalised place names (written in batches)
+	def put(self, normalized_place, iata, distance, source):
+
+		now = time.time()
+
+		with self._lock:
+			self._pending.append((self.cacheKey(normalized_place), iata, distance, source, now, now))
+			if len(self._pending) >= self.write_batch_size:
+				self._flush()
+
+	# write the buffered results, evicting the least recently used entries beyond the size bound
+	def _flush(self):
+
+		if not self._pending:
+			return
+
+		self._connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)', self._pending)
+		self._entries += len(self._pending)
+		self._pending = []
+
+		# the entry count over-estimates replaced entries (so recount before evicting)
+		if self._entries > self.max_entries:
+			self._entries = self._connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+			excess = self._entries - self.max_entries
+			if excess > 0:
+				self._connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)', (excess,))
+				self._entries -= excess
+
+		self._connection.commit()
+
+	def flush(self):
+		with self._lock:
+			self._flush()
+
+	# number of entries, hits and misses of the cache
+	def stats(self):
+		with self._lock:
+			return {'entries': self._entries + len(self._pending), 'hits': self.hits, 'misses': self.misses}
+
+	def close(self):
+		with self._lock:
+			self._flush()
+			self._connection.close()
@@ -0,0 +1,396 @@
+""" Population lookups sharded across processes (and machines sharing a work directory) """
+
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+# names of the files in a work directory
+manifest_name = 'manifest.json'
+stop_name = 'STOP'
+state_prefix = 'worker-'
+
+def _shardPath(work_dir, shard, suffix):
+	return os.path.join(work_dir, 'shard-{:04d}.{}'.format(shard, suffix))
+
+# shard of a place (stable across processes and machines)
+def placeShard(place, shards):
+	return zlib.crc32(json.dumps([str(name) for name in place]).encode('utf-8')) % shards
+
+# write the places to look up to a work directory as shards of '(key, place)' lines, the manifest last
+# (so that workers on other machines only start on complete shards)
+def writeShards(work_dir, places, shards):
+
+	os.makedirs(work_dir, exist_ok=True)
+
+	# clear the shards of an earlier run
+	for name in os.listdir(work_dir):
+		if name.startswith(('shard-', state_prefix)) or name in (manifest_name, stop_name):
+			os.remove(os.path.join(work_dir, name))
+
+	shard_files = [open(_shardPath(work_dir, shard, 'places.jsonl'), 'w', encoding='utf-8') for shard in range(shards)]
+	try:
+		for key, place in places:
+			shard_files[placeShard(place, shards)].write(json.dumps([key, [str(name) for name in place]]) + '\n')
+	finally:
+		for shard_file in shard_files:
+			shard_file.close()
+
+	with open(os.path.join(work_dir, manifest_name + '.part'), 'w', encoding='utf-8') as manifest:
+		json.dump({'shards': shards, 'created': time.time()}, manifest)
+	os.replace(os.path.join(work_dir, manifest_name + '.part'), os.path.join(work_dir, manifest_name))
+
+# the number of shards of a work directory (None until its manifest is written)
+def readManifest(work_dir):
+
+	try:
+		with open(os.path.join(work_dir, manifest_name), encoding='utf-8') as manifest:
+			return json.load(manifest)['shards']
+	except FileNotFoundError:
+		return None
+
+# claim a shard (atomically, so that each shard is worked on by one worker), taking over claims not
+# renewed for 'stale_after' seconds (of workers that died)
+def claimShard(work_dir, shard, stale_after=300.0):
+
+	claim_path = _shardPath(work_dir, shard, 'claim')
+
+	if os.path.exists(_shardPath(work_dir, shard, 'done')):
+		return False
+
+	try:
+		os.close(os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+		return True
+	except FileExistsError:
+		pass
+
+	try:
+		if time.time() - os.path.getmtime(claim_path) <= stale_after:
+			return False
+		os.remove(claim_path)
+	except FileNotFoundError:
+		pass
+
+	try:
+		os.close(os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+		return True
+	except FileExistsError:
+		return False
+
+# look up the places of a shard with an engine, appending '[key, iata, distance]' (or '[key, null, error]' for
+# failures) lines to its part file and marking the shard done when all its places are looked up
+def runShard(work_dir, shard, engine):
+
+	with open(_shardPath(work_dir, shard, 'places.jsonl'), encoding='utf-8') as places_file:
+		places = [(key, tuple(place)) for key, place in map(json.loads, places_file)]
+
+	claim_path = _shardPath(work_dir, shard, 'claim')
+	lock = threading.Lock()
+
+	with open(_shardPath(work_dir, shard, 'part.jsonl'), 'a', encoding='utf-8') as part:
+
+		# write whole lines (the results arrive from the lookup threads) and renew the claim meanwhile
+		def writeLine(values):
+			with lock:
+				part.write(json.dumps(values) + '\n')
+				part.flush()
+				os.utime(claim_path)
+
+		# release the claim of a failed shard (so that another worker can retry it without waiting for it to go stale)
+		try:
+			summary = engine.run(places, lambda key, iata, distance: writeLine([key, iata, distance]), lambda key, error: writeLine([key, None, str(error)]))
+		except BaseException:
+			os.remove(claim_path)
+			raise
+
+	if not engine.stopped():
+		open(_shardPath(work_dir, shard, 'done'), 'w').close()
+
+	return summary
+
+# write the state of a worker's throttle ('core.ratelimit.LookupThrottle.state()') to the work directory
+def writeState(state_path, state):
+
+	with open(state_path + '.part', 'w', encoding='utf-8') as state_file:
+		json.dump(state, state_file)
+	os.replace(state_path + '.part', state_path)
+
+# claim and look up the shards of a work directory until all of them are done (or the work is stopped), with
+# engines made by 'engine_factory()', taking over the claims of the workers that died (on any machine) once
+# they go stale; the state of the engines' throttle is written to the work directory as they run; returns the
+# summaries of the shards looked up
+def workShards(work_dir, engine_factory, stale_after=300.0, poll_interval=1.0):
+
+	shards = readManifest(work_dir)
+	while shards is None:
+		time.sleep(poll_interval)
+		shards = readManifest(work_dir)
+
+	stop_path = os.path.join(work_dir, stop_name)
+	state_path = os.path.join(work_dir, '{}{}-{}.json'.format(state_prefix, socket.gethostname(), os.getpid()))
+
+	summaries = []
+
+	# the engine looking up a shard (None between shards)
+	running = [None]
+
+	# stop the engine when the work is stopped (by the coordinator) and report the state of its throttle
+	done = threading.Event()
+	def watchEngine():
+		while not done.wait(poll_interval):
+			engine = running[0]
+			if engine is None:
+				continue
+			if os.path.exists(stop_path):
+				engine.stop()
+			if getattr(engine, 'throttle', None) is not None:
+				writeState(state_path, engine.throttle.state())
+	threading.Thread(target=watchEngine, daemon=True).start()
+
+	try:
+		while not os.path.exists(stop_path):
+
+			pending = [shard for shard in range(shards) if not os.path.exists(_shardPath(work_dir, shard, 'done'))]
+			if not pending:
+				break
+
+			claimed = False
+			for shard in pending:
+
+				if os.path.exists(stop_path):
+					break
+
+				if not claimShard(work_dir, shard, stale_after):
+					continue
+
+				claimed = True
+				engine = running[0] = engine_factory()
+				try:
+					summaries.append(runShard(work_dir, shard, engine))
+				finally:
+					running[0] = None
+					if getattr(engine, 'throttle', None) is not None:
+						writeState(state_path, engine.throttle.state())
+
+			# wait for the shards claimed by other workers (to take them over if they go stale)
+			if not claimed:
+				time.sleep(poll_interval)
+
+	finally:
+		done.set()
+
+	return summaries
+
+# leave interrupts to the coordinating process (which stops the workers through the work directory)
+def _ignoreInterrupts():
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+# The combined state of the throttles of the workers of a work directory (as written by 'workShards'), with the
+# keys of 'core.ratelimit.LookupThrottle.state()': the concurrency, rate, tokens and outcome counters summed
+# over the workers, and the latency percentiles of the slowest worker
+class ShardedThrottle:
+
+	def __init__(self, work_dir=None):
+		self.work_dir = work_dir
+
+	# the combined state (None until a worker reports one)
+	def state(self):
+
+		if self.work_dir is None:
+			return None
+
+		states = []
+		try:
+			names = os.listdir(self.work_dir)
+		except FileNotFoundError:
+			return None
+
+		for name in names:
+			if name.startswith(state_prefix) and name.endswith('.json'):
+				try:
+					with open(os.path.join(self.work_dir, name), encoding='utf-8') as state_file:
+						states.append(json.load(state_file))
+				except (OSError, ValueError):
+					pass
+
+		if not states:
+			return None
+
+		tokens = {}
+		counters = {}
+		for state in states:
+			for host, host_tokens in state['tokens'].items():
+				tokens[host] = tokens.get(host, 0.0) + host_tokens
+			for outcome, count in state['counters'].items():
+				counters[outcome] = counters.get(outcome, 0) + count
+
+		rates = [state['rate'] for state in states if state['rate']]
+		p50s = [state['p50'] for state in states if state['p50'] is not None]
+		p95s = [state['p95'] for state in states if state['p95'] is not None]
+
+		return {
+			'concurrency': sum(state['concurrency'] for state in states),
+			'max_concurrency': sum(state['max_concurrency'] for state in states),
+			'rate': sum(rates) if rates else None,
+			'tokens': tokens,
+			'p50': max(p50s) if p50s else None,
+			'p95': max(p95s) if p95s else None,
+			'counters': counters,
+		}
+
+# An engine sharding the places across a pool of (spawned) processes, each running an engine made by the
+# picklable 'engine_factory()', through a work directory that workers on other machines can share ('workShards');
+# it has the interface of 'core.lookupengine.LookupEngine', replaying the results of the shards' part files
+# as they are written (and the combined state of the workers' throttles as its 'throttle')
+class ShardedLookupEngine:
+
+	def __init__(self, engine_factory, processes=None, shards=None, work_dir=None, stale_after=300.0, poll_interval=0.2):
+
+		self.engine_factory = engine_factory
+		self.processes = processes or os.cpu_count() or 1
+
+		# more shards than processes (so that they finish together)
+		self.shards = shards or self.processes * 4
+
+		# work directory (a temporary one, removed after the run, when not given)
+		self.work_dir = work_dir
+
+		self.stale_after = stale_after
+		self.poll_interval = poll_interval
+
+		self._stop_event = threading.Event()
+
+		self.throttle = ShardedThrottle(work_dir)
+
+	def stop(self):
+		self._stop_event.set()
+
+	def stopped(self):
+		return self._stop_event.is_set()
+
+	# resolve (key, (cityname, statename, countryname)) places, calling 'on_result(key, iata, distance)'
+	# and 'on_failure(key, error)' as the shards' results are written
+	def run(self, places, on_result, on_failure=None):
+
+		places = list(places)
+		work_dir = self.work_dir or tempfile.mkdtemp(prefix='vimaan-shards-')
+
+		start = time.perf_counter()
+		writeShards(work_dir, places, self.shards)
+		self.throttle.work_dir = work_dir
+
+		# offset read so far in each part file and the keys replayed (a shard taken over from a dead worker may
+		# repeat results)
+		offsets = [0] * self.shards
+		replayed = set()
+		lookups = [0]
+		failures = [0]
+
+		def replayParts():
+			for shard in range(self.shards):
+				offsets[shard] = self._replayPart(work_dir, shard, offsets[shard], replayed, on_result, on_failure, lookups, failures)
+
+		errors = []
+
+		try:
+			# (spawned rather than forked, as forking a process running Qt and lookup threads is unsafe)
+			with ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'), initializer=_ignoreInterrupts) as executor:
+
+				futures = [executor.submit(workShards, work_dir, self.engine_factory, self.stale_after) for _ in range(self.processes)]
+
+				while not all(future.done() for future in futures):
+
+					if self.stopped():
+						open(os.path.join(work_dir, stop_name), 'w').close()
+
+					replayParts()
+					time.sleep(self.poll_interval)
+
+				for future in futures:
+					try:
+						future.result()
+					except Exception as error:
+						errors.append(error)
+
+			# wait for the shards claimed by other machines (unless stopped)
+			while not self.stopped() and not errors and not all(os.path.exists(_shardPath(work_dir, shard, 'done')) for shard in range(self.shards)):
+				replayParts()
+				time.sleep(self.poll_interval)
+
+			replayParts()
+
+		finally:
+			if self.work_dir is None:
+				shutil.rmtree(work_dir, ignore_errors=True)
+
+		elapsed = time.perf_counter() - start
+
+		return {
+			'workers': self.processes,
+			'lookups': lookups[0],
+			'failures': failures[0],
+			'elapsed': elapsed,
+			'throughput': lookups[0] / elapsed if elapsed else 0.0,
+			'worker_lookups': [],
+			'errors': [str(error) for error in errors],
+		}
+
+	# replay the complete lines of a shard's part file from an offset, returning the offset read up to
+	def _replayPart(self, work_dir, shard, offset, replayed, on_result, on_failure, lookups, failures):
+
+		try:
+			part = open(_shardPath(work_dir, shard, 'part.jsonl'), 'rb')
+		except FileNotFoundError:
+			return offset
+
+		with part:
+			part.seek(offset)
+			content = part.read()
+
+		end = content.rfind(b'\n') + 1
+		for line in content[:end].splitlines():
+
+			key, iata, result = json.loads(line)
+			if key in replayed:
+				continue
+			replayed.add(key)
+
+			if iata is not None:
+				lookups[0] += 1
+				on_result(key, iata, result)
+			else:
+				failures[0] += 1
+				if on_failure is not None:
+					on_failure(key, result)
+
+		return offset + end
+
+if __name__ == '__main__':
+
+	import argparse
+	import sys
+
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+	from core.asynchttpbackend import AsyncHttpLookupEngine
+
+	# work on the shards of a (shared) work directory from another machine
+	parser = argparse.ArgumentParser(description='Look up the shards of a shared work directory (of a population run with a work directory)')
+	parser.add_argument('work_dir')
+	parser.add_argument('--concurrency', type=int, default=100, help='requests in flight')
+	parser.add_argument('--url-template', help='url template of the source pages')
+	args = parser.parse_args()
+
+	options = {'concurrency': args.concurrency}
+	if args.url_template is not None:
+		options['url_template'] = args.url_template
+
+	summaries = workShards(args.work_dir, lambda: AsyncHttpLookupEngine(**options))
+	print('Looked up {} shards ({} places, {} failed)'.format(len(summaries), sum(summary['lookups'] for summary in summaries), sum(summary['failures'] for summary in summaries)), file=sys.stderr)
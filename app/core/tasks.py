@@ -0,0 +1,10 @@
+""" Cooperative cancellation of long computations run by the background workers """
+
+# raised inside a computation when its caller asked it to stop
+class TaskCancelled(Exception):
+	pass
+
+# stop a computation (by raising 'TaskCancelled') when its 'cancelled()' check says so
+def checkCancelled(cancelled):
+	if cancelled is not None and cancelled():
+		raise TaskCancelled()
@@ -1,5 +1,5 @@
 # import libraries necessary for GUI creation
-from PyQt5.QtWidgets import QApplication, QDialog, QTableView, QVBoxLayout, QHBoxLayout, QLabel, QPushButton
+from PyQt5.QtWidgets import QApplication, QDialog, QTableView, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QProgressBar
 from PyQt5.QtCore import Qt
 import sys
 
@@ -21,10 +21,16 @@ class DataViewerDialog(QDialog):
 		status_close_pane = QHBoxLayout()
 
 		self.status_label = QLabel()
+
+		self.progress_bar = QProgressBar()
+		self.progress_bar.setMaximumWidth(200)
+		self.progress_bar.hide()
+
 		close_btn = QPushButton('Close')
 		close_btn.pressed.connect(self.close)
 
 		status_close_pane.addWidget(self.status_label)
+		status_close_pane.addWidget(self.progress_bar)
 		status_close_pane.addStretch(100)
 		status_close_pane.addWidget(close_btn)
 		status_close_pane.addStretch(1)
@@ -42,10 +48,25 @@ class DataViewerDialog(QDialog):
 		self.status_label.setText('Preparing Data. Please wait ...')
 		self.status_label.setStyleSheet("color: brown; font: bold;")
 
+	# show the progress of preparing the data
+	def showPreparingDataProgress(self, done, total):
+
+		self.progress_bar.setMaximum(total)
+		self.progress_bar.setValue(done)
+		self.progress_bar.show()
+
+	# show the error that stopped preparing the data
+	def showPreparingDataFailed(self, error):
+
+		self.progress_bar.hide()
+		self.status_label.setText('<b>Failed to prepare data:</b> {}'.format(error))
+		self.status_label.setStyleSheet("color: red;")
+
 	# set data in the data viewer dialog
 	def setDataModel(self, data_model):
 
 		self.data_table.setModel(data_model)
+		self.progress_bar.hide()
 
 		self.status_label.setText('Showing <b>{}</b> Records'.format(data_model.rowCount()))
 		self.status_label.setStyleSheet("")
@@ -1,14 +1,12 @@
 """ 'Import Data' screen """
 
 # import neccessary libraries for gui creation
-from PyQt5.QtWidgets import QApplication, QDialog, QSizePolicy, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QPushButton, QFileDialog, QGroupBox, QComboBox, QMessageBox
+from PyQt5.QtWidgets import QApplication, QDialog, QSizePolicy, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QPushButton, QFileDialog, QGroupBox, QComboBox, QMessageBox, QProgressBar
 from PyQt5.QtGui import QFont, QPainter, QFontMetrics, QStandardItemModel, QStandardItem
 from PyQt5.QtCore import QSize, Qt, pyqtSignal
 import sys
 
-# import libraries importing and manipulating data
-import pandas as pd
-from xlrd.biffh import XLRDError
+# (the import worker reading files with pandas is imported when a file is first read)
 
 # A custom 'resizable label' class (that trucates text with elipsis ...)
 class ResizeableLabel(QLabel):
@@ -55,7 +53,10 @@ class DataFieldsComboBox(QComboBox):
 class ImportDataDialog(QDialog):
 
 	# define the custom signals for use by controller
-	data_import_finish_signal = pyqtSignal(str, str, str, str, str, pd.DataFrame)
+	data_import_finish_signal = pyqtSignal(str, str, str, str, str, object, object)
+
+	# cancelled workers kept alive until they notice the cancellation (and stop)
+	_stopping_workers = set()
 
 	def __init__(self, *args, **kargs):
 
@@ -76,6 +77,9 @@ class ImportDataDialog(QDialog):
 		self._data = None
 		self._data_fields_model = QStandardItemModel()
 
+		# background worker reading the chosen input file
+		self._import_worker = None
+
 		# Customise the QDialog UI
 		self.initUI()
 
@@ -84,7 +88,7 @@ class ImportDataDialog(QDialog):
 		# create and display dialog to 'choose input file'
 		input_file_pane = QHBoxLayout()
 
-		input_file_choose_label = QLabel('Choose your input file (.xlsx, .xls)')
+		input_file_choose_label = QLabel('Choose your input file (.xlsx, .xls, .csv, .parquet, .feather)')
 		input_file_label_font  = QFont("Verdana, Helvetica", 10, QFont.Bold)
 		input_file_choose_label.setFont(input_file_label_font)
 
@@ -130,6 +134,7 @@ class ImportDataDialog(QDialog):
 
 		map_input_fields_pane.setLayout(map_input_fields_box)
 		# map_input_fields_pane.hide()
+		self.map_input_fields_pane = map_input_fields_pane
 
 		# create and display output field's mapping group box
 		map_output_fields_pane = QGroupBox('Output Fields')
@@ -149,6 +154,7 @@ class ImportDataDialog(QDialog):
 
 		map_output_fields_pane.setLayout(map_output_fields_box)
 		# map_output_fields_pane.hide()
+		self.map_output_fields_pane = map_output_fields_pane
 
 		# create and display input field's mapping outer pane
 		map_input_fields_outer_pane = QVBoxLayout()
@@ -175,18 +181,28 @@ class ImportDataDialog(QDialog):
 		# Create the finish button box
 		finish_button_pane = QHBoxLayout()
 		
-		self.wait_message_label = QLabel('Reading data from file. Please wait ...')
+		self.wait_message_label = QLabel()
 		self.wait_message_label.setStyleSheet("color: brown; font: bold;")
 
+		self.read_progress_bar = QProgressBar()
+		self.read_progress_bar.setFormat('%v / %m rows')
+
+		self.cancel_read_button = QPushButton('Cancel')
+		self.cancel_read_button.pressed.connect(self.cancelReading)
+
 		self.finish_button = QPushButton('Finish')
 		self.finish_button.pressed.connect(self.finishPressed)
 
 		finish_button_pane.addWidget(self.wait_message_label)
+		finish_button_pane.addWidget(self.read_progress_bar)
+		finish_button_pane.addWidget(self.cancel_read_button)
 		finish_button_pane.addStretch(100)
 		finish_button_pane.addWidget(self.finish_button)
 		finish_button_pane.addStretch(1)
 
 		self.wait_message_label.hide()
+		self.read_progress_bar.hide()
+		self.cancel_read_button.hide()
 		self.finish_button.setEnabled(False)
 
 		# Create and display the import data components
@@ -210,7 +226,7 @@ class ImportDataDialog(QDialog):
 
 		options = QFileDialog.Options()
 		options |= QFileDialog.DontUseNativeDialog
-		filename, _ = QFileDialog.getOpenFileName(self,"Choose Input File", "", "Excel Spreadsheet (*.xlsx *.xls);;All Files (*)", options=options)
+		filename, _ = QFileDialog.getOpenFileName(self,"Choose Input File", "", "Data Files (*.xlsx *.xls *.csv *.tsv *.txt *.parquet *.feather *.arrow);;Excel Spreadsheet (*.xlsx *.xls);;Delimited Text (*.csv *.tsv *.txt);;Parquet (*.parquet);;Feather (*.feather *.arrow);;All Files (*)", options=options)
 
 		if filename:
 
@@ -225,37 +241,136 @@ class ImportDataDialog(QDialog):
 			self.iata_field = None
 			self._data_fields_model.clear()
 
-			self.wait_message_label.show()
-			self.repaint()
+			# stop reading any previously chosen file
+			self.cancelReading()
+			self._data = None
+
+			# read only the field names of the file (the mapped fields are read on finish)
+			from workers.importworker import ImportWorker
+			self.startReading(ImportWorker(filename, header_only=True, parent=self), 'Reading fields from file. Please wait ...')
+
+	# read the file in a background thread, showing the wait status until done
+	def startReading(self, import_worker, wait_message):
+
+		self._import_worker = import_worker
+
+		self._import_worker.header_parsed.connect(self.headerParsed)
+		self._import_worker.progress.connect(self.readProgressed)
+		self._import_worker.data_imported.connect(self.dataRead)
+		self._import_worker.import_failed.connect(self.readFailed)
+		self._import_worker.finished.connect(self.readingStopped)
+
+		self.wait_message_label.setText(wait_message)
+		self.wait_message_label.show()
+		self.read_progress_bar.setRange(0, 0)
+		self.read_progress_bar.show()
+		self.cancel_read_button.show()
+		self.updateFinishButton()
+
+		self._import_worker.start()
+
+	# slot to fill the fields mapping combo boxes once the header of the file is parsed
+	def headerParsed(self, fields):
+
+		if self.sender() is not self._import_worker or not self._import_worker.header_only:
+			return
+
+		self.filename = self._import_worker.filename
+		self.input_filename_label.setText(self.filename)
+
+		combobox_placeholder_item = QStandardItem('Please select ...')
+		combobox_placeholder_item.setEnabled(False)
+
+		self._data_fields_model.appendRow(combobox_placeholder_item)
 
+		for field in fields:
+			item = QStandardItem(field)
+			self._data_fields_model.appendRow(item)
 
-			try:
-				self._data = pd.read_excel(filename)
-				self._data.index += 2
+	# slot to show the number of rows read from the file
+	def readProgressed(self, rows_read, total_rows):
 
-			except XLRDError as error:
-				error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>File Type Not Supported:</b> {}".format(error), buttons = QMessageBox.Ok, parent = self)
-				error_message_dialog.show()
+		if self.sender() is not self._import_worker:
+			return
+
+		self.read_progress_bar.setRange(0, total_rows)
+		self.read_progress_bar.setValue(rows_read)
+
+	# slot to receive the (mapped fields of the) data read from the file, with the report of its memory per column
+	def dataRead(self, data, memory_report):
+
+		if self.sender() is not self._import_worker:
+			return
+
+		self._data = data
+		self._data.index += 2
+
+		self.data_import_finish_signal.emit(self.filename, self.cityname_field, self.statename_field, self.countryname_field, self.iata_field, self._data, memory_report)
+		self.close()
+
+	# slot to show the errors encountered in reading the file
+	def readFailed(self, error_kind, error):
+
+		if self.sender() is not self._import_worker:
+			return
+
+		# clear the details of a file whose fields could not be read
+		if self._import_worker.header_only:
+			self.filename = None
+			self.input_filename_label.setText(self.filename)
+			self._data_fields_model.clear()
+
+		if error_kind == 'unsupported':
+			error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>File Type Not Supported:</b> {}".format(error), buttons = QMessageBox.Ok, parent = self)
+		else:
+			error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>Encountered an error in opening and parsing file.</b> {}".format(error), buttons = QMessageBox.Ok, parent = self)
 
-			except Exception as error:
-				error_message_dialog = QMessageBox(QMessageBox.Critical, " ", "<b>Encountered an error in opening and parsing file.</b> {}".format(error), buttons = QMessageBox.Ok, parent = self)
-				error_message_dialog.show()
+		error_message_dialog.show()
 
-			else:
+	# slot to hide the wait status once the file has been read (or failed or cancelled)
+	def readingStopped(self):
 
-				self.filename = filename
-				self.input_filename_label.setText(self.filename)
-				
-				combobox_placeholder_item = QStandardItem('Please select ...')
-				combobox_placeholder_item.setEnabled(False)
+		if self.sender() is not self._import_worker:
+			return
 
-				self._data_fields_model.appendRow(combobox_placeholder_item)
+		self._import_worker = None
+		self.hideReadingStatus()
 
-				for field in self._data.columns:
-					item = QStandardItem(field)
-					self._data_fields_model.appendRow(item)
+	# cancel reading the chosen input file
+	def cancelReading(self):
 
-			self.wait_message_label.hide()
+		if self._import_worker is None:
+			return
+
+		# 'readingStopped' will not be called for the cancelled worker
+		worker, self._import_worker = self._import_worker, None
+		worker.requestInterruption()
+
+		# detach the worker from the dialog so that closing the dialog does not destroy a running thread
+		worker.setParent(None)
+		ImportDataDialog._stopping_workers.add(worker)
+		worker.finished.connect(lambda: ImportDataDialog._stopping_workers.discard(worker))
+
+		self.hideReadingStatus()
+
+	# hide the wait status and allow changing the fields mapping again
+	def hideReadingStatus(self):
+
+		self.wait_message_label.hide()
+		self.read_progress_bar.hide()
+		self.cancel_read_button.hide()
+
+		self.map_input_fields_pane.setEnabled(True)
+		self.map_output_fields_pane.setEnabled(True)
+		self.updateFinishButton()
+
+	# enable the finish button once all fields are mapped (and no file is being read)
+	def updateFinishButton(self):
+
+		if self._import_worker is None and self.filename and self.cityname_field and self.statename_field and self.countryname_field and self.iata_field:
+			self.finish_button.setEnabled(True)
+		else:
+			self.finish_button.setEnabled(False)
 
 	# slot to handle change of cityname field mapping
 	def citynameFieldChanged(self, current_index):
@@ -265,10 +380,7 @@ class ImportDataDialog(QDialog):
 		else:
 			self.cityname_field = self._data_fields_model.item(current_index).text()
 		
-		if self.cityname_field and self.statename_field and self.countryname_field and self.iata_field:
-			self.finish_button.setEnabled(True)
-		else:
-			self.finish_button.setEnabled(False)
+		self.updateFinishButton()
 
 	# slot to handle change of statname field mapping
 	def statenameFieldChanged(self, current_index):
@@ -278,10 +390,7 @@ class ImportDataDialog(QDialog):
 		else:
 			self.statename_field = self._data_fields_model.item(current_index).text()
 
-		if self.cityname_field and self.statename_field and self.countryname_field and self.iata_field:
-			self.finish_button.setEnabled(True)
-		else:
-			self.finish_button.setEnabled(False)
+		self.updateFinishButton()
 
 	# slot to handle change of countryname field mapping
 	def countrynameFieldChanged(self, current_index):
@@ -291,10 +400,7 @@ class ImportDataDialog(QDialog):
 		else:
 			self.countryname_field = self._data_fields_model.item(current_index).text()
 
-		if self.cityname_field and self.statename_field and self.countryname_field and self.iata_field:
-			self.finish_button.setEnabled(True)
-		else:
-			self.finish_button.setEnabled(False)
+		self.updateFinishButton()
 
 	# slot to handle change of iata field mapping
 	def iataFieldChanged(self, current_index):
@@ -304,15 +410,25 @@ class ImportDataDialog(QDialog):
 		else:
 			self.iata_field = self._data_fields_model.item(current_index).text()
 		
-		if self.cityname_field and self.statename_field and self.countryname_field and self.iata_field:
-			self.finish_button.setEnabled(True)
-		else:
-			self.finish_button.setEnabled(False)
+		self.updateFinishButton()
 
+	# read only the mapped fields of the file (with compact categoricals for state and country names, and the
+	# other fields compacted except the iata field that is written to)
 	def finishPressed(self):
 
-		self.data_import_finish_signal.emit(self.filename, self.cityname_field, self.statename_field, self.countryname_field, self.iata_field, self._data)
-		self.close()
+		usecols = [self.cityname_field, self.statename_field, self.countryname_field, self.iata_field]
+		categorical_fields = [field for field in (self.statename_field, self.countryname_field) if field != self.iata_field]
+
+		self.map_input_fields_pane.setEnabled(False)
+		self.map_output_fields_pane.setEnabled(False)
+
+		from workers.importworker import ImportWorker
+		self.startReading(ImportWorker(self.filename, usecols=usecols, categorical_fields=categorical_fields, keep_fields=[self.iata_field], parent=self), 'Reading data from file. Please wait ...')
+
+	# stop reading the input file when the dialog is closed
+	def closeEvent(self, event):
+		self.cancelReading()
+		super().closeEvent(event)
 
 # Test the 'Import Data' dialog
 if __name__ == '__main__':
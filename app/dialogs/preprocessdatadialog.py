@@ -1,19 +1,23 @@
 # import necessary libraries for gui creation
-from PyQt5.QtWidgets import QApplication, QDialog, QGroupBox, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QCheckBox
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QDialog, QGroupBox, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QCheckBox, QProgressBar
+from PyQt5.QtCore import Qt, pyqtSignal
 import sys
 
-# import data processing libraries
-import pandas as pd
-
 # import gui dialogs
 from dialogs.dataviewerdialog import DataViewerDialog 
 
 # import necessary models
 from models.dataframemodel import DataFrameModel
+from models.dataframeviewmodel import DataFrameViewModel
+
+# import the preprocessing computations and their background worker
+from core import preprocessing
+from workers.taskworker import TaskWorker
 
 missing_data_note = """Note: Records with missing city, state or country names have been implicitly removed."""
 
+unmatched_places_note = """Records whose city, state and country names are not found in the gazetteer (and cannot be looked up offline)."""
+
 class MissingDataNoteLabel(QLabel):
 
 	def __init__(self, *args, **kargs):
@@ -26,19 +30,29 @@ class MissingDataNoteLabel(QLabel):
 
 class PreprocessDataDialog(QDialog):
 
+	# define the custom signals for use by controller (number of removed duplicate records)
+	preprocess_finish_signal = pyqtSignal(int)
+
+	# workers of closed dialogs that have not stopped yet
+	_running_workers = set()
+
 	def __init__(self, *args, **kargs):
 
-		self.data = kargs.pop('data', None)
+		# the model of the imported data (whose current dataframe is viewed and preprocessed)
+		self.data_model = kargs.pop('data_model', None)
+
+		# gazetteer to check the place names against (when offline lookups are set up)
+		self.gazetteer = kargs.pop('gazetteer', None)
 
-		if self.data is None:
-			self.data = pd.DataFrame()
+		if self.data_model is None:
+			self.data_model = DataFrameModel()
 
 		# consider a subset of fields for preprocessing
 		self.fields = kargs.pop('fields', None)
 		
 		if self.fields is not None:
 
-			invalid_fields = [field for field in self.fields if field not in self.data]
+			invalid_fields = [field for field in self.fields if field not in self.data_model._data]
 			if invalid_fields:
 				print("ERROR: Invalid field(s) '{}' specified for data".format(*invalid_fields))
 				sys.exit(1)
@@ -47,6 +61,12 @@ class PreprocessDataDialog(QDialog):
 		super().__init__(*args, **kargs)
 		self.setWindowModality(Qt.WindowModal)
 
+		# background workers computing the records shown by the data viewer dialogs
+		self._task_workers = set()
+
+		# cancelled workers to stop before the duplicate records are removed
+		self._stopping_workers = set()
+
 		# customise the QDialog UI
 		self.initUI()
 
@@ -78,7 +98,7 @@ class PreprocessDataDialog(QDialog):
 		duplicate_records_pane = QGroupBox('Duplicate Records')
 		duplicate_records_box = QVBoxLayout()
 
-		duplicate_records_checkbox = QCheckBox('Remove records with duplicate city, state and country names.')
+		self.duplicate_records_checkbox = QCheckBox('Remove records with duplicate city, state and country names.')
 
 		duplicate_data_view_box = QHBoxLayout()
 		duplicate_data_view_btn = QPushButton('View Records')
@@ -89,22 +109,63 @@ class PreprocessDataDialog(QDialog):
 		duplicate_data_view_box.addStretch(1)
 
 		duplicate_records_box.addStretch(1)
-		duplicate_records_box.addWidget(duplicate_records_checkbox)
+		duplicate_records_box.addWidget(self.duplicate_records_checkbox)
 		duplicate_records_box.addStretch(1)
 		duplicate_records_box.addLayout(duplicate_data_view_box)
 		duplicate_records_box.addStretch(1)
 
 		duplicate_records_pane.setLayout(duplicate_records_box)
 
+		# create and display unmatched places group box
+		unmatched_places_pane = QGroupBox('Unmatched Places')
+		unmatched_places_box = QVBoxLayout()
+
+		unmatched_places_label = MissingDataNoteLabel(unmatched_places_note)
+
+		unmatched_places_view_box = QHBoxLayout()
+		unmatched_places_view_btn = QPushButton('View Records')
+		unmatched_places_view_btn.pressed.connect(self.viewUnmatchedPlaceRecords)
+
+		unmatched_places_suggest_btn = QPushButton('Suggest Corrections')
+		unmatched_places_suggest_btn.pressed.connect(self.viewSuggestedCorrections)
+
+		unmatched_places_view_box.addStretch(50)
+		unmatched_places_view_box.addWidget(unmatched_places_suggest_btn)
+		unmatched_places_view_box.addWidget(unmatched_places_view_btn)
+		unmatched_places_view_box.addStretch(1)
+
+		unmatched_places_box.addStretch(1)
+		unmatched_places_box.addWidget(unmatched_places_label)
+		unmatched_places_box.addStretch(1)
+		unmatched_places_box.addLayout(unmatched_places_view_box)
+		unmatched_places_box.addStretch(1)
+
+		unmatched_places_pane.setLayout(unmatched_places_box)
+
+		if self.gazetteer is None:
+			unmatched_places_pane.hide()
+
 		# create and display the finish button pane
 		finish_button_pane = QHBoxLayout()
 
-		finish_button = QPushButton('Finish')
+		self.finish_button = QPushButton('Finish')
+		self.finish_button.pressed.connect(self.finishPressed)
+
+		# status and progress of removing the duplicate records
+		self.finish_status_label = QLabel()
+		self.finish_progress_bar = QProgressBar()
+		self.finish_progress_bar.setMaximumWidth(200)
+		self.finish_progress_bar.hide()
 
+		finish_button_pane.addWidget(self.finish_status_label)
+		finish_button_pane.addWidget(self.finish_progress_bar)
 		finish_button_pane.addStretch(100)
-		finish_button_pane.addWidget(finish_button)
+		finish_button_pane.addWidget(self.finish_button)
 		finish_button_pane.addStretch(1)
 
+		# the panes disabled while the chosen preprocessing is applied
+		self._preprocess_panes = [missing_data_pane, duplicate_records_pane, unmatched_places_pane]
+
 		# create and display 'preprocess dialog' layout
 		preprocess_data_pane = QVBoxLayout()
 
@@ -112,6 +173,8 @@ class PreprocessDataDialog(QDialog):
 		preprocess_data_pane.addWidget(missing_data_pane)
 		preprocess_data_pane.addStretch(1)
 		preprocess_data_pane.addWidget(duplicate_records_pane)
+		preprocess_data_pane.addStretch(1)
+		preprocess_data_pane.addWidget(unmatched_places_pane)
 		preprocess_data_pane.addSpacing(20)
 		preprocess_data_pane.addStretch(1)
 		preprocess_data_pane.addLayout(finish_button_pane)
@@ -124,25 +187,147 @@ class PreprocessDataDialog(QDialog):
 
 	# view missing data records
 	def viewMissingDataRecords(self):
-		
-		missing_data_viewer_dialog = DataViewerDialog(parent=self)
-		missing_data_viewer_dialog.setWindowTitle('Missing Data Records')
-		missing_data_viewer_dialog.showPreparingDataStatus()
-		missing_data_viewer_dialog.show()
-
-		# extract records with missing fields
-		missing_data_records = self.data[self.fields][self.data[self.fields].isna().any(axis=1)]
-		missing_data_model = DataFrameModel(missing_data_records)
-		missing_data_viewer_dialog.setDataModel(missing_data_model)
-		missing_data_viewer_dialog.resize(self.sizeHint())
-
-	# view duplicate data records
+		self.viewRecords('Missing Data Records', self.recordsViewModel, preprocessing.missingRecordPositions)
+
+	# view duplicate data records (in clusters, with their sizes)
 	def viewDuplicateRecords(self):
-		
-		duplicate_data_viewer_dialog = DataViewerDialog(parent=self)
-		duplicate_data_viewer_dialog.setWindowTitle('Duplicate Data Records')
-		duplicate_data_viewer_dialog.showPreparingDataStatus()
-		duplicate_data_viewer_dialog.show()
+		self.viewRecords('Duplicate Data Records', self.duplicatesViewModel, preprocessing.duplicateClusters)
+
+	# view records with place names not found in the gazetteer
+	def viewUnmatchedPlaceRecords(self):
+		self.viewRecords('Unmatched Place Records', self.recordsViewModel, preprocessing.unmatchedRecordPositions, self.gazetteer)
+
+	# view gazetteer names suggested (with scores) for the misspelt names of unmatched places
+	def viewSuggestedCorrections(self):
+		self.viewRecords('Suggested Corrections', DataFrameModel, preprocessing.suggestedCorrections, self.gazetteer)
+
+	# compute records in a background worker and show them (through the model made by 'make_model' from the
+	# computed result) in a data viewer dialog (closing the viewer cancels the computation)
+	def viewRecords(self, title, make_model, function, *args):
+
+		data_viewer_dialog = DataViewerDialog(parent=self)
+		data_viewer_dialog.setWindowTitle(title)
+		data_viewer_dialog.showPreparingDataStatus()
+		data_viewer_dialog.show()
+
+		worker = TaskWorker(function, self.data_model._data, self.fields, *args, track_progress=True)
+		worker.progress.connect(data_viewer_dialog.showPreparingDataProgress)
+		worker.task_finished.connect(lambda result: self.recordsPrepared(data_viewer_dialog, make_model(result)))
+		worker.task_failed.connect(data_viewer_dialog.showPreparingDataFailed)
+		data_viewer_dialog.finished.connect(worker.requestInterruption)
+
+		# keep the worker (without a parent) alive until it stops, even if this dialog is closed first
+		self._task_workers.add(worker)
+		PreprocessDataDialog._running_workers.add(worker)
+		worker.finished.connect(lambda: self._task_workers.discard(worker))
+		worker.finished.connect(lambda: PreprocessDataDialog._running_workers.discard(worker))
+
+		worker.start()
+
+	# a view of the fields of the data's rows at positions (editing it edits the data)
+	def recordsViewModel(self, positions):
+		return DataFrameViewModel(self.data_model, positions, self.fields)
+
+	# a view of the duplicate clusters, with the size of each record's cluster
+	def duplicatesViewModel(self, clusters):
+
+		positions, cluster_sizes = clusters
+		return DataFrameViewModel(self.data_model, positions, self.fields, {'Duplicates': cluster_sizes})
+
+	# show the records in their data viewer dialog
+	def recordsPrepared(self, data_viewer_dialog, data_model):
+
+		data_viewer_dialog.setDataModel(data_model)
+		data_viewer_dialog.resize(self.sizeHint())
+
+	# stop the running computations (their results are no longer shown)
+	def cancelTasks(self):
+
+		for worker in list(self._task_workers):
+			worker.progress.disconnect()
+			worker.task_finished.disconnect()
+			worker.task_failed.disconnect()
+			worker.requestInterruption()
+
+		self._task_workers.clear()
+
+	# apply the chosen preprocessing to the data and close the dialog
+	def finishPressed(self):
+
+		if not self.duplicate_records_checkbox.isChecked():
+			self.cancelTasks()
+			self.preprocess_finish_signal.emit(0)
+			self.close()
+			return
+
+		for pane in self._preprocess_panes:
+			pane.setEnabled(False)
+		self.finish_button.setEnabled(False)
+
+		self.finish_status_label.setText('Finding duplicate records. Please wait ...')
+		self.finish_progress_bar.setRange(0, 0)
+		self.finish_progress_bar.show()
+
+		# the data must not change under a running computation, so the duplicates are found once the cancelled
+		# computations stopped (without blocking the GUI while they reach a cancellation check)
+		self._stopping_workers = {worker for worker in self._task_workers if worker.isRunning()}
+		self.cancelTasks()
+
+		for worker in self._stopping_workers:
+			worker.finished.connect(lambda worker=worker: self.taskStopped(worker))
+		if not self._stopping_workers:
+			self.findDuplicates()
+
+	# find the duplicates once the last cancelled computation stopped (unless the dialog was closed meanwhile)
+	def taskStopped(self, worker):
+
+		if worker not in self._stopping_workers:
+			return
+
+		self._stopping_workers.discard(worker)
+		if not self._stopping_workers and self.isVisible():
+			self.findDuplicates()
+
+	# find the duplicate records to remove in a background worker (closing the dialog cancels it)
+	def findDuplicates(self):
+
+		worker = TaskWorker(preprocessing.duplicateRecordPositions, self.data_model._data, self.fields, track_progress=True)
+		worker.progress.connect(self.finishProgressed)
+		worker.task_finished.connect(self.duplicatesFound)
+		worker.task_failed.connect(self.finishFailed)
+
+		self._task_workers.add(worker)
+		PreprocessDataDialog._running_workers.add(worker)
+		worker.finished.connect(lambda: self._task_workers.discard(worker))
+		worker.finished.connect(lambda: PreprocessDataDialog._running_workers.discard(worker))
+
+		worker.start()
+
+	def finishProgressed(self, done, total):
+		self.finish_progress_bar.setRange(0, total)
+		self.finish_progress_bar.setValue(done)
+
+	# remove the duplicate records found (through the data model) and close the dialog
+	def duplicatesFound(self, positions):
+
+		removed_records = self.data_model.removeRowPositions(positions)
+
+		self.preprocess_finish_signal.emit(removed_records)
+		self.close()
+
+	def finishFailed(self, error):
+
+		for pane in self._preprocess_panes:
+			pane.setEnabled(True)
+		self.finish_button.setEnabled(True)
+
+		self.finish_progress_bar.hide()
+		self.finish_status_label.setText('<b>Failed to remove the duplicate records:</b> {}'.format(error))
+
+	def closeEvent(self, event):
+		self._stopping_workers.clear()
+		self.cancelTasks()
+		super().closeEvent(event)
 
 # Test the 'Preprocess Data' dialog
 if __name__ == '__main__':
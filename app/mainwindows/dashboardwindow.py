@@ -1,12 +1,11 @@
 """ Dashboard screen for VIMAAN """
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QSizePolicy, QDesktopWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QGroupBox, QTableView, QPushButton, QLabel, QComboBox
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QSizePolicy, QDesktopWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QGroupBox, QTableView, QPushButton, QLabel, QComboBox, QSpinBox, QDoubleSpinBox, QProgressBar, QLineEdit, QCheckBox
 from PyQt5.QtGui import QFont, QPainter, QFontMetrics
-from PyQt5.QtCore import QSize, Qt, pyqtSignal
+from PyQt5.QtCore import QSize, Qt, pyqtSignal, QTimer
 
+import re
 import sys
 
-import pandas as pd
-
 about_vimaan = """<p>
 Project <strong>VIMAAN</strong> is a highly specific enterprise <b>web-mining</b> project undertaken to tag places around the world to their <b>nearest airports</b>.
 </p>
@@ -16,6 +15,20 @@ The project <i>source code</i> can be found on <a href='https://github.com/elixi
 </p>
 """
 
+# sources the nearest airports can be looked up from (identifier, display name)
+lookup_sources = [
+	('chrome', 'Web (ChromeDriver)'),
+	('async', 'Web (Async HTTP)'),
+	('offline', 'Offline (Airports Dataset)'),
+]
+
+# (default, maximum) lookup workers of each source (the async HTTP workers are requests in flight on one thread)
+lookup_source_workers = {
+	'chrome': (4, 64),
+	'async': (100, 1000),
+	'offline': (4, 64),
+}
+
 # A custom 'menu button' class
 class MenuButton(QPushButton):
 
@@ -72,6 +85,11 @@ class DashboardWindow(QMainWindow):
 	select_chromedriver_menu_pressed = pyqtSignal()
 	import_data_menu_pressed = pyqtSignal()
 	preprocess_data_menu_pressed = pyqtSignal()
+	populate_iata_menu_pressed = pyqtSignal()
+	export_data_menu_pressed = pyqtSignal()
+	select_airports_dataset_pressed = pyqtSignal()
+	select_gazetteer_pressed = pyqtSignal()
+	stop_population_pressed = pyqtSignal()
 
 	def __init__(self):
 		# initialise the QMainWindow
@@ -87,20 +105,25 @@ class DashboardWindow(QMainWindow):
 		self.import_data_btn = MenuButton('Import Data')
 		self.preprocess_data_btn = MenuButton('Preprocess Data')
 		self.populate_iata_btn = MenuButton('Populate IATAs')
+		self.export_data_btn = MenuButton('Export Data')
 
 		self.import_data_btn.setEnabled(False)
 		self.preprocess_data_btn.setEnabled(False)
 		self.populate_iata_btn.setEnabled(False)
+		self.export_data_btn.setEnabled(False)
 
 		menu_pane.addWidget(select_chromedriver_btn)
 		menu_pane.addWidget(self.import_data_btn)
 		menu_pane.addWidget(self.preprocess_data_btn)
 		menu_pane.addWidget(self.populate_iata_btn)
+		menu_pane.addWidget(self.export_data_btn)
 
 		# connect the custom controller signals to menu button's pressed event
 		select_chromedriver_btn.pressed.connect(self.select_chromedriver_menu_pressed)
 		self.import_data_btn.pressed.connect(self.import_data_menu_pressed)
 		self.preprocess_data_btn.pressed.connect(self.preprocess_data_menu_pressed)
+		self.populate_iata_btn.pressed.connect(self.populate_iata_menu_pressed)
+		self.export_data_btn.pressed.connect(self.export_data_menu_pressed)
 
 		# create and display 'About VIMAAN' widgets
 		about_vimaan_pane = QGroupBox('About VIMAAN')
@@ -133,8 +156,87 @@ class DashboardWindow(QMainWindow):
 		self.chromedriver_path_label = ResizeableLabel('')
 		self.chromedriver_path_label.setStyleSheet("border: 1px inset grey;")
 
+		lookup_source_label = QLabel('Lookup Source: ')
+		lookup_source_label.setFont(chromedriver_label_font)
+
+		self.lookup_source_combobox = QComboBox()
+		for source, source_name in lookup_sources:
+			self.lookup_source_combobox.addItem(source_name, source)
+
+		lookup_workers_label = QLabel('Lookup Workers: ')
+		lookup_workers_label.setFont(chromedriver_label_font)
+
+		self.lookup_workers_spinbox = QSpinBox()
+		self.lookup_workers_spinbox.setRange(1, 64)
+		self.lookup_workers_spinbox.setValue(4)
+
+		lookup_processes_label = QLabel('Processes: ')
+		lookup_processes_label.setFont(chromedriver_label_font)
+
+		# processes to shard async HTTP lookups across (parsing the pages is CPU bound)
+		self.lookup_processes_spinbox = QSpinBox()
+		self.lookup_processes_spinbox.setRange(1, 64)
+		self.lookup_processes_spinbox.setValue(1)
+		self.lookup_processes_spinbox.setEnabled(False)
+
+		request_rate_label = QLabel('Requests/sec: ')
+		request_rate_label.setFont(chromedriver_label_font)
+
+		# requests per second per host of web lookups (0 for no limit)
+		self.request_rate_spinbox = QDoubleSpinBox()
+		self.request_rate_spinbox.setRange(0, 1000)
+		self.request_rate_spinbox.setDecimals(1)
+		self.request_rate_spinbox.setSpecialValueText('No limit')
+		self.request_rate_spinbox.setValue(0)
+
+		# the workers chosen for each source
+		self._source_workers = {source: workers for source, (workers, _) in lookup_source_workers.items()}
+		self._lookup_source = self.lookupSource()
+		self.lookup_source_combobox.currentIndexChanged.connect(self.lookupSourceChanged)
+
 		chromedriver_pane.addWidget(chromedriver_label)
 		chromedriver_pane.addWidget(self.chromedriver_path_label)
+		chromedriver_pane.addSpacing(20)
+		chromedriver_pane.addWidget(lookup_source_label)
+		chromedriver_pane.addWidget(self.lookup_source_combobox)
+		chromedriver_pane.addSpacing(20)
+		chromedriver_pane.addWidget(lookup_workers_label)
+		chromedriver_pane.addWidget(self.lookup_workers_spinbox)
+		chromedriver_pane.addSpacing(20)
+		chromedriver_pane.addWidget(lookup_processes_label)
+		chromedriver_pane.addWidget(self.lookup_processes_spinbox)
+		chromedriver_pane.addSpacing(20)
+		chromedriver_pane.addWidget(request_rate_label)
+		chromedriver_pane.addWidget(self.request_rate_spinbox)
+
+		# create and display 'offline datasets' widgets
+		offline_data_pane = QHBoxLayout()
+
+		airports_dataset_label = QLabel('Airports Dataset: ')
+		airports_dataset_label.setFont(chromedriver_label_font)
+
+		self.airports_dataset_path_label = ResizeableLabel('')
+		self.airports_dataset_path_label.setStyleSheet("border: 1px inset grey;")
+
+		select_airports_dataset_btn = QPushButton('Choose')
+		select_airports_dataset_btn.pressed.connect(self.select_airports_dataset_pressed)
+
+		gazetteer_label = QLabel('Gazetteer: ')
+		gazetteer_label.setFont(chromedriver_label_font)
+
+		self.gazetteer_path_label = ResizeableLabel('')
+		self.gazetteer_path_label.setStyleSheet("border: 1px inset grey;")
+
+		self.select_gazetteer_btn = QPushButton('Choose')
+		self.select_gazetteer_btn.pressed.connect(self.select_gazetteer_pressed)
+
+		offline_data_pane.addWidget(airports_dataset_label)
+		offline_data_pane.addWidget(self.airports_dataset_path_label)
+		offline_data_pane.addWidget(select_airports_dataset_btn)
+		offline_data_pane.addSpacing(20)
+		offline_data_pane.addWidget(gazetteer_label)
+		offline_data_pane.addWidget(self.gazetteer_path_label)
+		offline_data_pane.addWidget(self.select_gazetteer_btn)
 
 		# create and display 'input filename' widgets
 		input_file_pane = QHBoxLayout()
@@ -146,8 +248,13 @@ class DashboardWindow(QMainWindow):
 		self.input_filename_label = ResizeableLabel('')
 		self.input_filename_label.setStyleSheet("border: 1px inset grey;")
 
+		# memory taken by the imported data (compacted), with the bytes of each column as read and compacted
+		self.memory_usage_label = QLabel()
+		self.memory_usage_label.hide()
+
 		input_file_pane.addWidget(input_file_label)
 		input_file_pane.addWidget(self.input_filename_label)
+		input_file_pane.addWidget(self.memory_usage_label)
 
 		# create and display input field's group box
 		input_fields_pane = QGroupBox('Input fields')
@@ -221,6 +328,7 @@ class DashboardWindow(QMainWindow):
 		import_details_box = QVBoxLayout()
 
 		import_details_box.addLayout(chromedriver_pane)
+		import_details_box.addLayout(offline_data_pane)
 		import_details_box.addLayout(input_file_pane)
 		import_details_box.addLayout(fields_mapping_pane)
 
@@ -233,10 +341,69 @@ class DashboardWindow(QMainWindow):
 		# create and display the 'imported data panel' widgets
 		self.imported_data_table = QTableView()
 
+		# sort by clicking the column headers (starting unsorted)
+		self.imported_data_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+		self.imported_data_table.setSortingEnabled(True)
+
+		# create and display the 'filter records' widgets (filtering once typing pauses)
+		filter_pane = QHBoxLayout()
+
+		self.filter_lineedit = QLineEdit()
+		self.filter_lineedit.setPlaceholderText('Filter records')
+		self.filter_lineedit.setClearButtonEnabled(True)
+
+		self.filter_field_combobox = QComboBox()
+		self.filter_field_combobox.addItem('All Fields', None)
+
+		self.filter_regex_checkbox = QCheckBox('Regular Expression')
+
+		self.filter_status_label = QLabel()
+
+		self.filter_timer = QTimer(self)
+		self.filter_timer.setSingleShot(True)
+		self.filter_timer.setInterval(300)
+		self.filter_timer.timeout.connect(self.applyFilter)
+
+		self.filter_lineedit.textChanged.connect(self.filter_timer.start)
+		self.filter_field_combobox.currentIndexChanged.connect(self.filter_timer.start)
+		self.filter_regex_checkbox.stateChanged.connect(self.filter_timer.start)
+
+		filter_pane.addWidget(self.filter_lineedit, 3)
+		filter_pane.addWidget(self.filter_field_combobox, 1)
+		filter_pane.addWidget(self.filter_regex_checkbox)
+		filter_pane.addWidget(self.filter_status_label)
+		filter_pane.addStretch(1)
+
+		# create and display the 'population status' widgets
+		population_status_pane = QHBoxLayout()
+
+		self.population_status_label = QLabel()
+
+		self.population_progress_bar = QProgressBar()
+		self.population_progress_bar.setFormat('%v / %m lookups')
+
+		# live state of the rate limit and adaptive concurrency of web lookups
+		self.throttle_status_label = QLabel()
+
+		self.stop_population_btn = QPushButton('Stop')
+		self.stop_population_btn.pressed.connect(self.stop_population_pressed)
+
+		population_status_pane.addWidget(self.population_status_label)
+		population_status_pane.addStretch(1)
+		population_status_pane.addWidget(self.throttle_status_label)
+		population_status_pane.addWidget(self.population_progress_bar)
+		population_status_pane.addWidget(self.stop_population_btn)
+
+		self.population_progress_bar.hide()
+		self.stop_population_btn.hide()
+		self.throttle_status_label.hide()
+
 		imported_data_panel = QVBoxLayout()
 
 		imported_data_panel.addWidget(import_details_pane)
+		imported_data_panel.addLayout(filter_pane)
 		imported_data_panel.addWidget(self.imported_data_table)
+		imported_data_panel.addLayout(population_status_pane)
 
 		# create and display the 'dashboard' widgets
 		dashboard_main_pane = QHBoxLayout()
@@ -266,13 +433,111 @@ class DashboardWindow(QMainWindow):
 		self.mapped_countryname_label.setText(countryname_field)
 		self.mapped_iata_label.setText(iata_field)
 
+	# show the memory taken by the imported data, before and after it was compacted, per column in the tooltip
+	# ('core.compaction.memoryReport()' rows)
+	def showMemoryReport(self, memory_report):
+
+		from core.compaction import formatBytes
+
+		read_bytes = sum(row[2] for row in memory_report)
+		compacted_bytes = sum(row[3] for row in memory_report)
+
+		self.memory_usage_label.setText('Memory: <b>{}</b> ({} as read)'.format(formatBytes(compacted_bytes), formatBytes(read_bytes)))
+
+		rows = ''.join('<tr><td>{}</td><td>{}</td><td align="right">{}</td><td align="right">{}</td></tr>'.format(field, dtype, formatBytes(before), formatBytes(after)) for field, dtype, before, after in memory_report)
+		self.memory_usage_label.setToolTip('<table cellspacing="4"><tr><th align="left">Field</th><th align="left">Type</th><th>As read</th><th>Compacted</th></tr>{}</table>'.format(rows))
+		self.memory_usage_label.show()
+
 	def setChromeDriverPath(self, chromedriver_path):
 		self.chromedriver_path_label.setText(chromedriver_path)
 
+	def setAirportsDatasetPath(self, airports_dataset_path):
+		self.airports_dataset_path_label.setText(airports_dataset_path)
+
+	def setGazetteerPath(self, gazetteer_path):
+		self.gazetteer_path_label.setText(gazetteer_path)
+
+	# identifier of the chosen lookup source (from 'lookup_sources')
+	def lookupSource(self):
+		return self.lookup_source_combobox.currentData()
+
+	def setLookupSource(self, source):
+		self.lookup_source_combobox.setCurrentIndex(self.lookup_source_combobox.findData(source))
+
+	# slot to switch the lookup workers to those of the chosen source (and allow importing data for sources
+	# needing no ChromeDriver or datasets)
+	def lookupSourceChanged(self):
+
+		self._source_workers[self._lookup_source] = self.lookup_workers_spinbox.value()
+		self._lookup_source = self.lookupSource()
+
+		self.lookup_workers_spinbox.setRange(1, lookup_source_workers[self._lookup_source][1])
+		self.lookup_workers_spinbox.setValue(self._source_workers[self._lookup_source])
+
+		self.lookup_processes_spinbox.setEnabled(self._lookup_source == 'async')
+
+		if self._lookup_source == 'async':
+			self.enableImportData()
+
 	# set the table data model
 	def setDataModel(self, data_model):
+
 		self.imported_data_table.setModel(data_model)
 
+		data_model.modelReset.connect(self.dataModelReset)
+		data_model.rowsInserted.connect(self.showFilterStatus)
+		data_model.rowsRemoved.connect(self.showFilterStatus)
+		data_model.layoutChanged.connect(self.showFilterStatus)
+		self.dataModelReset()
+
+	# update the filter fields (and clear a filter dropped by the model) when the data is reset
+	def dataModelReset(self):
+
+		data_model = self.imported_data_table.model()
+
+		fields = [str(field) for field in data_model._data.columns]
+		if fields != [self.filter_field_combobox.itemText(index) for index in range(1, self.filter_field_combobox.count())]:
+
+			self.filter_field_combobox.blockSignals(True)
+			self.filter_field_combobox.clear()
+			self.filter_field_combobox.addItem('All Fields', None)
+			for column, field in enumerate(fields):
+				self.filter_field_combobox.addItem(field, column)
+			self.filter_field_combobox.blockSignals(False)
+
+		if data_model.filterPattern() is None and self.filter_lineedit.text():
+			self.filter_lineedit.blockSignals(True)
+			self.filter_lineedit.clear()
+			self.filter_lineedit.blockSignals(False)
+
+		self.showFilterStatus()
+
+	# filter the records of the table by the typed pattern
+	def applyFilter(self):
+
+		data_model = self.imported_data_table.model()
+		if data_model is None:
+			return
+
+		try:
+			data_model.setFilter(self.filter_lineedit.text(), self.filter_field_combobox.currentData(), self.filter_regex_checkbox.isChecked())
+		except re.error as error:
+			self.filter_lineedit.setStyleSheet("color: red;")
+			self.filter_lineedit.setToolTip('Invalid regular expression: {}'.format(error))
+		else:
+			self.filter_lineedit.setStyleSheet("")
+			self.filter_lineedit.setToolTip('')
+
+	# show the number of records passing the filter
+	def showFilterStatus(self):
+
+		data_model = self.imported_data_table.model()
+
+		if data_model is None or data_model.filterPattern() is None:
+			self.filter_status_label.setText('')
+		else:
+			self.filter_status_label.setText('Showing <b>{}</b> of {} records'.format(data_model.rowCount(), len(data_model._data)))
+
 	# enable the import data buttons
 	def enableImportData(self):
 		self.import_data_btn.setEnabled(True)
@@ -285,6 +550,73 @@ class DashboardWindow(QMainWindow):
 	def enablePopulateIATAs(self):
 		self.populate_iata_btn.setEnabled(True)
 
+	# enable the export data button
+	def enableExportData(self):
+		self.export_data_btn.setEnabled(True)
+
+	# number of concurrent lookup workers chosen for populating iata's
+	def lookupWorkers(self):
+		return self.lookup_workers_spinbox.value()
+
+	# processes to shard the lookups across
+	def lookupProcesses(self):
+		return self.lookup_processes_spinbox.value() if self.lookup_processes_spinbox.isEnabled() else 1
+
+	# requests per second per host of web lookups (None for no limit)
+	def requestRate(self):
+		return self.request_rate_spinbox.value() or None
+
+	# show the progress of a running population or export (and disable changing the data meanwhile)
+	def showPopulationStarted(self, status_text='Populating IATAs. Please wait ...', progress_format='%v / %m lookups'):
+
+		self.import_data_btn.setEnabled(False)
+		self.preprocess_data_btn.setEnabled(False)
+		self.populate_iata_btn.setEnabled(False)
+		self.export_data_btn.setEnabled(False)
+
+		self.population_status_label.setText(status_text)
+		self.population_status_label.setStyleSheet("color: brown; font: bold;")
+
+		self.population_progress_bar.setFormat(progress_format)
+		self.population_progress_bar.setRange(0, 0)
+		self.population_progress_bar.show()
+		self.stop_population_btn.show()
+
+	def showPopulationProgress(self, completed, total):
+		self.population_progress_bar.setRange(0, total)
+		self.population_progress_bar.setValue(completed)
+
+	# show the live state of the rate limit and adaptive concurrency ('core.ratelimit.LookupThrottle.state()')
+	def showThrottleState(self, state):
+
+		latency = lambda seconds: '{:.0f} ms'.format(seconds * 1000) if seconds is not None else '-'
+
+		text = 'Concurrency <b>{}</b> / {} &nbsp; p50 {} &nbsp; p95 {}'.format(state['concurrency'], state['max_concurrency'], latency(state['p50']), latency(state['p95']))
+		if state['rate']:
+			text += ' &nbsp; tokens {}'.format(', '.join('{:.1f}'.format(max(tokens, 0.0)) for tokens in state['tokens'].values()) or '-')
+
+		throttled = state['counters'].get('throttled', 0) + state['counters'].get('timeout', 0)
+		if throttled:
+			text += ' &nbsp; <font color="red">throttled {}</font>'.format(throttled)
+
+		self.throttle_status_label.setText(text)
+		self.throttle_status_label.show()
+
+	# show the summary of a finished (or failed) population
+	def showPopulationFinished(self, summary_text):
+
+		self.import_data_btn.setEnabled(True)
+		self.preprocess_data_btn.setEnabled(True)
+		self.populate_iata_btn.setEnabled(True)
+		self.export_data_btn.setEnabled(True)
+
+		self.population_status_label.setText(summary_text)
+		self.population_status_label.setStyleSheet("")
+
+		self.population_progress_bar.hide()
+		self.stop_population_btn.hide()
+		self.throttle_status_label.hide()
+
 # Test the 'First Steps with VIMAAN' widget
 if __name__ == '__main__':
 
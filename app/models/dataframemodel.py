@@ -1,9 +1,28 @@
-from PyQt5.QtCore import Qt, QAbstractTableModel
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from collections import OrderedDict
+import re
+import numpy as np
 import pandas as pd
 
+from core import compaction
+
 # A custom 'Table Model' to display data from pandas dataframe
 class DataFrameModel(QAbstractTableModel):
 
+	# number of rows formatted together and number of formatted blocks kept in memory
+	block_size = 256
+	max_cached_blocks = 2048
+
+	# milliseconds for which changes are gathered before the views are notified of them (in one signal each)
+	update_interval = 50
+
+	# milliseconds for which changes of the sort column (or appended rows) are gathered before the shown rows are
+	# sorted again (sorting all the rows for each update while populating would keep the views busy)
+	resort_interval = 1000
+
+	# number of separate row ranges above which removing rows re-lays out the views instead of removing each range
+	max_removed_ranges = 32
+
 	# reimplement constructor (implement constructor of super-class)
 	def __init__(self, data=None, parent=None):
 		super().__init__(parent)
@@ -11,9 +30,42 @@ class DataFrameModel(QAbstractTableModel):
 			data = pd.DataFrame()
 		self._data = data
 
+		# display strings of recently viewed (column, row block) pairs in LRU order
+		self._block_cache = OrderedDict()
+
+		# changed rows of each column ({column: [first_row, last_row]}) and rows to append, not yet notified
+		self._changed_rows = {}
+		self._appended_rows = []
+
+		self._update_timer = QTimer(self)
+		self._update_timer.setSingleShot(True)
+		self._update_timer.setInterval(self.update_interval)
+		self._update_timer.timeout.connect(self.flushUpdates)
+
+		self._resort_timer = QTimer(self)
+		self._resort_timer.setSingleShot(True)
+		self._resort_timer.setInterval(self.resort_interval)
+		self._resort_timer.timeout.connect(self.resortRows)
+
+		# dataframe positions of the shown rows in order (None when neither sorted nor filtered) and the
+		# shown row of each dataframe position (-1 when filtered out, built when first needed)
+		self._rows = None
+		self._shown_rows = None
+
+		self._sort_column = None
+		self._sort_order = Qt.AscendingOrder
+
+		# the filter as (column or None for all columns, pattern, is regular expression)
+		self._filter = None
+
+		# dataframe positions in the sort order (before filtering) and the distinct values (as display strings)
+		# of the filtered columns ({column: (codes, strings)}), reused while the rows and columns are unchanged
+		self._sorted_rows = None
+		self._filter_strings = {}
+
 	# implement all methods of the 'Abstract Table Model' to create concrete class
 	def rowCount(self, parent=None):
-		return self._data.shape[0]
+		return self._data.shape[0] if self._rows is None else len(self._rows)
 
 	def columnCount(self, parent=None):
 		return self._data.shape[1]
@@ -21,10 +73,9 @@ class DataFrameModel(QAbstractTableModel):
 	def data(self, index, role=Qt.DisplayRole):
 
 		if index.isValid() and role == Qt.DisplayRole:
-			if not pd.isnull(self._data.iloc[index.row(), index.column()]):
-				return str(self._data.iloc[index.row(), index.column()])
-			else:
-				return ''
+			row = index.row()
+			block = self._displayBlock(index.column(), row // self.block_size)
+			return block[row % self.block_size]
 		return None
 
 
@@ -33,15 +84,428 @@ class DataFrameModel(QAbstractTableModel):
 			if orientation == Qt.Horizontal:
 				return self._data.columns[section]
 			if orientation == Qt.Vertical:
-				return str(self._data.index[section])
+				return str(self._data.index[self.framePosition(section)])
 		return None
 
-	# reset the entire data in a model
+	# reset the entire data in a model (clearing its sorting and filter)
 	def resetData(self, data):
 
 		if data is None:
 			data = pd.DataFrame()
 
+		self._update_timer.stop()
+		self._resort_timer.stop()
+		self._changed_rows.clear()
+		self._appended_rows.clear()
+
 		self.beginResetModel()
 		self._data = data
-		self.endResetModel()
\ No newline at end of file
+		self._block_cache.clear()
+		self._setRows(None)
+		self._sort_column = None
+		self._filter = None
+		self._sorted_rows = None
+		self._filter_strings.clear()
+		self.endResetModel()
+
+	# dataframe position of a shown row
+	def framePosition(self, row):
+		return row if self._rows is None else int(self._rows[row])
+
+	# dataframe positions of a range of shown rows
+	def framePositions(self, first_row, last_row):
+		return np.arange(first_row, last_row + 1) if self._rows is None else self._rows[first_row:last_row + 1]
+
+	# sort the shown rows by a column (missing values last), with a stable vectorised argsort
+	def sort(self, column, order=Qt.AscendingOrder):
+
+		if column < 0 or column >= self.columnCount():
+			return
+
+		self.flushUpdates()
+
+		self._sort_column = column
+		self._sort_order = order
+		self._resort_timer.stop()
+		self._reorderRows()
+
+	# sort the shown rows again after values of the sort column changed or rows were appended (once per resort
+	# interval)
+	def resortRows(self):
+
+		self._resort_timer.stop()
+		if self._sort_column is None:
+			return
+
+		self.flushUpdates()
+		self._reorderRows()
+
+	# show only the rows with a value of the column (or of any column, for None) containing the pattern
+	# (ignoring case, and as a regular expression if 'regex'), or all rows for an empty pattern
+	def setFilter(self, pattern, column=None, regex=False):
+
+		# raise 're.error' before changing anything for invalid expressions
+		if regex and pattern:
+			re.compile(pattern)
+
+		self.flushUpdates()
+
+		self.beginResetModel()
+		self._filter = (column, pattern, regex) if pattern else None
+		self._setRows(self._orderedRows())
+		self._block_cache.clear()
+		self.endResetModel()
+
+	# the current filter pattern (or None)
+	def filterPattern(self):
+		return self._filter[1] if self._filter is not None else None
+
+	# set the values of a field at row positions (repainting only the changed rows, once per update interval)
+	def setColumnValues(self, field, positions, values):
+
+		if not len(positions):
+			return
+
+		column = self._data.columns.get_loc(field)
+		try:
+			self._data.iloc[positions, column] = values
+		except (TypeError, ValueError):
+			# values not fitting the compacted dtype of the column (e.g. new categories)
+			compaction.widenColumn(self._data, field, values)
+			self._data.iloc[positions, column] = values
+		self._filter_strings.pop(column, None)
+		self._sortColumnChanged(column)
+
+		self._valuesChanged(column, np.asarray(positions, dtype=np.int64))
+
+	# set the values of a field in the rows from 'start' on
+	def setColumnSlice(self, field, start, values):
+
+		if not len(values):
+			return
+
+		column = self._data.columns.get_loc(field)
+		stop = start + len(values)
+		try:
+			self._data.iloc[start:stop, column] = values
+		except (TypeError, ValueError):
+			compaction.widenColumn(self._data, field, values)
+			self._data.iloc[start:stop, column] = values
+		self._filter_strings.pop(column, None)
+		self._sortColumnChanged(column)
+
+		if self._rows is None:
+			for block_number in range(start // self.block_size, (stop - 1) // self.block_size + 1):
+				self._block_cache.pop((column, block_number), None)
+			self._rowsChanged(column, start, stop - 1)
+		else:
+			self._valuesChanged(column, np.arange(start, stop))
+
+	# append the rows of a dataframe (with the same columns), inserted into the views once per update interval
+	# (at the end of the shown rows, when not filtered out, and sorted into place once per resort interval) and
+	# numbered on from the last row
+	def appendRows(self, rows):
+
+		if len(rows):
+			self._appended_rows.append(rows)
+			self._update_timer.start()
+
+	# remove the rows at positions (in place), returning the number of removed rows
+	def removeRowPositions(self, positions):
+
+		positions = np.unique(np.asarray(positions, dtype=np.int64))
+		if not len(positions):
+			return 0
+
+		# the pending changes refer to the current row positions
+		self.flushUpdates()
+
+		ranges = np.split(positions, np.flatnonzero(np.diff(positions) != 1) + 1)
+
+		kept = np.ones(len(self._data), dtype=bool)
+		kept[positions] = False
+
+		if self._rows is None and len(ranges) <= self.max_removed_ranges:
+
+			# notify the views of the ranges removed from the last (so that the rows of the earlier ranges do not
+			# move), showing the rows left through the shown rows meanwhile, then drop all the rows at once
+			shown_rows = np.arange(len(self._data))
+			for rows in reversed(ranges):
+				self.beginRemoveRows(QModelIndex(), int(rows[0]), int(rows[-1]))
+				shown_rows = np.delete(shown_rows, np.s_[rows[0]:rows[-1] + 1])
+				self._setRows(shown_rows)
+				self._block_cache.clear()
+				self.endRemoveRows()
+
+			# (the shown rows are then the rows of the dataframe, in order)
+			self._data = self._data[kept]
+			self._setRows(None)
+			self._sorted_rows = None
+			self._filter_strings.clear()
+			self._block_cache.clear()
+
+		else:
+
+			# remove all the rows at once, moving the selection and current index to the new row positions
+			self.layoutAboutToBeChanged.emit()
+
+			new_positions = np.cumsum(kept) - 1
+
+			# the shown rows that are kept (and their new shown rows)
+			old_rows = np.arange(len(self._data)) if self._rows is None else self._rows
+			kept_rows = kept[old_rows]
+			new_rows = np.cumsum(kept_rows) - 1
+
+			self._data = self._data[kept]
+			self._sorted_rows = None
+			self._filter_strings.clear()
+			if self._rows is not None:
+				self._setRows(new_positions[self._rows[kept_rows]])
+			self._block_cache.clear()
+
+			old_indexes = self.persistentIndexList()
+			new_indexes = [self.index(int(new_rows[index.row()]), index.column()) if kept_rows[index.row()] else QModelIndex() for index in old_indexes]
+			self.changePersistentIndexList(old_indexes, new_indexes)
+
+			self.layoutChanged.emit()
+
+		return len(positions)
+
+	# notify the views of the gathered changes and insert the gathered rows
+	def flushUpdates(self):
+
+		self._update_timer.stop()
+
+		changed_rows, self._changed_rows = self._changed_rows, {}
+		for column, (first_row, last_row) in changed_rows.items():
+			self.dataChanged.emit(self.index(first_row, column), self.index(last_row, column))
+
+		if self._appended_rows:
+
+			appended_rows, self._appended_rows = self._appended_rows, []
+			frame_row_count = len(self._data)
+			data = pd.concat([self._data, self._appendedFrame(appended_rows)])
+
+			if self._filter is None:
+				shown_positions = np.arange(frame_row_count, len(data))
+			else:
+				shown_positions = frame_row_count + np.flatnonzero(self._filterMask(data.iloc[frame_row_count:]))
+
+			# (rows all filtered out are appended without inserting shown rows)
+			row_count = self.rowCount()
+			if len(shown_positions):
+				self.beginInsertRows(QModelIndex(), row_count, row_count + len(shown_positions) - 1)
+			self._data = data
+			self._filter_strings.clear()
+
+			# the last (partial) block of shown rows gains rows
+			for key in [key for key in self._block_cache if key[1] >= row_count // self.block_size]:
+				del self._block_cache[key]
+
+			if self._rows is not None:
+				self._setRows(np.append(self._rows, shown_positions))
+			if len(shown_positions):
+				self.endInsertRows()
+
+			self._sortColumnChanged(self._sort_column)
+
+	# sort the shown rows again (by the current sort column and filter), moving the persistent indexes with them
+	def _reorderRows(self):
+
+		self._sorted_rows = None
+
+		self.layoutAboutToBeChanged.emit()
+		old_rows = self._rows
+		self._setRows(self._orderedRows())
+		self._block_cache.clear()
+		self._movePersistentIndexes(old_rows)
+		self.layoutChanged.emit()
+
+	# drop the sort order when values of the sort column changed (or rows were appended), to sort the shown
+	# rows again
+	def _sortColumnChanged(self, column):
+
+		if column is not None and column == self._sort_column:
+			self._sorted_rows = None
+			if not self._resort_timer.isActive():
+				self._resort_timer.start()
+
+	# the rows to append as one dataframe, numbered on from the last row of the data and with the categories of
+	# its categorical columns (which are added the new categories, so that they stay categorical)
+	def _appendedFrame(self, appended_rows):
+
+		rows = pd.concat(appended_rows, ignore_index=True)
+
+		index = self._data.index
+		start = int(index.max()) + 1 if len(index) and pd.api.types.is_integer_dtype(index) else len(index)
+		rows.index = pd.RangeIndex(start, start + len(rows))
+
+		for field, dtype in self._data.dtypes.items():
+			if isinstance(dtype, pd.CategoricalDtype) and field in rows:
+				compaction.widenColumn(self._data, field, rows[field])
+				rows[field] = pd.Categorical(rows[field], categories=self._data[field].cat.categories)
+
+		return rows
+
+	# drop the display strings of changed dataframe positions of a column and gather their shown rows
+	def _valuesChanged(self, column, positions):
+
+		rows = positions if self._rows is None else self._shownRows()[positions]
+		rows = rows[rows >= 0]
+
+		if not len(rows):
+			return
+
+		for block_number in np.unique(rows // self.block_size).tolist():
+			self._block_cache.pop((column, block_number), None)
+
+		self._rowsChanged(column, int(rows.min()), int(rows.max()))
+
+	# gather the changed rows of a column, to be notified when the update interval passes
+	def _rowsChanged(self, column, first_row, last_row):
+
+		changed_rows = self._changed_rows.get(column)
+		if changed_rows is None:
+			self._changed_rows[column] = [first_row, last_row]
+		else:
+			changed_rows[0] = min(changed_rows[0], first_row)
+			changed_rows[1] = max(changed_rows[1], last_row)
+
+		if not self._update_timer.isActive():
+			self._update_timer.start()
+
+	# fetch (or format and cache) the display strings for a block of rows of a column
+	def _displayBlock(self, column, block_number):
+
+		key = (column, block_number)
+		block = self._block_cache.get(key)
+
+		if block is not None:
+			self._block_cache.move_to_end(key)
+			return block
+
+		start = block_number * self.block_size
+		block = self._formatValues(self._blockValues(column, start, start + self.block_size))
+
+		self._block_cache[key] = block
+		if len(self._block_cache) > self.max_cached_blocks:
+			self._block_cache.popitem(last=False)
+
+		return block
+
+	# the cell values of a column in a range of shown rows (as a series)
+	def _blockValues(self, column, start, stop):
+
+		if self._rows is None:
+			return self._data.iloc[start:stop, column]
+		return self._data.iloc[self._rows[start:stop], column]
+
+	# set the shown rows (dropping the inverse mapping, to be rebuilt when needed)
+	def _setRows(self, rows):
+
+		self._rows = rows
+		self._shown_rows = None
+
+	# the shown row of each dataframe position (-1 when filtered out)
+	def _shownRows(self):
+
+		if self._shown_rows is None:
+			self._shown_rows = np.full(len(self._data), -1, dtype=np.int64)
+			self._shown_rows[self._rows] = np.arange(len(self._rows))
+		return self._shown_rows
+
+	# dataframe positions of the rows passing the filter, in the sort order (or None for all rows in order)
+	def _orderedRows(self):
+
+		if self._sort_column is None and self._filter is None:
+			return None
+
+		if self._sort_column is None:
+			rows = np.arange(len(self._data))
+		else:
+			if self._sorted_rows is None:
+				self._sorted_rows = self._sortOrder(self._data.iloc[:, self._sort_column], self._sort_order)
+			rows = self._sorted_rows
+
+		if self._filter is not None:
+			rows = rows[self._filterMask(self._data, self._filter_strings)[rows]]
+		return rows
+
+	# move the persistent indexes (selection, current index) of the shown rows to their new shown rows
+	def _movePersistentIndexes(self, old_rows):
+
+		old_indexes = self.persistentIndexList()
+		if not old_indexes:
+			return
+
+		shown_rows = self._shownRows() if self._rows is not None else np.arange(len(self._data))
+		new_indexes = []
+		for index in old_indexes:
+			row = shown_rows[index.row() if old_rows is None else old_rows[index.row()]]
+			new_indexes.append(self.index(int(row), index.column()) if row >= 0 else QModelIndex())
+		self.changePersistentIndexList(old_indexes, new_indexes)
+
+	# stable sort order of a column's values (missing values last, in either order)
+	@staticmethod
+	def _sortOrder(values, order):
+
+		try:
+			# (categoricals are factorized in the order of their categories, which is the order they were read or
+			# added in, so sort the categories by value first)
+			if isinstance(values.dtype, pd.CategoricalDtype):
+				values = values.cat.reorder_categories(values.cat.categories.sort_values())
+			codes, uniques = pd.factorize(values, sort=True)
+		except TypeError:
+			# mixed types (e.g. numbers and text in a spreadsheet column) are sorted as text
+			codes, uniques = pd.factorize(values.astype(str).where(values.notna()), sort=True)
+
+		if order == Qt.DescendingOrder:
+			codes = np.where(codes >= 0, len(uniques) - 1 - codes, codes)
+		codes = np.where(codes >= 0, codes, len(uniques))
+
+		return np.argsort(codes, kind='stable')
+
+	# rows of a dataframe passing the filter (as a boolean array), keeping the distinct values of its columns
+	# in 'filter_strings' (when given) for the next filters
+	def _filterMask(self, data, filter_strings=None):
+
+		column, pattern, regex = self._filter
+		columns = range(data.shape[1]) if column is None else [column]
+
+		# numbers cannot contain text other than digits, signs, points and exponents (nor 'nan' and 'inf')
+		numbers_match = regex or set(pattern.lower()) <= set('0123456789+-.einfa')
+
+		mask = np.zeros(len(data), dtype=bool)
+		for column in columns:
+
+			dtype = data.dtypes.iloc[column]
+			if not numbers_match and pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+				continue
+
+			distinct_values = filter_strings.get(column) if filter_strings is not None else None
+			if distinct_values is None:
+				distinct_values = self._distinctStrings(data.iloc[:, column])
+				if filter_strings is not None:
+					filter_strings[column] = distinct_values
+
+			codes, strings = distinct_values
+			matches = strings.str.contains(pattern, case=False, regex=regex, na=False).to_numpy()
+			mask |= np.append(matches, False)[codes]
+
+		return mask
+
+	# codes of a column's values and the distinct values as shown (so that each is matched only once)
+	@staticmethod
+	def _distinctStrings(values):
+
+		codes, uniques = pd.factorize(values)
+		return codes, pd.Series(np.asarray(uniques).astype(str), dtype=object)
+
+	# convert a series of cell values to display strings (missing values are shown blank)
+	@staticmethod
+	def _formatValues(values):
+
+		missing = values.isna().to_numpy()
+		strings = values.to_numpy(dtype=object)
+
+		return ['' if is_missing else str(value) for value, is_missing in zip(strings, missing)]
@@ -0,0 +1,136 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from models.dataframemodel import DataFrameModel
+
+# A 'Table Model' showing a subset of rows (and fields) of another model's dataframe without copying it,
+# writing edits back to that model (it reads the base model's current dataframe, and neither sorts, filters
+# nor changes rows itself)
+class DataFrameViewModel(QAbstractTableModel):
+
+	block_size = DataFrameModel.block_size
+	max_cached_blocks = DataFrameModel.max_cached_blocks
+
+	# 'positions' are the row positions (in the base dataframe) to show, in order, and 'extra_columns'
+	# an optional {name: values} of read-only columns with a value per shown row
+	def __init__(self, base_model, positions, fields=None, extra_columns=None, parent=None):
+		super().__init__(parent)
+
+		self._base_model = base_model
+		self._positions = np.asarray(positions, dtype=np.int64)
+
+		if fields is None:
+			fields = list(base_model._data.columns)
+		self._fields = list(fields)
+
+		if extra_columns is None:
+			extra_columns = {}
+		self._extra_names = list(extra_columns)
+		self._extra_values = [np.asarray(values) for values in extra_columns.values()]
+
+		# display strings of recently viewed (column, row block) pairs in LRU order
+		self._block_cache = OrderedDict()
+
+		# repaint the shown rows changed through the base model (e.g. by another viewer)
+		base_model.dataChanged.connect(self.baseDataChanged)
+
+	def rowCount(self, parent=None):
+		return len(self._positions)
+
+	def columnCount(self, parent=None):
+		return len(self._fields) + len(self._extra_names)
+
+	def headerData(self, section, orientation, role):
+		if role == Qt.DisplayRole:
+			if orientation == Qt.Horizontal:
+				return self._fields[section] if section < len(self._fields) else self._extra_names[section - len(self._fields)]
+			if orientation == Qt.Vertical:
+				return str(self._base_model._data.index[self._positions[section]])
+		return None
+
+	# the fields of the base dataframe can be edited (but not the extra columns)
+	def flags(self, index):
+
+		flags = super().flags(index)
+		if index.isValid() and index.column() < len(self._fields):
+			flags |= Qt.ItemIsEditable
+		return flags
+
+	def data(self, index, role=Qt.DisplayRole):
+
+		if index.isValid() and role in (Qt.DisplayRole, Qt.EditRole):
+			row = index.row()
+			block = self._displayBlock(index.column(), row // self.block_size)
+			return block[row % self.block_size]
+		return None
+
+	# write an edited value to the base model (blank values are stored as missing, and values of numeric
+	# fields are parsed as numbers)
+	def setData(self, index, value, role=Qt.EditRole):
+
+		if not index.isValid() or role != Qt.EditRole or index.column() >= len(self._fields):
+			return False
+
+		field = self._fields[index.column()]
+		value = value.strip() if isinstance(value, str) else value
+		if value == '':
+			value = None
+
+		try:
+			if pd.api.types.is_numeric_dtype(self._base_model._data[field].dtype):
+				value = np.nan if value is None else pd.to_numeric(value)
+			self._base_model.setColumnValues(field, [self._positions[index.row()]], [value])
+		except (TypeError, ValueError):
+			return False
+
+		return True
+
+	# drop the display strings of the shown rows changed in the base model
+	def baseDataChanged(self, top_left, bottom_right):
+
+		changed_fields = set(self._base_model._data.columns[top_left.column():bottom_right.column() + 1])
+		columns = [column for column, field in enumerate(self._fields) if field in changed_fields]
+
+		# the base model's changed rows are its shown rows (which differ from dataframe positions when it is sorted or filtered)
+		if self._base_model._rows is None:
+			rows = np.flatnonzero((self._positions >= top_left.row()) & (self._positions <= bottom_right.row()))
+		else:
+			rows = np.flatnonzero(np.isin(self._positions, self._base_model.framePositions(top_left.row(), bottom_right.row())))
+
+		if not columns or not len(rows):
+			return
+
+		for column in columns:
+			for block_number in np.unique(rows // self.block_size).tolist():
+				self._block_cache.pop((column, block_number), None)
+
+		self.dataChanged.emit(self.index(int(rows[0]), columns[0]), self.index(int(rows[-1]), columns[-1]))
+
+	# fetch (or format and cache) the display strings for a block of rows of a column
+	def _displayBlock(self, column, block_number):
+
+		key = (column, block_number)
+		block = self._block_cache.get(key)
+
+		if block is not None:
+			self._block_cache.move_to_end(key)
+			return block
+
+		start = block_number * self.block_size
+		block = DataFrameModel._formatValues(self._blockValues(column, start, start + self.block_size))
+
+		self._block_cache[key] = block
+		if len(self._block_cache) > self.max_cached_blocks:
+			self._block_cache.popitem(last=False)
+
+		return block
+
+	# the cell values of a shown column in a range of shown rows
+	def _blockValues(self, column, start, stop):
+
+		if column < len(self._fields):
+			data = self._base_model._data
+			return data.iloc[self._positions[start:stop], data.columns.get_loc(self._fields[column])]
+		return pd.Series(self._extra_values[column - len(self._fields)][start:stop])
@@ -0,0 +1,208 @@
+""" Tests of the pooling and recycling of browser sessions (with fake drivers) """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contextlib
+import io
+import subprocess
+import threading
+import time
+import unittest
+from unittest import mock
+
+from core import browserpool
+from core.browserpool import BrowserPool, driverMemory
+
+try:
+	import psutil
+except ImportError:
+	psutil = None
+
+# A fake browser driver whose browser memory grows by 'memory_growth' bytes per page
+class FakeDriver:
+
+	launched = 0
+	quit_count = 0
+
+	def __init__(self, memory_growth=0):
+		FakeDriver.launched += 1
+		self.memory = 200 * 1024 * 1024
+		self.memory_growth = memory_growth
+		self.responding = True
+
+	def get(self, url):
+		self.memory += self.memory_growth
+
+	def execute_script(self, script):
+		if not self.responding:
+			raise ConnectionError('browser is not responding')
+		return 1
+
+	def quit(self):
+		FakeDriver.quit_count += 1
+
+# the memory of a fake driver's browser
+def fakeMemory(driver):
+	return driver.memory
+
+# load pages through sessions of a pool
+def browse(pool, pages):
+	for _ in range(pages):
+		session = pool.acquire()
+		session.driver.get('about:blank')
+		pool.release(session)
+
+class BrowserPoolTest(unittest.TestCase):
+
+	def setUp(self):
+		FakeDriver.launched = FakeDriver.quit_count = 0
+
+	def test_reuses_sessions_across_threads(self):
+
+		pool = BrowserPool(FakeDriver, size=3, memory_usage=fakeMemory)
+
+		threads = [threading.Thread(target=browse, args=(pool, 100)) for _ in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertLessEqual(FakeDriver.launched, 3)
+		self.assertEqual(pool.stats()['pages'], 800)
+
+		pool.close()
+		self.assertEqual(FakeDriver.quit_count, FakeDriver.launched)
+		self.assertEqual(pool.stats()['sessions'], 0)
+
+	def test_recycles_sessions_after_max_pages(self):
+
+		pool = BrowserPool(FakeDriver, size=1, max_pages=10, memory_usage=fakeMemory)
+		browse(pool, 25)
+
+		self.assertEqual(FakeDriver.launched, 3)
+		self.assertEqual(pool.stats()['recycled'], 2)
+
+	def test_recycles_sessions_once_their_memory_grows(self):
+
+		# (the baseline is measured after the first page and the growth every 5 pages, beyond 20 MB after 21 pages)
+		pool = BrowserPool(lambda: FakeDriver(memory_growth=1024 * 1024), size=1, max_memory_growth=20 * 1024 * 1024, memory_check_interval=5, memory_usage=fakeMemory)
+		browse(pool, 60)
+
+		self.assertEqual(FakeDriver.launched, 3)
+		self.assertEqual(pool.stats()['recycled'], 2)
+
+	def test_keeps_sessions_with_steady_memory(self):
+
+		pool = BrowserPool(FakeDriver, size=1, max_memory_growth=20 * 1024 * 1024, memory_check_interval=5, memory_usage=fakeMemory)
+		browse(pool, 60)
+
+		self.assertEqual(FakeDriver.launched, 1)
+		self.assertEqual(pool.stats()['recycled'], 0)
+
+	def test_recycles_sessions_after_browser_errors(self):
+
+		pool = BrowserPool(FakeDriver, size=2, memory_usage=fakeMemory)
+
+		session = pool.acquire()
+		pool.release(session, failed=True)
+
+		self.assertIsNot(pool.acquire(), session)
+		self.assertEqual(FakeDriver.launched, 2)
+		self.assertEqual(FakeDriver.quit_count, 1)
+
+	def test_replaces_idle_sessions_not_responding(self):
+
+		pool = BrowserPool(FakeDriver, size=1, health_check_idle=0.0, memory_usage=fakeMemory)
+
+		session = pool.acquire()
+		pool.release(session)
+		session.driver.responding = False
+		time.sleep(0.01)
+
+		self.assertIsNot(pool.acquire(), session)
+		self.assertEqual(pool.stats()['unhealthy'], 1)
+		self.assertEqual(FakeDriver.launched, 2)
+
+	def test_acquire_times_out_when_all_sessions_are_busy(self):
+
+		pool = BrowserPool(FakeDriver, size=1, memory_usage=fakeMemory)
+		pool.acquire()
+
+		with self.assertRaises(TimeoutError):
+			pool.acquire(timeout=0.05)
+
+	def test_acquire_fails_once_closed(self):
+
+		pool = BrowserPool(FakeDriver, size=1, memory_usage=fakeMemory)
+		pool.close()
+
+		with self.assertRaises(RuntimeError):
+			pool.acquire()
+
+# a fake driver of a local 'driver' process with a 'browser' child process (holding about 50 MB)
+def localDriver():
+
+	browser = 'import time; data = bytearray(50 * 1024 * 1024); time.sleep(30)'
+	process = subprocess.Popen([sys.executable, '-c', 'import subprocess, sys, time; subprocess.Popen([sys.executable, "-c", {!r}]); time.sleep(30)'.format(browser)])
+
+	driver = FakeDriver()
+	driver.service = type('Service', (), {'process': process})()
+	return driver
+
+# the memory of a driver once it exceeds the memory of its driver process ('process_memory(pid)') by 40 MB (the
+# browser process takes a moment to start and fill its memory), or its last memory
+def browserMemory(driver, process_memory):
+
+	deadline = time.monotonic() + 10
+	while True:
+		memory = driverMemory(driver)
+		minimum = process_memory(driver.service.process.pid) + 40 * 1024 * 1024
+		if (memory is not None and memory > minimum) or time.monotonic() > deadline:
+			return memory, minimum
+		time.sleep(0.05)
+
+# kill the driver and browser processes of a local driver
+def quitLocalDriver(driver):
+
+	os.system('pkill -KILL -P {}'.format(driver.service.process.pid))
+	driver.service.process.kill()
+	driver.service.process.wait()
+
+class DriverMemoryTest(unittest.TestCase):
+
+	def test_no_memory_without_a_local_process(self):
+
+		stderr = io.StringIO()
+		with mock.patch.object(browserpool, '_memory_unavailable_reported', False), contextlib.redirect_stderr(stderr):
+			self.assertIsNone(driverMemory(FakeDriver()))
+			self.assertIsNone(driverMemory(FakeDriver()))
+
+		# (reported once)
+		self.assertEqual(stderr.getvalue().count('Cannot measure the browser memory'), 1)
+
+	@unittest.skipIf(psutil is None, 'psutil is not installed')
+	def test_sums_the_memory_of_the_driver_and_browser_processes(self):
+
+		driver = localDriver()
+		try:
+			memory, minimum = browserMemory(driver, lambda pid: psutil.Process(pid).memory_info().rss)
+			self.assertGreater(memory, minimum)
+		finally:
+			quitLocalDriver(driver)
+
+	@unittest.skipUnless(os.path.exists('/proc/self/status'), 'there is no /proc')
+	def test_sums_the_memory_from_proc_without_psutil(self):
+
+		driver = localDriver()
+		try:
+			with mock.patch.dict(sys.modules, {'psutil': None}):
+				memory, minimum = browserMemory(driver, browserpool._residentMemory)
+			self.assertGreater(memory, minimum)
+		finally:
+			quitLocalDriver(driver)
+
+if __name__ == '__main__':
+	unittest.main()
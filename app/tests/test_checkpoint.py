@@ -0,0 +1,105 @@
+""" Tests of the checkpoint journal of population runs """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+
+from core.checkpoint import CheckpointJournal
+
+pune = ('pune', 'mh', 'india')
+agra = ('agra', 'up', 'india')
+delhi = ('delhi', 'dl', 'india')
+
+class CheckpointJournalTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.directory = tempfile.mkdtemp()
+		self.input_filename = os.path.join(self.directory, 'input.csv')
+		with open(self.input_filename, 'w') as input_file:
+			input_file.write('City,State,Country,IATA\n')
+
+		self.fields = ['City', 'State', 'Country', 'IATA']
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def open(self, **options):
+		return CheckpointJournal.open(self.input_filename, self.fields, directory=self.directory, **options)
+
+	def test_resumes_the_recorded_results(self):
+
+		journal = self.open()
+		journal.record(pune, 'PNQ', 5.0, 'web')
+		journal.record(agra, 'AGR', 7.0)
+		journal.close()
+
+		journal = self.open()
+		self.assertEqual(journal.getMany([delhi, agra, pune]), {1: ('AGR', 7.0, None), 2: ('PNQ', 5.0, 'web')})
+		journal.close()
+
+	def test_resumes_after_a_truncated_line(self):
+
+		journal = self.open()
+		journal.record(pune, 'PNQ', 5.0, 'web')
+		journal.close()
+
+		# a crash while appending a result
+		with open(journal.path, 'a', encoding='utf-8') as journal_file:
+			journal_file.write('{"place": ["agra", "up", "in')
+
+		journal = self.open()
+		self.assertEqual(journal.getMany([pune, agra]), {0: ('PNQ', 5.0, 'web')})
+
+		# (results recorded after the cut line are read back)
+		journal.record(delhi, 'DEL', 2.0, 'web')
+		journal.close()
+
+		journal = self.open()
+		self.assertEqual(journal.getMany([pune, agra, delhi]), {0: ('PNQ', 5.0, 'web'), 2: ('DEL', 2.0, 'web')})
+		journal.close()
+
+	def test_buffers_results_until_the_flush_interval(self):
+
+		journal = self.open(flush_interval=3600)
+		journal.record(pune, 'PNQ', 5.0, 'web')
+
+		self.assertEqual(CheckpointJournal._readResults(journal.path), {})
+		journal.flush()
+		self.assertEqual(CheckpointJournal._readResults(journal.path), {pune: ('PNQ', 5.0, 'web')})
+		journal.close()
+
+	def test_is_kept_per_input_file_and_fields(self):
+
+		journal = self.open()
+		journal.record(pune, 'PNQ', 5.0, 'web')
+		journal.close()
+
+		other = CheckpointJournal.open(self.input_filename, ['City', 'State', 'Country', 'Code'], directory=self.directory)
+		self.assertNotEqual(other.path, journal.path)
+		self.assertEqual(other.getMany([pune]), {})
+		other.close()
+
+		# (a changed input file starts a new journal)
+		with open(self.input_filename, 'a') as input_file:
+			input_file.write('Pune,MH,India,\n')
+
+		changed = self.open()
+		self.assertNotEqual(changed.path, journal.path)
+		changed.close()
+
+	def test_is_removed_once_complete(self):
+
+		journal = self.open()
+		journal.record(pune, 'PNQ', 5.0, 'web')
+		journal.remove()
+
+		self.assertFalse(os.path.exists(journal.path))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,242 @@
+""" Tests of the incremental updates of the data frame models """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from PyQt5.QtCore import QCoreApplication, QPersistentModelIndex, Qt
+
+from models.dataframemodel import DataFrameModel
+from models.dataframeviewmodel import DataFrameViewModel
+
+application = QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+# places numbered (like the imported data) from the spreadsheet row 2
+def places(count, start=0):
+
+	data = pd.DataFrame({
+		'City': ['City {}'.format(number) for number in range(start, start + count)],
+		'State': pd.Categorical(['State {}'.format(number % 3) for number in range(start, start + count)]),
+		'IATA': None,
+	})
+	data.index += 2
+	return data
+
+# the display strings of a model's column
+def columnStrings(model, column):
+	return [model.data(model.index(row, column)) for row in range(model.rowCount())]
+
+class AppendRowsTest(unittest.TestCase):
+
+	def test_shows_appended_rows_past_cached_blocks(self):
+
+		model = DataFrameModel(places(300))
+		self.assertEqual(model.data(model.index(299, 0)), 'City 299')
+
+		model.appendRows(places(100, 300))
+		model.flushUpdates()
+
+		self.assertEqual(model.rowCount(), 400)
+		self.assertEqual(model.data(model.index(350, 0)), 'City 350')
+		self.assertEqual(columnStrings(model, 0), ['City {}'.format(number) for number in range(400)])
+
+	def test_numbers_appended_rows_on_from_the_last_row(self):
+
+		model = DataFrameModel(places(300))
+		model.appendRows(places(50, 300))
+		model.appendRows(places(50, 350))
+		model.flushUpdates()
+
+		self.assertTrue(model._data.index.is_unique)
+		self.assertEqual(list(model._data.index), list(range(2, 402)))
+
+	def test_views_read_the_appended_dataframe(self):
+
+		model = DataFrameModel(places(10))
+		view_model = DataFrameViewModel(model, [1, 12], ['City', 'IATA'])
+
+		model.appendRows(places(5, 10))
+		model.flushUpdates()
+
+		model.setColumnValues('IATA', [1, 12], ['BOM', 'DEL'])
+		self.assertEqual(model._data['IATA'].iloc[12], 'DEL')
+		self.assertEqual(columnStrings(view_model, 0), ['City 1', 'City 12'])
+		self.assertEqual(columnStrings(view_model, 1), ['BOM', 'DEL'])
+
+	def test_keeps_categorical_columns_categorical(self):
+
+		model = DataFrameModel(places(10))
+
+		rows = places(2, 10)
+		rows['State'] = ['New State', 'State 0']
+		model.appendRows(rows)
+		model.flushUpdates()
+
+		self.assertIsInstance(model._data['State'].dtype, pd.CategoricalDtype)
+		self.assertEqual(list(model._data['State'].iloc[-2:]), ['New State', 'State 0'])
+
+	def test_appends_to_sorted_and_filtered_rows(self):
+
+		model = DataFrameModel(places(10))
+		model.sort(0, Qt.DescendingOrder)
+		model.appendRows(places(2, 10))
+		model.flushUpdates()
+		self.assertEqual(columnStrings(model, 0)[-2:], ['City 10', 'City 11'])
+		model.resortRows()
+		self.assertEqual(columnStrings(model, 0)[-4:], ['City 11', 'City 10', 'City 1', 'City 0'])
+
+		model.setFilter('City 1')
+		model.appendRows(places(10, 20))
+		model.flushUpdates()
+		self.assertEqual(model.rowCount(), 3)
+
+class SortTest(unittest.TestCase):
+
+	def test_sorts_categoricals_by_value(self):
+
+		data = pd.DataFrame({'State': pd.Categorical(['b', 'c', 'a', 'd', None], categories=['b', 'c', 'a', 'd'])})
+		model = DataFrameModel(data)
+
+		model.sort(0, Qt.AscendingOrder)
+		self.assertEqual(columnStrings(model, 0), ['a', 'b', 'c', 'd', ''])
+
+		model.sort(0, Qt.DescendingOrder)
+		self.assertEqual(columnStrings(model, 0), ['d', 'c', 'b', 'a', ''])
+
+	def test_sorts_added_categories_by_value(self):
+
+		model = DataFrameModel(pd.DataFrame({'State': pd.Categorical(['Alpha', 'Zeta'])}))
+		model.setColumnValues('State', [0], ['Brandnew'])
+
+		model.sort(0, Qt.AscendingOrder)
+		self.assertEqual(columnStrings(model, 0), ['Brandnew', 'Zeta'])
+
+	def test_sorts_mixed_categories_as_text(self):
+
+		model = DataFrameModel(pd.DataFrame({'Code': pd.Categorical([10, 'b', 2, 'a'])}))
+
+		model.sort(0, Qt.AscendingOrder)
+		self.assertEqual(columnStrings(model, 0), ['10', '2', 'a', 'b'])
+
+	def test_sorts_again_after_the_sort_column_changes(self):
+
+		model = DataFrameModel(places(5))
+		model.sort(0, Qt.AscendingOrder)
+
+		model.setColumnValues('City', [0], ['City 9'])
+		model.setColumnSlice('City', 3, ['Alpha'])
+		self.assertTrue(model._resort_timer.isActive())
+		model.resortRows()
+		self.assertEqual(columnStrings(model, 0), ['Alpha', 'City 1', 'City 2', 'City 4', 'City 9'])
+
+		# (changes of other columns leave the order)
+		model.setColumnValues('IATA', [1], ['BOM'])
+		model.resortRows()
+		self.assertEqual(columnStrings(model, 2), ['', 'BOM', '', '', ''])
+
+	def test_keeps_the_selection_on_sorted_rows(self):
+
+		model = DataFrameModel(places(5))
+		model.sort(0, Qt.DescendingOrder)
+
+		current = QPersistentModelIndex(model.index(4, 0))
+		self.assertEqual(model.data(current), 'City 0')
+
+		model.setColumnValues('City', [0], ['City 9'])
+		model.resortRows()
+		self.assertEqual(current.row(), 0)
+		self.assertEqual(model.data(model.index(current.row(), 0)), 'City 9')
+
+class SetColumnSliceTest(unittest.TestCase):
+
+	def test_sets_values_and_repaints_them(self):
+
+		model = DataFrameModel(places(600))
+		self.assertEqual(model.data(model.index(300, 2)), '')
+
+		model.setColumnSlice('IATA', 250, ['DEL'] * 100)
+		model.flushUpdates()
+
+		self.assertEqual(model.data(model.index(300, 2)), 'DEL')
+		self.assertEqual(model.data(model.index(350, 2)), '')
+		self.assertEqual(int((model._data['IATA'] == 'DEL').sum()), 100)
+
+	def test_widens_categorical_columns(self):
+
+		model = DataFrameModel(places(10))
+		model.setColumnSlice('State', 2, ['Brand New', 'State 1'])
+
+		self.assertEqual(list(model._data['State'].iloc[2:4]), ['Brand New', 'State 1'])
+
+class DataFrameViewModelTest(unittest.TestCase):
+
+	def test_shows_and_edits_rows_of_the_base_model(self):
+
+		model = DataFrameModel(places(10))
+		view_model = DataFrameViewModel(model, [7, 3], ['City', 'IATA'], {'Duplicates': [2, 1]})
+
+		self.assertEqual(columnStrings(view_model, 0), ['City 7', 'City 3'])
+		self.assertEqual(columnStrings(view_model, 2), ['2', '1'])
+		self.assertEqual(view_model.headerData(0, Qt.Vertical, Qt.DisplayRole), '9')
+
+		self.assertTrue(view_model.setData(view_model.index(1, 1), 'BOM'))
+		self.assertEqual(model._data['IATA'].iloc[3], 'BOM')
+		self.assertEqual(columnStrings(view_model, 1), ['', 'BOM'])
+
+	def test_keeps_its_rows_in_order(self):
+
+		model = DataFrameModel(places(10))
+		view_model = DataFrameViewModel(model, [7, 3], ['City'])
+
+		# (sorting is not supported, and the base model's rows are changed only through the base model)
+		view_model.sort(0, Qt.AscendingOrder)
+		self.assertEqual(columnStrings(view_model, 0), ['City 7', 'City 3'])
+		self.assertFalse(hasattr(view_model, 'removeRowPositions'))
+		self.assertFalse(hasattr(view_model, 'setFilter'))
+
+		model.sort(0, Qt.DescendingOrder)
+		model.setColumnValues('City', [7], ['Renamed'])
+		model.flushUpdates()
+		self.assertEqual(columnStrings(view_model, 0), ['Renamed', 'City 3'])
+
+class RemoveRowPositionsTest(unittest.TestCase):
+
+	def test_removes_few_ranges(self):
+
+		data = places(1000)
+		model = DataFrameModel(data)
+		removed = []
+		model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+		self.assertEqual(model.removeRowPositions([1, 2, 3, 500, 998, 999]), 6)
+
+		self.assertEqual(len(data), 1000)
+		self.assertEqual(removed, [(998, 999), (500, 500), (1, 3)])
+		self.assertEqual(model.rowCount(), 994)
+		self.assertEqual(columnStrings(model, 0)[:3], ['City 0', 'City 4', 'City 5'])
+		self.assertNotIn('City 500', columnStrings(model, 0))
+
+	def test_removes_scattered_rows(self):
+
+		model = DataFrameModel(places(1000))
+		positions = np.arange(0, 1000, 3)
+
+		self.assertEqual(model.removeRowPositions(positions), len(positions))
+		self.assertEqual(columnStrings(model, 0), ['City {}'.format(number) for number in range(1000) if number % 3])
+
+	def test_removes_by_position_despite_duplicate_labels(self):
+
+		data = pd.concat([places(5), places(5, 5)])
+		model = DataFrameModel(data)
+
+		model.removeRowPositions([6])
+		self.assertEqual(columnStrings(model, 0), ['City 0', 'City 1', 'City 2', 'City 3', 'City 4', 'City 5', 'City 7', 'City 8', 'City 9'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,131 @@
+""" Tests of the chunked writers and of the export with the fields of the input file """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core import datawriters
+from core.tasks import TaskCancelled
+
+# places with missing values (numbered, like the imported data, from the spreadsheet row 2)
+def places(count):
+
+	data = pd.DataFrame({
+		'City': ['City {}'.format(number) for number in range(count)],
+		'State': pd.Categorical(['State {}'.format(number % 3) for number in range(count)]),
+		'Population': [float(number * 1000) if number % 4 else np.nan for number in range(count)],
+		'IATA': [None if number % 5 == 0 else 'C{:02d}'.format(number % 100) for number in range(count)],
+	})
+	data.index += 2
+	return data
+
+# the values of a dataframe as lists of python values (missing values as None, whole numbers as ints)
+def rowValues(data):
+	return [[None if pd.isna(value) else int(value) if isinstance(value, float) and value == int(value) else value for value in row] for row in data.astype(object).itertuples(index=False, name=None)]
+
+class WriteDataTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def roundTrip(self, extension, read):
+
+		data = places(120)
+		filename = os.path.join(self.directory, 'export' + extension)
+		progress = []
+
+		self.assertEqual(datawriters.writeData(data, filename, chunk_rows=50, on_progress=lambda done, total: progress.append(done)), 120)
+
+		self.assertEqual(progress, [50, 100, 120])
+		self.assertFalse(os.path.exists(filename + '.part'))
+
+		written = read(filename)
+		self.assertEqual(list(written.columns), list(data.columns))
+		self.assertEqual(rowValues(written), rowValues(data))
+
+	def test_round_trips_csv(self):
+		self.roundTrip('.csv', pd.read_csv)
+
+	def test_round_trips_parquet(self):
+		self.roundTrip('.parquet', pd.read_parquet)
+
+	def test_round_trips_xlsx(self):
+		self.roundTrip('.xlsx', lambda filename: pd.read_excel(filename, engine='openpyxl'))
+
+	def test_removes_the_partial_file_when_cancelled(self):
+
+		filename = os.path.join(self.directory, 'export.csv')
+		with self.assertRaises(TaskCancelled):
+			datawriters.writeData(places(120), filename, chunk_rows=50, cancelled=lambda: True)
+
+		self.assertEqual(os.listdir(self.directory), [])
+
+	def test_rejects_unsupported_formats(self):
+
+		with self.assertRaises(ValueError):
+			datawriters.writeData(places(10), os.path.join(self.directory, 'export.txt'))
+
+class ExportDataTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.directory = tempfile.mkdtemp()
+
+		# an input file with more fields than are imported
+		self.source_filename = os.path.join(self.directory, 'input.csv')
+		source = places(30)
+		source.insert(1, 'Address', ['{} Main Road'.format(number) for number in range(30)])
+		source['Notes'] = 'note'
+		source['IATA'] = None
+		source.to_csv(self.source_filename, index=False)
+
+		# the imported fields, with the IATAs populated and some rows removed
+		self.data = places(30)[['City', 'State', 'IATA']].drop(index=[3, 10, 11])
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_exports_the_fields_that_were_not_imported(self):
+
+		filename = os.path.join(self.directory, 'export.csv')
+		rows, source_error = datawriters.exportData(self.data, self.source_filename, filename)
+
+		self.assertEqual((rows, source_error), (27, None))
+
+		exported = pd.read_csv(filename)
+		self.assertEqual(list(exported.columns), ['City', 'Address', 'State', 'Population', 'IATA', 'Notes'])
+		self.assertEqual(list(exported['City']), list(self.data['City']))
+		self.assertEqual(list(exported['Address'].iloc[:3]), ['0 Main Road', '2 Main Road', '3 Main Road'])
+		self.assertEqual(rowValues(exported[['IATA']]), rowValues(self.data[['IATA']]))
+
+	def test_exports_the_imported_fields_without_the_source(self):
+
+		filename = os.path.join(self.directory, 'export.csv')
+		os.remove(self.source_filename)
+
+		rows, source_error = datawriters.exportData(self.data, self.source_filename, filename)
+
+		self.assertEqual(rows, 27)
+		self.assertIsNotNone(source_error)
+		self.assertEqual(list(pd.read_csv(filename).columns), ['City', 'State', 'IATA'])
+
+	def test_rejects_a_source_with_fewer_rows(self):
+
+		pd.read_csv(self.source_filename).iloc[:20].to_csv(self.source_filename, index=False)
+
+		with self.assertRaises(ValueError):
+			datawriters.withSourceFields(self.data, self.source_filename)
+
+if __name__ == '__main__':
+	unittest.main()
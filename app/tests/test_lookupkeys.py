@@ -0,0 +1,74 @@
+""" Tests of the unique (normalised) place keys of the imported data """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core.lookupkeys import normalizeName, factorizeNames, LookupKeys
+
+fields = ['City', 'State', 'Country']
+
+class NormalizeNameTest(unittest.TestCase):
+
+	def test_ignores_case_whitespace_and_diacritics(self):
+
+		self.assertEqual(normalizeName('  São   Paulo '), 'sao paulo')
+		self.assertEqual(normalizeName('MÜNCHEN'), 'munchen')
+		self.assertEqual(normalizeName('Straße'), 'strasse')
+		self.assertEqual(normalizeName('\tNew\nDelhi'), 'new delhi')
+
+	def test_normalises_numbers_as_text(self):
+		self.assertEqual(normalizeName(42), '42')
+
+	def test_codes_blank_and_missing_names_as_missing(self):
+
+		codes, names = factorizeNames(pd.Series(['Pune', ' pune', None, '  ', 'Agra', np.nan], dtype=object))
+
+		self.assertEqual([names[code] if code >= 0 else None for code in codes], ['pune', 'pune', None, None, 'agra', None])
+
+class LookupKeysTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.data = pd.DataFrame({
+			'City': ['Pune', 'PUNE ', 'Agra', None, 'Agra', 'Pune'],
+			'State': pd.Categorical(['MH', 'mh', 'UP', 'UP', 'UP', 'KA']),
+			'Country': ['India'] * 6,
+		})
+		self.data.index += 2
+
+	def test_shares_a_key_between_names_differing_in_case_and_whitespace(self):
+
+		keys = LookupKeys(self.data, fields)
+
+		self.assertEqual(len(keys), 3)
+		self.assertEqual(keys.codes.tolist(), [0, 0, 1, -1, 1, 2])
+		self.assertEqual(keys.rowCount(), 5)
+
+		# (the first row of each key gives the names looked up)
+		self.assertEqual(keys.places, [('Pune', 'MH', 'India'), ('Agra', 'UP', 'India'), ('Pune', 'KA', 'India')])
+		self.assertEqual(keys.normalized, [('pune', 'mh', 'india'), ('agra', 'up', 'india'), ('pune', 'ka', 'india')])
+
+	def test_fans_out_key_values_to_rows(self):
+
+		keys = LookupKeys(self.data, fields)
+
+		self.assertEqual(keys.rowPositions(0).tolist(), [0, 1])
+		self.assertEqual(keys.fanOut(['PNQ', None, 'HBX']).tolist(), ['PNQ', 'PNQ', None, None, None, 'HBX'])
+
+	def test_keys_only_the_rows_at_positions(self):
+
+		keys = LookupKeys(self.data, fields, [2, 3, 5])
+
+		self.assertEqual(keys.places, [('Agra', 'UP', 'India'), ('Pune', 'KA', 'India')])
+		self.assertEqual(keys.rowPositions(1).tolist(), [5])
+		self.assertEqual(keys.fanOut(['AGR', 'HBX']).tolist(), ['AGR', None, 'HBX'])
+
+if __name__ == '__main__':
+	unittest.main()
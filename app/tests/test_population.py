@@ -0,0 +1,105 @@
+""" Tests of the lookup engine and of the population of the IATA field """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from core.lookupbackends import LookupFailed
+from core.lookupengine import LookupEngine
+from core.population import PopulationJob
+
+# A backend "looking up" each place as the first three letters of its city name (after a delay varying by place,
+# so that the results arrive out of order), failing for good for 'Nowhere' and once for 'Flaky'
+class FakeBackend:
+
+	lock = threading.Lock()
+	flaky_failures = 0
+
+	def lookup(self, cityname, statename, countryname):
+
+		time.sleep(0.001 * (len(cityname) % 4))
+
+		if cityname == 'Nowhere':
+			raise LookupFailed('no airport near Nowhere')
+
+		if cityname == 'Flaky':
+			with FakeBackend.lock:
+				FakeBackend.flaky_failures += 1
+				if FakeBackend.flaky_failures == 1:
+					raise ConnectionError('connection reset')
+
+		return cityname[:3].upper(), float(len(cityname))
+
+	def close(self):
+		pass
+
+class LookupEngineTest(unittest.TestCase):
+
+	def setUp(self):
+		FakeBackend.flaky_failures = 0
+
+	def test_resolves_each_key_with_one_failing(self):
+
+		cities = ['Pune', 'Nowhere', 'Agra', 'Flaky', 'Delhi', 'Goa', 'Indore', 'Jaipur']
+		places = [(key, (city, 'State', 'India')) for key, city in enumerate(cities)]
+
+		results = {}
+		failures = {}
+		engine = LookupEngine(FakeBackend, workers=3, backoff=0.001)
+		summary = engine.run(places, lambda key, iata, distance: results.__setitem__(key, (iata, distance)), lambda key, error: failures.__setitem__(key, str(error)))
+
+		self.assertEqual(results, {key: (city[:3].upper(), float(len(city))) for key, city in enumerate(cities) if city != 'Nowhere'})
+		self.assertEqual(failures, {1: 'no airport near Nowhere'})
+		self.assertEqual((summary['lookups'], summary['failures']), (7, 1))
+		self.assertEqual(sum(summary['worker_lookups']), 7)
+
+	def test_fails_the_places_when_no_backend_starts(self):
+
+		def failingBackend():
+			raise RuntimeError('no browser')
+
+		failures = {}
+		summary = LookupEngine(failingBackend, workers=2).run([(0, ('Pune', 'MH', 'India'))], lambda *result: None, lambda key, error: failures.__setitem__(key, str(error)))
+
+		self.assertEqual(failures, {0: 'no browser'})
+		self.assertEqual(summary['failures'], 1)
+		self.assertEqual(summary['errors'], ['no browser', 'no browser'])
+
+class PopulationJobTest(unittest.TestCase):
+
+	def setUp(self):
+		FakeBackend.flaky_failures = 0
+
+	def test_fills_in_the_rows_in_order_with_one_failing_key(self):
+
+		data = pd.DataFrame({
+			'City': ['Pune', 'Nowhere', 'pune ', 'Agra', 'Flaky', None, 'Agra', 'Delhi', 'Nowhere'],
+			'State': ['MH', 'XX', 'mh', 'UP', 'KA', 'UP', 'UP', 'DL', 'XX'],
+			'Country': ['India'] * 9,
+			'IATA': [None, None, None, None, None, None, None, 'XYZ', None],
+		})
+		data.index += 2
+
+		def writeResults(positions, iatas):
+			data.iloc[positions, data.columns.get_loc('IATA')] = iatas
+
+		progress = []
+		job = PopulationJob(data, 'City', 'State', 'Country', 'IATA')
+		summary = job.run(LookupEngine(FakeBackend, workers=3, backoff=0.001), writeResults, lambda done, total: progress.append((done, total)))
+
+		# (rows with an IATA already or without place names are left as they are)
+		iatas = data['IATA'].astype(object).where(data['IATA'].notna(), None)
+		self.assertEqual(list(iatas), ['PUN', None, 'PUN', 'AGR', 'FLA', None, 'AGR', 'XYZ', None])
+
+		self.assertEqual((summary['keys'], summary['rows'], summary['lookups'], summary['failures']), (4, 7, 3, 1))
+		self.assertEqual(sorted(progress)[-1], (4, 4))
+
+if __name__ == '__main__':
+	unittest.main()
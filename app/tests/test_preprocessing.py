@@ -0,0 +1,63 @@
+""" Tests of the preprocessing computations over the place name fields """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from core import preprocessing
+
+fields = ['City', 'State']
+
+def places():
+	return pd.DataFrame({
+		'City': ['Pune', 'Delhi', 'Pune', 'Agra', 'Delhi', 'Pune', None, None],
+		'State': pd.Categorical(['MH', 'DL', 'MH', 'UP', 'DL', 'KA', 'UP', 'UP']),
+		'IATA': None,
+	})
+
+# every row hashed alike (as if all their hashes collided)
+def collidingHashes(data, fields, on_progress=None, cancelled=None):
+	return np.zeros(len(data), dtype=np.uint64)
+
+class DuplicatesTest(unittest.TestCase):
+
+	def test_finds_duplicate_records(self):
+
+		self.assertEqual(preprocessing.duplicateRecordPositions(places(), fields).tolist(), [2, 4, 7])
+
+		positions, sizes = preprocessing.duplicateClusters(places(), fields)
+		self.assertEqual(positions.tolist(), [0, 2, 1, 4, 6, 7])
+		self.assertEqual(sizes.tolist(), [2, 2, 2, 2, 2, 2])
+
+	def test_compares_the_values_of_colliding_hashes(self):
+
+		with mock.patch.object(preprocessing, 'rowHashes', collidingHashes):
+
+			self.assertEqual(preprocessing.duplicateRecordPositions(places(), fields).tolist(), [2, 4, 7])
+
+			positions, sizes = preprocessing.duplicateClusters(places(), fields)
+			self.assertEqual(positions.tolist(), [0, 2, 1, 4, 6, 7])
+			self.assertEqual(sizes.tolist(), [2, 2, 2, 2, 2, 2])
+
+	def test_finds_no_duplicates_of_distinct_records(self):
+
+		data = places().iloc[[0, 1, 3, 5, 6]]
+
+		with mock.patch.object(preprocessing, 'rowHashes', collidingHashes):
+			self.assertEqual(preprocessing.duplicateRecordPositions(data, fields).tolist(), [])
+			self.assertEqual(len(preprocessing.duplicateClusters(data, fields)[0]), 0)
+
+class MissingRecordsTest(unittest.TestCase):
+
+	def test_finds_records_with_missing_values(self):
+		self.assertEqual(preprocessing.missingRecordPositions(places(), fields).tolist(), [6, 7])
+
+if __name__ == '__main__':
+	unittest.main()
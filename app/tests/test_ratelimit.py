@@ -0,0 +1,159 @@
+""" Tests of the per-host rate limit and the adaptive concurrency of web lookups """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import unittest
+from urllib.error import HTTPError, URLError
+
+from core.lookupengine import LookupEngine
+from core.ratelimit import ConcurrencyController, LookupThrottle, TokenBucket, outcome
+
+# an HTTP error response with a status code (as urllib raises it)
+def httpError(status):
+	return HTTPError('http://source.test/place', status, 'status {}'.format(status), {}, None)
+
+# A response error of httpx (with the status code on its response)
+class ResponseError(Exception):
+
+	def __init__(self, status):
+		super().__init__('status {}'.format(status))
+		self.response = type('Response', (), {'status_code': status})()
+
+class OutcomeTest(unittest.TestCase):
+
+	def test_classifies_lookup_errors(self):
+
+		self.assertEqual(outcome(None), 'ok')
+		self.assertEqual(outcome(httpError(429)), 'throttled')
+		self.assertEqual(outcome(httpError(503)), 'throttled')
+		self.assertEqual(outcome(ResponseError(429)), 'throttled')
+		self.assertEqual(outcome(httpError(404)), 'error')
+		self.assertEqual(outcome(URLError(TimeoutError('timed out'))), 'timeout')
+		self.assertEqual(outcome(TimeoutError()), 'timeout')
+		self.assertEqual(outcome(ValueError('no airport')), 'error')
+
+class ConcurrencyControllerTest(unittest.TestCase):
+
+	# record a window of lookups (as many as the current concurrency)
+	def recordWindow(self, controller, error=None):
+		for _ in range(controller.concurrency()):
+			controller.record(0.1, error)
+
+	def test_doubles_the_concurrency_until_throttled(self):
+
+		controller = ConcurrencyController(16, initial_concurrency=2)
+
+		self.recordWindow(controller)
+		self.assertEqual(controller.concurrency(), 4)
+		self.recordWindow(controller)
+		self.assertEqual(controller.concurrency(), 8)
+
+	def test_halves_the_concurrency_once_per_window_on_429(self):
+
+		controller = ConcurrencyController(16, initial_concurrency=8)
+
+		controller.record(0.1, httpError(429))
+		self.assertEqual(controller.concurrency(), 4)
+		controller.record(0.1, httpError(429))
+		self.assertEqual(controller.concurrency(), 4)
+
+		# (the window of the back off ends without growing, and the concurrency then grows by one per window)
+		controller.record(0.1)
+		controller.record(0.1)
+		self.assertEqual(controller.concurrency(), 4)
+		self.recordWindow(controller)
+		self.assertEqual(controller.concurrency(), 5)
+
+		self.assertEqual(controller.outcomes(), {'throttled': 2, 'ok': 6})
+
+	def test_keeps_the_minimum_concurrency(self):
+
+		controller = ConcurrencyController(16, initial_concurrency=2, min_concurrency=1)
+
+		for _ in range(5):
+			self.recordWindow(controller, httpError(429))
+		self.assertEqual(controller.concurrency(), 1)
+
+	def test_holds_the_concurrency_while_latency_grows(self):
+
+		controller = ConcurrencyController(16, initial_concurrency=2, max_latency_growth=2.0)
+
+		self.recordWindow(controller)
+		for _ in range(4):
+			controller.record(0.5)
+		self.assertEqual(controller.concurrency(), 4)
+
+	def test_stays_at_the_maximum_when_not_adaptive(self):
+
+		controller = ConcurrencyController(16, adaptive=False)
+
+		self.recordWindow(controller, httpError(429))
+		self.assertEqual(controller.concurrency(), 16)
+		self.assertEqual(controller.outcomes(), {'throttled': 16})
+
+class TokenBucketTest(unittest.TestCase):
+
+	def test_spaces_requests_beyond_the_burst_by_the_rate(self):
+
+		bucket = TokenBucket(10, burst=2)
+		delays = [bucket.reserve() for _ in range(4)]
+
+		self.assertEqual(delays[:2], [0.0, 0.0])
+		self.assertAlmostEqual(delays[2], 0.1, places=2)
+		self.assertAlmostEqual(delays[3], 0.2, places=2)
+
+# A backend answered with HTTP 429 for its first 'throttled' requests (across the engine's backends), noting
+# the throttle's concurrency at each request
+class ThrottledBackend:
+
+	url_template = 'http://source.test/{}'
+
+	lock = threading.Lock()
+	requests = 0
+	throttled = 0
+	concurrencies = []
+
+	def __init__(self, throttle):
+		self.throttle = throttle
+
+	def lookup(self, cityname, statename, countryname):
+
+		with ThrottledBackend.lock:
+			ThrottledBackend.requests += 1
+			ThrottledBackend.concurrencies.append(self.throttle.controller.concurrency())
+			if ThrottledBackend.requests <= ThrottledBackend.throttled:
+				raise httpError(429)
+
+		return cityname[:3].upper(), 1.0
+
+	def close(self):
+		pass
+
+class ThrottledEngineTest(unittest.TestCase):
+
+	def test_backs_off_on_429_and_retries(self):
+
+		ThrottledBackend.requests = 0
+		ThrottledBackend.throttled = 6
+		ThrottledBackend.concurrencies = []
+
+		throttle = LookupThrottle(8, initial_concurrency=8)
+		engine = LookupEngine(lambda: ThrottledBackend(throttle), workers=8, retries=10, backoff=0.001, throttle=throttle)
+
+		places = [(number, ('City{}'.format(number), 'State', 'Country')) for number in range(40)]
+		results = {}
+		summary = engine.run(places, lambda key, iata, distance: results.__setitem__(key, iata))
+
+		self.assertEqual(summary['lookups'], 40)
+		self.assertEqual(summary['failures'], 0)
+		self.assertEqual(len(results), 40)
+
+		self.assertEqual(throttle.state()['counters'], {'throttled': 6, 'ok': 40})
+		self.assertLess(min(ThrottledBackend.concurrencies), 8)
+
+if __name__ == '__main__':
+	unittest.main()
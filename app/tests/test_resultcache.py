@@ -0,0 +1,96 @@
+""" Tests of the persistent cache of resolved places """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from core.resultcache import ResultCache
+
+pune = ('pune', 'mh', 'india')
+agra = ('agra', 'up', 'india')
+delhi = ('delhi', 'dl', 'india')
+goa = ('goa', 'ga', 'india')
+
+# A clock set by the tests (standing in for 'time.time')
+class Clock:
+
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self):
+		return self.now
+
+class ResultCacheTest(unittest.TestCase):
+
+	def setUp(self):
+
+		self.clock = Clock()
+		patcher = mock.patch('core.resultcache.time.time', self.clock)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_returns_the_stored_results(self):
+
+		cache = ResultCache(':memory:')
+		cache.put(pune, 'PNQ', 5.0, 'web')
+		cache.put(agra, 'AGR', 7.0, 'web')
+
+		self.assertEqual(cache.getMany([delhi, agra, pune]), {1: ('AGR', 7.0), 2: ('PNQ', 5.0)})
+		self.assertEqual(cache.stats(), {'entries': 2, 'hits': 2, 'misses': 1})
+
+	def test_expires_old_results(self):
+
+		cache = ResultCache(':memory:', ttl=60)
+		cache.put(pune, 'PNQ', 5.0, 'web')
+
+		self.clock.now += 59
+		self.assertEqual(cache.getMany([pune]), {0: ('PNQ', 5.0)})
+
+		self.clock.now += 2
+		self.assertEqual(cache.getMany([pune]), {})
+		self.assertEqual(cache.stats()['entries'], 0)
+
+	def test_evicts_the_least_recently_used_results(self):
+
+		cache = ResultCache(':memory:', max_entries=3)
+		cache.write_batch_size = 1
+
+		for place, iata in ((pune, 'PNQ'), (agra, 'AGR'), (delhi, 'DEL')):
+			self.clock.now += 1
+			cache.put(place, iata, 1.0, 'web')
+
+		# (pune is used again, so agra is now the least recently used)
+		self.clock.now += 1
+		cache.getMany([pune])
+
+		self.clock.now += 1
+		cache.put(goa, 'GOI', 1.0, 'web')
+
+		self.assertEqual(sorted(cache.getMany([pune, agra, delhi, goa])), [0, 2, 3])
+		self.assertEqual(cache.stats()['entries'], 3)
+
+	def test_keeps_results_across_sessions(self):
+
+		directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(directory, 'cache', 'results.sqlite3')
+
+			cache = ResultCache(path)
+			cache.put(pune, 'PNQ', 5.0, 'web')
+			cache.close()
+
+			cache = ResultCache(path)
+			self.assertEqual(cache.getMany([pune]), {0: ('PNQ', 5.0)})
+			cache.close()
+
+		finally:
+			shutil.rmtree(directory)
+
+if __name__ == '__main__':
+	unittest.main()
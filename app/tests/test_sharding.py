@@ -0,0 +1,137 @@
+""" Tests of the shards of sharded lookups (worked on in-process, with a fake engine) """
+
+# make the application modules importable when run from any directory
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from core import sharding
+from core.ratelimit import LookupThrottle
+
+# An engine "looking up" each place as the first three letters of its city name (through a throttle)
+class FakeEngine:
+
+	def __init__(self, throttle=None):
+		self.throttle = throttle or LookupThrottle(4)
+		self._stopped = False
+
+	def stop(self):
+		self._stopped = True
+
+	def stopped(self):
+		return self._stopped
+
+	def run(self, places, on_result, on_failure=None):
+
+		for key, place in places:
+			self.throttle.record(0.01)
+			on_result(key, place[0][:3].upper(), 1.0)
+
+		return {'lookups': len(places), 'failures': 0}
+
+places = [(number, ('City{}'.format(number), 'State', 'Country')) for number in range(40)]
+
+# the results written to the part files of a work directory ({key: iata})
+def partResults(work_dir, shards):
+
+	results = {}
+	for shard in range(shards):
+		with open(sharding._shardPath(work_dir, shard, 'part.jsonl'), encoding='utf-8') as part:
+			for line in part:
+				key, iata, _ = json.loads(line)
+				results[key] = iata
+
+	return results
+
+class WorkShardsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp()
+		sharding.writeShards(self.work_dir, places, 4)
+
+	def tearDown(self):
+		shutil.rmtree(self.work_dir)
+
+	def test_looks_up_all_shards(self):
+
+		summaries = sharding.workShards(self.work_dir, FakeEngine, poll_interval=0.05)
+
+		self.assertEqual(sum(summary['lookups'] for summary in summaries), len(places))
+		self.assertEqual(len(partResults(self.work_dir, 4)), len(places))
+
+	def test_takes_over_stale_claims(self):
+
+		# a shard claimed by a worker that died long ago
+		self.assertTrue(sharding.claimShard(self.work_dir, 2))
+		old = time.time() - 600
+		os.utime(sharding._shardPath(self.work_dir, 2, 'claim'), (old, old))
+
+		sharding.workShards(self.work_dir, FakeEngine, stale_after=300, poll_interval=0.05)
+		self.assertTrue(os.path.exists(sharding._shardPath(self.work_dir, 2, 'done')))
+
+	def test_waits_for_claims_to_go_stale(self):
+
+		# a shard claimed by a (remote) worker that dies after the other shards are done
+		self.assertTrue(sharding.claimShard(self.work_dir, 1))
+
+		def dieLater():
+			time.sleep(0.3)
+			old = time.time() - 600
+			os.utime(sharding._shardPath(self.work_dir, 1, 'claim'), (old, old))
+		threading.Thread(target=dieLater).start()
+
+		summaries = sharding.workShards(self.work_dir, FakeEngine, stale_after=300, poll_interval=0.05)
+
+		self.assertEqual(len(summaries), 4)
+		self.assertEqual(len(partResults(self.work_dir, 4)), len(places))
+
+	def test_stops_when_stopped(self):
+
+		self.assertTrue(sharding.claimShard(self.work_dir, 0))
+		open(os.path.join(self.work_dir, sharding.stop_name), 'w').close()
+
+		self.assertEqual(sharding.workShards(self.work_dir, FakeEngine, poll_interval=0.05), [])
+
+	def test_reports_the_throttle_state(self):
+
+		# (the engines made in a process share the throttle of their factory)
+		throttle = LookupThrottle(4)
+		sharding.workShards(self.work_dir, lambda: FakeEngine(throttle), poll_interval=0.05)
+
+		state = sharding.ShardedThrottle(self.work_dir).state()
+		self.assertEqual(state['counters'], {'ok': len(places)})
+		self.assertEqual(state['max_concurrency'], 4)
+
+class ShardedThrottleTest(unittest.TestCase):
+
+	def test_combines_the_workers_states(self):
+
+		work_dir = tempfile.mkdtemp()
+		try:
+			self.assertIsNone(sharding.ShardedThrottle(work_dir).state())
+
+			sharding.writeState(os.path.join(work_dir, 'worker-a-1.json'), {'concurrency': 4, 'max_concurrency': 10, 'rate': 5.0, 'tokens': {'host': 1.0}, 'p50': 0.1, 'p95': 0.3, 'counters': {'ok': 10}})
+			sharding.writeState(os.path.join(work_dir, 'worker-b-2.json'), {'concurrency': 2, 'max_concurrency': 10, 'rate': 5.0, 'tokens': {'host': 2.0}, 'p50': 0.2, 'p95': None, 'counters': {'ok': 5, 'throttled': 1}})
+
+			self.assertEqual(sharding.ShardedThrottle(work_dir).state(), {
+				'concurrency': 6,
+				'max_concurrency': 20,
+				'rate': 10.0,
+				'tokens': {'host': 3.0},
+				'p50': 0.2,
+				'p95': 0.3,
+				'counters': {'ok': 15, 'throttled': 1},
+			})
+
+		finally:
+			shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,80 @@
+""" Background worker to read input data files off the GUI thread """
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from core import datareaders
+from core import compaction
+
+# A 'QThread' that reads an input file in chunks, reporting the header and progress as it goes
+# (reads only the header when 'header_only' is set, and only the 'usecols' fields otherwise), compacting the
+# data read (except the 'keep_fields') and reporting the memory it takes per column before and after
+class ImportWorker(QThread):
+
+	# define the custom signals for use by the import dialog
+	header_parsed = pyqtSignal(list)
+	progress = pyqtSignal(int, int)
+	data_imported = pyqtSignal(object, object)
+	import_failed = pyqtSignal(str, str)
+
+	def __init__(self, filename, usecols=None, categorical_fields=(), keep_fields=(), header_only=False, parent=None):
+		super().__init__(parent)
+		self.filename = filename
+
+		self.usecols = usecols
+		self.categorical_fields = categorical_fields
+		self.keep_fields = keep_fields
+		self.header_only = header_only
+
+	def run(self):
+
+		try:
+			reader = datareaders.openReader(self.filename)
+
+		except datareaders.UnsupportedFormatError as error:
+			self.import_failed.emit('unsupported', str(error))
+			return
+
+		except Exception as error:
+			self.import_failed.emit('error', str(error))
+			return
+
+		try:
+			self.header_parsed.emit(reader.header)
+
+			if self.header_only:
+				return
+
+			# total number of rows is 0 when the file does not record it
+			total_rows = reader.total_rows or 0
+			chunks = []
+
+			# bytes of each column as read (before the chunks are compacted)
+			read_bytes = None
+
+			for chunk, rows_read in reader.iterChunks(usecols=self.usecols):
+
+				if self.isInterruptionRequested():
+					return
+
+				chunk_bytes = compaction.columnBytes(chunk)
+				read_bytes = chunk_bytes if read_bytes is None else [total + size for total, size in zip(read_bytes, chunk_bytes)]
+
+				chunks.append(datareaders.compactChunk(chunk, self.categorical_fields))
+				self.progress.emit(rows_read, max(total_rows, rows_read))
+
+			columns = list(chunks[0].columns) if chunks else [field for field in reader.header if self.usecols is None or field in self.usecols]
+			data = compaction.compactData(datareaders.concatChunks(chunks, columns, self.categorical_fields), self.keep_fields)
+			memory_report = compaction.memoryReport(read_bytes or compaction.columnBytes(data), data)
+
+		except datareaders.UnsupportedFormatError as error:
+			self.import_failed.emit('unsupported', str(error))
+
+		except Exception as error:
+			self.import_failed.emit('error', str(error))
+
+		else:
+			if not self.isInterruptionRequested():
+				self.data_imported.emit(data, memory_report)
+
+		finally:
+			reader.close()
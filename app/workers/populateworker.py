@@ -0,0 +1,83 @@
+""" Background worker to populate the nearest airport IATAs off the GUI thread """
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import threading
+import time
+
+# A 'QThread' running a population job, posting its results to the GUI thread in batches
+class PopulateWorker(QThread):
+
+	# define the custom signals for use by controller
+	results_ready = pyqtSignal(object, object)
+	progress = pyqtSignal(int, int)
+	throttle_state = pyqtSignal(object)
+	population_finished = pyqtSignal(object)
+	population_failed = pyqtSignal(str)
+
+	# minimum interval (in seconds) between posting batches of results and progress
+	post_interval = 0.2
+
+	# (only the cached results of the job are filled in when no engine is given)
+	def __init__(self, job, engine, parent=None):
+		super().__init__(parent)
+
+		self.job = job
+		self.engine = engine
+
+		# results collected from the lookup threads since the last post
+		self._lock = threading.Lock()
+		self._positions = []
+		self._iatas = []
+		self._last_post = 0.0
+
+	# stop the population (the lookups in progress are finished)
+	def stop(self):
+		self.requestInterruption()
+		if self.engine is not None:
+			self.engine.stop()
+
+	def run(self):
+
+		try:
+			summary = self.job.run(self.engine, self._collectResults, self._reportProgress)
+		except Exception as error:
+			self._postResults()
+			self.population_failed.emit(str(error))
+		else:
+			self._postResults()
+			self.population_finished.emit(summary)
+
+	# collect results (called from the lookup threads)
+	def _collectResults(self, positions, iatas):
+
+		with self._lock:
+			self._positions.extend(positions)
+			self._iatas.extend(iatas)
+
+	# post the results and progress when the post interval has passed
+	def _reportProgress(self, completed, total):
+
+		now = time.monotonic()
+		if now - self._last_post < self.post_interval and completed < total:
+			return
+
+		self._last_post = now
+		self._postResults()
+		self.progress.emit(completed, total)
+
+		# live state of the rate limit and adaptive concurrency of web lookups
+		# (sharded engines have a state once their workers report one)
+		throttle = getattr(self.engine, 'throttle', None)
+		state = throttle.state() if throttle is not None else None
+		if state is not None:
+			self.throttle_state.emit(state)
+
+	def _postResults(self):
+
+		with self._lock:
+			positions, self._positions = self._positions, []
+			iatas, self._iatas = self._iatas, []
+
+		if positions:
+			self.results_ready.emit(positions, iatas)
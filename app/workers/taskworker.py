@@ -0,0 +1,48 @@
+""" Background worker running a long computation off the GUI thread """
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from core.tasks import TaskCancelled
+
+# A 'QThread' calling 'function(*args, **kargs)' and posting its result (or error) back to the GUI thread
+class TaskWorker(QThread):
+
+	# define the custom signals for use by dialogs and controller
+	progress = pyqtSignal(int, int)
+	task_finished = pyqtSignal(object)
+	task_failed = pyqtSignal(str)
+	task_cancelled = pyqtSignal()
+
+	# with 'track_progress' the function is also passed 'on_progress(done, total)' and 'cancelled()' callbacks
+	def __init__(self, function, *args, parent=None, track_progress=False, **kargs):
+		super().__init__(parent)
+
+		self.function = function
+		self.args = args
+		self.kargs = kargs
+		self.track_progress = track_progress
+
+		self._reported_percent = None
+
+	def run(self):
+
+		kargs = self.kargs
+		if self.track_progress:
+			kargs = dict(kargs, on_progress=self.reportProgress, cancelled=self.isInterruptionRequested)
+
+		try:
+			result = self.function(*self.args, **kargs)
+		except TaskCancelled:
+			self.task_cancelled.emit()
+		except Exception as error:
+			self.task_failed.emit(str(error))
+		else:
+			self.task_finished.emit(result)
+
+	# post the progress of the function (at most once per percent, to not flood the GUI thread)
+	def reportProgress(self, done, total):
+
+		percent = 100 * done // total if total else 100
+		if percent != self._reported_percent:
+			self._reported_percent = percent
+			self.progress.emit(done, total)